@@ -0,0 +1,353 @@
+"""
+Admission control of flows against CPU and memory budgets.
+Running flows reserve their declared or measured cost; flows that do not
+fit the remaining budget are queued until capacity frees up, or rejected.
+"""
+
+import re
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+OVERFLOW_MODES = ('queue', 'reject')
+
+# Cost assumed for flows that neither declare nor have a measured cost
+DEFAULT_CPU = 0.5
+DEFAULT_MEMORY = 128 * 1024 * 1024
+
+# Weight of the newest sample in the measured CPU average
+CPU_SMOOTHING = 0.3
+
+_SIZE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$', re.IGNORECASE)
+_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+# Declared (CPU cores, memory bytes), either may be None
+Cost = Tuple[Optional[float], Optional[int]]
+
+
+def parse_size(value: Union[int, float, str, None]) -> Optional[int]:
+    """
+    Convert a memory size to bytes.
+
+    Args:
+        value: Bytes, or a string with a binary suffix such as ``512M`` or ``2GiB``
+
+    Returns:
+        int: Size in bytes, None for None
+
+    Raises:
+        ValueError: If the string is not a size
+    """
+    if value is None or isinstance(value, (int, float)):
+        return None if value is None else int(value)
+    match = _SIZE.match(value)
+    if not match:
+        raise ValueError(f"Invalid size {value!r}, expected bytes or a number with K, M, G or T")
+    return int(float(match.group(1)) * _UNITS[match.group(2).lower()])
+
+
+def declared_cost(config: Dict) -> Cost:
+    """
+    Read the ``cpu`` and ``memory`` keys of a process rule or flow.
+
+    Args:
+        config: Process rule with flow overrides
+
+    Returns:
+        tuple: Declared CPU cores and memory bytes, None where not declared
+    """
+    cpu = config.get('cpu')
+    return (float(cpu) if cpu is not None else None), parse_size(config.get('memory'))
+
+
+class AdmissionController:
+    """
+    Admits flows while their costs fit the CPU and memory budgets.
+
+    The cost of a flow is its declared cost, raised to the usage measured
+    while it ran, or the default cost if neither is known. Measured costs
+    are kept after a flow stops, so a relaunched flow is admitted with what
+    it really used. A flow that does not fit is queued and admitted, highest
+    priority first, once other flows release capacity or turn out cheaper
+    than assumed; with ``overflow='reject'`` it is rejected instead. A flow
+    costing more than a whole budget is always rejected. A budget of 0
+    disables that resource.
+    """
+
+    def __init__(self,
+                 cpu_budget: float = 0.0,
+                 memory_budget: int = 0,
+                 overflow: str = 'queue',
+                 default_cpu: float = DEFAULT_CPU,
+                 default_memory: int = DEFAULT_MEMORY,
+                 sample_interval: float = 5.0):
+        """
+        Initialize controller.
+
+        Args:
+            cpu_budget: CPU cores flows may use together
+            memory_budget: Bytes of memory flows may use together
+            overflow: ``queue`` or ``reject`` flows beyond the budgets
+            default_cpu: Cores assumed for flows without a known cost
+            default_memory: Bytes assumed for flows without a known cost
+            sample_interval: Seconds between usage measurements
+        """
+        if overflow not in OVERFLOW_MODES:
+            raise ValueError(f"Unknown overflow handling {overflow!r}, expected one of {OVERFLOW_MODES}")
+        self.cpu_budget = cpu_budget
+        self.memory_budget = memory_budget
+        self.overflow = overflow
+        self.default_cpu = default_cpu
+        self.default_memory = default_memory
+        self.sample_interval = sample_interval
+
+        self._declared: Dict[str, Cost] = {}
+        self._admitted = set()
+        # Queued flows as name -> (priority, order, launch)
+        self._queued: Dict[str, Tuple[int, int, Callable[[], None]]] = {}
+        self._rejected: Dict[str, str] = {}
+        self._order = 0
+        # Measured CPU cores and peak memory, and the previous (CPU seconds, time) sample
+        self._measured: Dict[str, Tuple[float, int]] = {}
+        self._last_sample: Dict[str, Tuple[float, float]] = {}
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger("AdmissionController")
+
+    @property
+    def enabled(self) -> bool:
+        """True if any budget is set."""
+        return bool(self.cpu_budget or self.memory_budget)
+
+    def cost(self, name: str) -> Tuple[float, int]:
+        """
+        Cost a flow is admitted with.
+
+        Args:
+            name: Flow or fused group name
+
+        Returns:
+            tuple: CPU cores and memory bytes
+        """
+        cpu, memory = self._declared.get(name, (None, None))
+        measured = self._measured.get(name)
+        if measured:
+            cpu = measured[0] if cpu is None else max(cpu, measured[0])
+            memory = measured[1] if memory is None else max(memory, measured[1])
+        return (self.default_cpu if cpu is None else cpu,
+                self.default_memory if memory is None else memory)
+
+    def _used(self) -> Tuple[float, int]:
+        """Sum of the costs of admitted flows."""
+        costs = [self.cost(name) for name in self._admitted]
+        return sum(cost[0] for cost in costs), sum(cost[1] for cost in costs)
+
+    def _exceeds(self, cpu: float, memory: int, used: Tuple[float, int]) -> Optional[str]:
+        """Reason a cost does not fit on top of ``used``, None if it fits."""
+        if self.cpu_budget and used[0] + cpu > self.cpu_budget:
+            return f"needs {cpu:.2f} CPU, {max(self.cpu_budget - used[0], 0):.2f} of {self.cpu_budget:g} free"
+        if self.memory_budget and used[1] + memory > self.memory_budget:
+            return (f"needs {memory // 1024 ** 2} MiB, "
+                    f"{max(self.memory_budget - used[1], 0) // 1024 ** 2} of "
+                    f"{self.memory_budget // 1024 ** 2} MiB free")
+        return None
+
+    def request(self, name: str, declared: Cost, launch: Callable[[], None], priority: int = 0) -> str:
+        """
+        Admit, queue or reject a flow.
+
+        Args:
+            name: Flow or fused group name
+            declared: Declared CPU cores and memory bytes
+            launch: Called without locks held once the flow is admitted
+            priority: Higher values are admitted first from the queue
+
+        Returns:
+            str: ``admitted``, ``queued`` or ``rejected``
+        """
+        with self._lock:
+            self._declared[name] = declared
+            self._rejected.pop(name, None)
+            cpu, memory = self.cost(name)
+            if self._exceeds(cpu, memory, (0.0, 0)):
+                result = 'rejected'
+                self._rejected[name] = (f"costs {cpu:.2f} CPU and {memory // 1024 ** 2} MiB, "
+                                        f"more than the whole budget")
+            else:
+                reason = self._exceeds(cpu, memory, self._used())
+                if reason is None and not self._queued_before(priority):
+                    self._admitted.add(name)
+                    result = 'admitted'
+                elif self.overflow == 'queue':
+                    self._order += 1
+                    self._queued[name] = (priority, self._order, launch)
+                    result = 'queued'
+                else:
+                    self._rejected[name] = reason or "flows with higher priority are queued"
+                    result = 'rejected'
+
+        if result == 'admitted':
+            launch()
+        elif result == 'queued':
+            self.logger.warning(f"Queued flow {name}: {reason or 'flows with higher priority are queued'}")
+        else:
+            self.logger.error(f"Rejected flow {name}: {self._rejected.get(name)}")
+        return result
+
+    def _queued_before(self, priority: int) -> bool:
+        """Check if a queued flow should be admitted before a new one of ``priority``."""
+        return any(queued[0] >= priority for queued in self._queued.values())
+
+    def reserve(self, name: str, declared: Cost):
+        """
+        Count an already running flow, e.g. one adopted from a previous instance.
+
+        Args:
+            name: Flow or fused group name
+            declared: Declared CPU cores and memory bytes
+        """
+        with self._lock:
+            self._declared[name] = declared
+            self._admitted.add(name)
+
+    def release(self, name: str):
+        """
+        Forget a flow that stopped, was removed or failed to launch, admitting queued flows.
+
+        Args:
+            name: Flow or fused group name
+        """
+        with self._lock:
+            self._admitted.discard(name)
+            self._queued.pop(name, None)
+            self._rejected.pop(name, None)
+            self._last_sample.pop(name, None)
+        self._admit_queued()
+
+    def _admit_queued(self):
+        """Admit queued flows in priority order while they fit."""
+        launches = []
+        with self._lock:
+            used = self._used()
+            for name, (priority, order, launch) in sorted(self._queued.items(),
+                                                          key=lambda item: (-item[1][0], item[1][1])):
+                cpu, memory = self.cost(name)
+                if self._exceeds(cpu, memory, used):
+                    # Lower priority flows wait behind the first one that does not fit
+                    break
+                del self._queued[name]
+                self._admitted.add(name)
+                used = (used[0] + cpu, used[1] + memory)
+                launches.append((name, launch))
+
+        for name, launch in launches:
+            self.logger.info(f"Admitted queued flow {name}")
+            try:
+                launch()
+            except Exception as e:
+                self.logger.error(f"Launch of {name} failed: {str(e)}", exc_info=True)
+
+    def update(self, usage: Dict[str, Tuple[float, int]]):
+        """
+        Record measured usage of running flows and admit queued flows that now fit.
+
+        Args:
+            usage: Flow name -> (total CPU seconds, resident memory bytes)
+        """
+        now = time.monotonic()
+        with self._lock:
+            for name, (cpu_seconds, memory) in usage.items():
+                last = self._last_sample.get(name)
+                self._last_sample[name] = (cpu_seconds, now)
+                if last is None or now <= last[1] or cpu_seconds < last[0]:
+                    continue
+                cores = (cpu_seconds - last[0]) / (now - last[1])
+                measured = self._measured.get(name)
+                if measured is None:
+                    self._measured[name] = (cores, memory)
+                else:
+                    self._measured[name] = (measured[0] + CPU_SMOOTHING * (cores - measured[0]),
+                                            max(measured[1], memory))
+        self._admit_queued()
+
+    def status(self, name: str) -> Optional[Dict]:
+        """
+        Admission state of a flow that is not running.
+
+        Args:
+            name: Flow or fused group name
+
+        Returns:
+            dict: ``state`` (``queued`` or ``rejected``), ``reason`` and
+            ``cpu``/``memory`` cost, None for admitted or unknown flows
+        """
+        with self._lock:
+            if name in self._queued:
+                state, reason = 'queued', "waiting for capacity"
+            elif name in self._rejected:
+                state, reason = 'rejected', self._rejected[name]
+            else:
+                return None
+            cpu, memory = self.cost(name)
+        return {"state": state, "reason": reason, "cpu": round(cpu, 3), "memory": memory}
+
+    def is_rejected(self, name: str) -> bool:
+        """Check if a flow was rejected."""
+        return name in self._rejected
+
+    def stats(self) -> Dict:
+        """
+        Budgets and their use.
+
+        Returns:
+            dict: ``cpu_budget``, ``memory_budget``, ``cpu_reserved``,
+            ``memory_reserved``, ``admitted``, ``queued`` and ``rejected``
+        """
+        with self._lock:
+            cpu, memory = self._used()
+            return {
+                "cpu_budget": self.cpu_budget,
+                "memory_budget": self.memory_budget,
+                "cpu_reserved": cpu,
+                "memory_reserved": memory,
+                "admitted": len(self._admitted),
+                "queued": len(self._queued),
+                "rejected": len(self._rejected)
+            }
+
+    def start(self, sample: Callable[[], Dict[str, Tuple[float, int]]]):
+        """
+        Start measuring usage periodically.
+
+        Args:
+            sample: Returns usage of running flows as for ``update``
+        """
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(sample,), name="AdmissionController",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop measuring usage."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self, sample: Callable[[], Dict[str, Tuple[float, int]]]):
+        """Measurement loop."""
+        while not self._stop_event.wait(self.sample_interval):
+            try:
+                self.update(sample())
+            except Exception as e:
+                self.logger.error(f"Usage measurement failed: {str(e)}")
+
+    def pending(self) -> List[str]:
+        """Names of queued and rejected flows."""
+        with self._lock:
+            return list(self._queued) + list(self._rejected)
@@ -0,0 +1,4 @@
+"""
+Benchmarks of router hot paths and process supervision.
+Run with ``python -m benchmarks.run`` from the repository root.
+"""
@@ -0,0 +1,55 @@
+"""
+Stub child process for benchmarks.
+Writes output like a chatty ffmpeg without needing a camera or ffmpeg.
+"""
+
+import argparse
+import signal
+import sys
+import time
+
+STATS_LINE = "frame={frame} fps=25 q=-1.0 size={size}kB time=00:00:{seconds:02d}.00 bitrate=1024.0kbits/s speed=1x\r"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rate', type=float, default=10.0,
+                        help="Lines per second on each stream, 0 writes as fast as possible")
+    parser.add_argument('--lines', type=int, default=0, help="Lines per stream before exiting, 0 never exits")
+    parser.add_argument('--length', type=int, default=80, help="Characters per stdout line")
+    parser.add_argument('--progress', action='store_true', help="Write ffmpeg statistics lines on stderr")
+    parser.add_argument('--name', help="Ignored, makes commands of several flows distinct")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    payload = 'x' * max(args.length - 12, 0)
+    # Lines are written in batches of about 10 ms worth
+    batch = max(1, int(args.rate / 100)) if args.rate else 1000
+    interval = batch / args.rate if args.rate else 0
+    stdout, stderr = sys.stdout, sys.stderr
+    written = 0
+    next_write = time.monotonic()
+    try:
+        while not args.lines or written < args.lines:
+            count = min(batch, args.lines - written) if args.lines else batch
+            stdout.write(''.join(f"{written + i:010d} {payload}\n" for i in range(count)))
+            if args.progress:
+                stderr.write(''.join(STATS_LINE.format(frame=written + i, size=(written + i) // 4,
+                                                       seconds=((written + i) // 25) % 60)
+                                     for i in range(count)))
+            else:
+                stderr.write(''.join(f"[info] line {written + i}\n" for i in range(count)))
+            stdout.flush()
+            stderr.flush()
+            written += count
+            if interval:
+                next_write += interval
+                delay = next_write - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+    except BrokenPipeError:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+"""
+Benchmark runner for router hot paths and process supervision.
+Runs offline with stub children and writes machine-readable JSON results.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare baseline.json --threshold 0.2
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from process import ManagedProcess, ProcessState, stop_processes
+from output_sinks import DiscardSink
+from supervisor import ProcessSupervisor
+
+CHILD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chatty_child.py')
+
+SUITES = ('config', 'spawn', 'throughput', 'stop')
+
+
+def _result(value: float, unit: str, better: str = 'lower') -> Dict:
+    """One measured value with its unit and which direction is an improvement."""
+    return {"value": round(value, 6), "unit": unit, "better": better}
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _cpu() -> float:
+    """CPU seconds used by this process so far."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def child_command(child: str, rate: float = 10.0, lines: int = 0, progress: bool = False,
+                  name: Optional[str] = None) -> str:
+    """
+    Command of a benchmark child.
+
+    Args:
+        child: ``stub`` for the Python stub, ``ffmpeg`` for an ffmpeg ``lavfi`` test source
+        rate: Output lines per second of the stub
+        lines: Lines before the stub exits, 0 runs until stopped
+        progress: Stub writes ffmpeg statistics lines on stderr
+        name: Extra argument making commands of several flows distinct
+
+    Returns:
+        str: Command line
+    """
+    if child == 'ffmpeg':
+        return ("ffmpeg -hide_banner -nostdin -re -f lavfi -i testsrc=size=320x240:rate=25 "
+                f"-metadata title={name or 'bench'} -f null -")
+    command = f"{sys.executable} {CHILD} --rate {rate:g} --lines {lines}"
+    if progress:
+        command += " --progress"
+    if name:
+        command += f" --name {name}"
+    return command
+
+
+def synthetic_config(flow_count: int, host_rules: int = 50) -> Dict:
+    """
+    Flows and process rules resembling a large camera installation.
+
+    Generic rules come first, then rules for single camera hosts, so
+    lookups have to prefer the more specific ones.
+
+    Args:
+        flow_count: Number of flows
+        host_rules: Number of rules bound to one camera host
+
+    Returns:
+        dict: ``flows`` (flows.json content) and ``rules`` (process.json content)
+    """
+    record = "shell://ffmpeg -i $1 -c copy -f segment -segment_time 6 -strftime 1 -reset_timestamps 1 $2"
+    rules = [
+        {"filter": ["rtsp", "process://motion", "file"],
+         "run": ["shell://ffmpeg -i $1 -c copy -f segment -segment_time 6 -strftime 1 $3"]},
+        {"filter": ["rtsp", "file"], "run": [record]},
+        {"filter": ["rtsp", "file://archive"], "run": [record]},
+        {"filter": ["rtmp", "file"], "run": [record]},
+        {"filter": ["http", "file"], "run": ["shell://ffmpeg -i $1 -c copy $2"]},
+    ]
+    for index in range(host_rules):
+        rules.append({"filter": [f"rtsp://cam-{index}.site", "file"],
+                      "run": [f"shell://ffmpeg -rtsp_transport tcp -i $1 -c:v copy -metadata cam={index} $2"]})
+
+    flows = []
+    for index in range(flow_count):
+        host = f"cam-{index % (host_rules * 2)}.site"
+        source = f"rtsp://user:pass@{host}:554/stream{index}"
+        kind = index % 4
+        if kind == 0:
+            steps = [source, f"process://motion?fps=5&threshold=0.{index % 9 + 1}", f"file:///rec/{index}/%H%M.mp4"]
+        elif kind == 1:
+            steps = [source, f"file:///rec/{index}/%Y%m%d.mp4"]
+        elif kind == 2:
+            steps = [source, f"file://archive/{index}.mp4"]
+        else:
+            steps = [f"http://{host}/video{index}.mjpg", f"file:///rec/http/{index}.mp4"]
+        flows.append({"name": f"flow-{index}", "steps": steps})
+    return {"flows": {"flows": flows}, "rules": rules}
+
+
+def bench_config(flow_count: int, host_rules: int = 50) -> Dict[str, Dict]:
+    """Configuration load, rule matching and command rendering for many flows."""
+    from router import StreamFilterRouter
+
+    config = synthetic_config(flow_count, host_rules)
+    directory = tempfile.mkdtemp(prefix='sfr-bench-')
+    try:
+        flows_path = os.path.join(directory, 'flows.json')
+        process_path = os.path.join(directory, 'process.json')
+        with open(flows_path, 'w') as f:
+            json.dump(config['flows'], f)
+        with open(process_path, 'w') as f:
+            json.dump(config['rules'], f)
+
+        started = time.perf_counter()
+        router = StreamFilterRouter(flows_path, process_path)
+        load = time.perf_counter() - started
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    flows = config['flows']['flows']
+    started = time.perf_counter()
+    matched = [router._find_matching_process(flow['steps']) for flow in flows]
+    match = time.perf_counter() - started
+    # Recording flows of cameras with their own rule must get it, not the generic one
+    host_flows = [rule for flow, rule in zip(flows, matched)
+                  if flow['steps'][0].startswith('rtsp://') and flow['steps'][1].startswith('file:///')
+                  and int(flow['steps'][0].split('cam-')[1].split('.')[0]) < host_rules]
+    if any('-rtsp_transport' not in rule['run'][0] for rule in host_flows):
+        raise RuntimeError("Camera host rules do not match their flows, lookups only exercise generic rules")
+
+    started = time.perf_counter()
+    for flow, rule in zip(flows, matched):
+        router._prepare_command(rule['run'][0], flow['steps'])
+    prepare = time.perf_counter() - started
+
+    started = time.perf_counter()
+    router._plan_units(flows)
+    plan = time.perf_counter() - started
+
+    return {
+        "config_load_seconds": _result(load, "s"),
+        "match_flows_per_second": _result(flow_count / match, "flows/s", 'higher'),
+        "prepare_commands_per_second": _result(flow_count / prepare, "commands/s", 'higher'),
+        "plan_units_seconds": _result(plan, "s"),
+    }
+
+
+def _wait_running(processes: List[ManagedProcess], timeout: float = 30):
+    """Wait until every process reports RUNNING or has exited."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(process.state != ProcessState.STARTING for process in processes):
+            return
+        time.sleep(0.01)
+
+
+def bench_spawn(count: int, child: str, supervisor: bool) -> Dict[str, Dict]:
+    """Spawn latency, per-process memory and threads, and stop time of chatty children."""
+    mode = 'supervisor' if supervisor else 'threaded'
+    process_supervisor = ProcessSupervisor() if supervisor else None
+    if process_supervisor:
+        process_supervisor.start()
+
+    # Python allocations only, RSS barely moves once the allocator has grown in an earlier suite
+    tracemalloc.start()
+    threads_before = threading.active_count()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    processes = [ManagedProcess(f"bench-{index}", child_command(child, rate=20, progress=True, name=str(index)),
+                                supervisor=process_supervisor, progress=True)
+                 for index in range(count)]
+    latencies = []
+    for process in processes:
+        started = time.perf_counter()
+        process.start()
+        latencies.append(time.perf_counter() - started)
+    _wait_running(processes)
+    # Let every child write some output into its buffers
+    time.sleep(1.0)
+    threads = threading.active_count() - threads_before
+    memory = tracemalloc.get_traced_memory()[0] - memory_before
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    stop_processes({process.name: process for process in processes}, timeout=6)
+    stop = time.perf_counter() - started
+    if process_supervisor:
+        process_supervisor.stop()
+
+    return {
+        f"spawn_latency_p50_ms_{mode}": _result(_percentile(latencies, 0.5) * 1000, "ms"),
+        f"spawn_latency_p95_ms_{mode}": _result(_percentile(latencies, 0.95) * 1000, "ms"),
+        f"memory_per_process_kb_{mode}": _result(memory / count / 1024, "KiB"),
+        f"threads_per_process_{mode}": _result(threads / count, "threads"),
+        f"stop_processes_seconds_{mode}": _result(stop, "s"),
+    }
+
+
+def bench_throughput(children: int, lines: int, discard: bool) -> Dict[str, Dict]:
+    """Lines read per second from children writing as fast as they can."""
+    mode = 'discard' if discard else 'ring'
+    options = {'sinks': [DiscardSink()], 'buffer_lines': 0} if discard else {}
+    processes = [ManagedProcess(f"chatty-{index}", child_command('stub', rate=0, lines=lines), **options)
+                 for index in range(children)]
+    cpu = _cpu()
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process._exited.wait(120)
+    # Readers finish draining the pipes after the exit
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and sum(sum(process.output_lines) for process in processes) \
+            < children * lines * 2:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    cpu = _cpu() - cpu
+    total = sum(sum(process.output_lines) for process in processes)
+
+    return {
+        f"output_lines_per_second_{mode}": _result(total / elapsed, "lines/s", 'higher'),
+        f"parent_cpu_per_million_lines_{mode}": _result(cpu / total * 1e6, "s"),
+    }
+
+
+def bench_router_stop(count: int, child: str) -> Dict[str, Dict]:
+    """Time of a full router stop with many running flows."""
+    from router import StreamFilterRouter
+
+    directory = tempfile.mkdtemp(prefix='sfr-bench-')
+    try:
+        flows_path = os.path.join(directory, 'flows.json')
+        process_path = os.path.join(directory, 'process.json')
+        with open(flows_path, 'w') as f:
+            json.dump({"flows": [{"name": f"flow-{index}", "steps": [f"rtsp://bench/{index}", "file:///dev/null"]}
+                                 for index in range(count)]}, f)
+        with open(process_path, 'w') as f:
+            json.dump([{"filter": ["rtsp", "file"],
+                        # exec keeps the absolute interpreter path, templates drop a leading slash
+                        "run": ["shell://exec " + child_command(child, rate=20, progress=True, name='$1')]}], f)
+
+        router = StreamFilterRouter(flows_path, process_path)
+        started = time.perf_counter()
+        router.start()
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and router.flows_started + router.flow_errors < count:
+            time.sleep(0.01)
+        launch = time.perf_counter() - started
+        time.sleep(1.0)
+
+        started = time.perf_counter()
+        try:
+            router.stop()
+        except SystemExit:
+            pass
+        stop = time.perf_counter() - started
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "router_launch_seconds": _result(launch, "s"),
+        "router_stop_seconds": _result(stop, "s"),
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """
+    Find results that got worse than a baseline by more than ``threshold``.
+
+    Args:
+        results: Current results
+        baseline: Results of an earlier run
+        threshold: Allowed relative change, e.g. 0.2 for 20%
+
+    Returns:
+        list: Descriptions of regressions
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base['value']:
+            continue
+        change = (result['value'] - base['value']) / base['value']
+        worse = change > threshold if result['better'] == 'lower' else change < -threshold
+        if worse:
+            regressions.append(f"{name}: {base['value']:g} -> {result['value']:g} {result['unit']} "
+                               f"({change:+.0%})")
+    return regressions
+
+
+def _metadata(args: argparse.Namespace) -> Dict:
+    """Environment and parameters of a run."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(CHILD), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream Filter Router benchmarks")
+    parser.add_argument('--suites', default=','.join(SUITES),
+                        help=f"Comma-separated suites to run: {', '.join(SUITES)}")
+    parser.add_argument('--flows', type=int, default=10000, help="Synthetic flows for the config suite")
+    parser.add_argument('--processes', type=int, default=50, help="Children for the spawn and stop suites")
+    parser.add_argument('--chatty', type=int, default=4, help="Children for the throughput suite")
+    parser.add_argument('--lines', type=int, default=200000, help="Lines per stream of each throughput child")
+    parser.add_argument('--child', choices=('stub', 'ffmpeg'), default='stub',
+                        help="Children of the spawn and stop suites: Python stub or ffmpeg lavfi test source")
+    parser.add_argument('--output', help="Write results to this file instead of stdout")
+    parser.add_argument('--compare', help="Baseline results file; exit with status 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suites.split(',') if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+    if args.child == 'ffmpeg' and not shutil.which('ffmpeg'):
+        parser.error("ffmpeg not found, use --child stub")
+
+    # Router instances keep this configuration instead of installing their own
+    logging.basicConfig(level=logging.ERROR, format='%(asctime)s [SFR] %(levelname)s: %(message)s')
+
+    results: Dict[str, Dict] = {}
+    for suite in suites:
+        print(f"Running {suite} benchmarks...", file=sys.stderr)
+        if suite == 'config':
+            results.update(bench_config(args.flows))
+        elif suite == 'spawn':
+            results.update(bench_spawn(args.processes, args.child, supervisor=False))
+            results.update(bench_spawn(args.processes, args.child, supervisor=True))
+        elif suite == 'throughput':
+            results.update(bench_throughput(args.chatty, args.lines, discard=False))
+            results.update(bench_throughput(args.chatty, args.lines, discard=True))
+        elif suite == 'stop':
+            results.update(bench_router_stop(args.processes, args.child))
+
+    report = json.dumps({"metadata": _metadata(args), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+cgroup v2 placement of flow processes.
+Each managed process gets a child cgroup of a delegated slice with its
+own CPU weight, CPU quota and memory limit.
+"""
+
+import os
+import logging
+from typing import Optional, Tuple
+
+from process_utils import process_slug
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+# cpu.max period in microseconds
+CPU_PERIOD = 100000
+
+logger = logging.getLogger("Cgroups")
+
+
+def _write(path: str, value: str):
+    """Write a cgroup interface file."""
+    with open(path, 'w') as f:
+        f.write(value)
+
+
+def _own_cgroup() -> Optional[str]:
+    """Path of the router's own cgroup, None outside a cgroup v2 hierarchy."""
+    try:
+        with open('/proc/self/cgroup') as f:
+            for line in f:
+                if line.startswith('0::'):
+                    return CGROUP_ROOT + line[3:].strip().rstrip('/')
+    except OSError:
+        pass
+    return None
+
+
+class FlowCgroup:
+    """cgroup of a single managed process and everything it spawns."""
+
+    __slots__ = ('path',)
+
+    def __init__(self, path: str):
+        """
+        Initialize handle.
+
+        Args:
+            path: Directory of the cgroup
+        """
+        self.path = path
+
+    def attach(self, pid: int) -> bool:
+        """
+        Move a freshly started process group into the cgroup.
+
+        Children forked after the leader moved inherit the cgroup; the
+        router's own cgroup is swept once for members forked before.
+
+        Args:
+            pid: Process group leader
+
+        Returns:
+            bool: True if the leader was moved
+        """
+        procs = os.path.join(self.path, 'cgroup.procs')
+        try:
+            _write(procs, str(pid))
+        except OSError as e:
+            logger.error(f"Cannot move process {pid} to {self.path}: {str(e)}")
+            return False
+
+        own = _own_cgroup()
+        try:
+            with open(os.path.join(own, 'cgroup.procs')) as f:
+                members = [int(line) for line in f if line.strip()]
+        except (OSError, TypeError):
+            return True
+        for member in members:
+            try:
+                if member != os.getpid() and os.getpgid(member) == pid:
+                    _write(procs, str(member))
+            except OSError:
+                pass
+        return True
+
+    def usage(self) -> Optional[Tuple[float, int]]:
+        """
+        Total CPU time and current memory of the cgroup.
+
+        Returns:
+            tuple: CPU seconds and memory bytes, None if unreadable
+        """
+        try:
+            with open(os.path.join(self.path, 'cpu.stat')) as f:
+                usec = next(int(line.split()[1]) for line in f if line.startswith('usage_usec'))
+            with open(os.path.join(self.path, 'memory.current')) as f:
+                memory = int(f.read())
+        except (OSError, StopIteration, ValueError):
+            return None
+        return usec / 1e6, memory
+
+    def remove(self):
+        """Delete the cgroup once its processes are gone."""
+        try:
+            os.rmdir(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Cannot remove cgroup {self.path}: {str(e)}")
+
+
+class CgroupSlice:
+    """
+    Delegated cgroup v2 directory holding one cgroup per managed process.
+
+    The slice must be writable by the router, e.g. a subtree delegated by
+    systemd (``Delegate=yes``) or a directory created by root. ``cpu`` and
+    ``memory`` controllers are enabled for its children on setup.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize slice.
+
+        Args:
+            path: Slice directory, relative paths are taken under /sys/fs/cgroup
+        """
+        self.path = os.path.join(CGROUP_ROOT, path)
+
+    def setup(self) -> bool:
+        """
+        Create the slice and enable the controllers flows are limited with.
+
+        Returns:
+            bool: True if flows can be placed in the slice
+        """
+        if not os.path.exists(os.path.join(CGROUP_ROOT, 'cgroup.controllers')):
+            logger.error(f"No cgroup v2 hierarchy at {CGROUP_ROOT}, flows run without cgroup limits")
+            return False
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            _write(os.path.join(self.path, 'cgroup.subtree_control'), '+cpu +memory')
+        except OSError as e:
+            logger.error(f"Cannot set up cgroup slice {self.path}, flows run without cgroup limits: {str(e)}")
+            return False
+        logger.info(f"Placing flows in cgroup slice {self.path}")
+        return True
+
+    def create(self, name: str,
+               cpu_weight: Optional[int] = None,
+               cpu_limit: Optional[float] = None,
+               memory_limit: Optional[int] = None) -> Optional[FlowCgroup]:
+        """
+        Create or update the cgroup of a process.
+
+        Args:
+            name: Process identifier, turned into a short unique directory name
+            cpu_weight: Share of CPU under contention, 1-10000 (default 100)
+            cpu_limit: CPU cores the process may use at most
+            memory_limit: Bytes after which the process is reclaimed and OOM killed
+
+        Returns:
+            FlowCgroup: Handle to attach processes to, None if it cannot be created
+        """
+        path = os.path.join(self.path, process_slug(name))
+        try:
+            os.makedirs(path, exist_ok=True)
+            _write(os.path.join(path, 'cpu.weight'), str(int(cpu_weight or 100)))
+            _write(os.path.join(path, 'cpu.max'),
+                   f"{int(cpu_limit * CPU_PERIOD)} {CPU_PERIOD}" if cpu_limit else f"max {CPU_PERIOD}")
+            _write(os.path.join(path, 'memory.max'), str(memory_limit) if memory_limit else 'max')
+            # An OOM kill takes down the whole flow instead of leaving half a pipeline
+            _write(os.path.join(path, 'memory.oom.group'), '1')
+        except OSError as e:
+            logger.error(f"Cannot configure cgroup {path}: {str(e)}")
+            return None
+        return FlowCgroup(path)
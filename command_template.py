@@ -0,0 +1,187 @@
+"""
+Compiled ``shell://`` command templates.
+Templates are tokenized once at configuration load and rendered in a single pass.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+from parsed_url import parse_url
+
+SHELL_PREFIX = 'shell://'
+
+# $$ is the shell PID and stays literal; $(...), ${...} and $((...)) never match
+_PLACEHOLDER = re.compile(r'\$\$|\$(\d+)(?:\[(\d+)\])?|\$([A-Za-z_][A-Za-z0-9_]*)')
+
+# Placeholder kinds
+STREAM = 'stream'
+ITEM = 'item'
+PARAM = 'param'
+
+
+class TemplateError(ValueError):
+    """Invalid template or flow steps that do not fit a template."""
+
+
+class CommandTemplate:
+    """
+    Command template split into literal text and typed placeholders.
+
+    ``$N`` is the N-th flow step, ``$N[i]`` the i-th URL of an array step
+    and ``$name`` a query parameter of a ``process://`` step. Digits and
+    names are read greedily, so ``$10`` and ``$bitrate`` are never taken
+    for ``$1`` or ``$b``. Names no step provides are left for the shell
+    to expand, like ``$HOME``.
+    """
+
+    __slots__ = ('template', 'parts', 'streams', 'params')
+
+    def __init__(self, template: str):
+        """
+        Tokenize a template.
+
+        Args:
+            template: Command with placeholders, without the ``shell://`` prefix
+        """
+        self.template = template
+        # Literal strings and (kind, index or name, array index, source text) tuples
+        self.parts: List[Union[str, Tuple[str, object, Optional[int], str]]] = []
+        self.streams = set()
+        self.params = set()
+
+        position = 0
+        for match in _PLACEHOLDER.finditer(template):
+            stream, item, name = match.groups()
+            if stream is None and name is None:
+                continue
+            if match.start() > position:
+                self.parts.append(template[position:match.start()])
+            if name is not None:
+                self.parts.append((PARAM, name, None, match.group()))
+                self.params.add(name)
+            else:
+                index = int(stream)
+                if index < 1:
+                    raise TemplateError(f"Step placeholder ${index} in {template!r}, steps count from $1")
+                self.parts.append((STREAM if item is None else ITEM, index,
+                                   None if item is None else int(item), match.group()))
+                self.streams.add(index)
+            position = match.end()
+        if position < len(template):
+            self.parts.append(template[position:])
+
+    @classmethod
+    def from_run(cls, command: str) -> Optional['CommandTemplate']:
+        """
+        Compile a ``run`` entry of process.json.
+
+        Args:
+            command: Entry with the ``shell://`` prefix
+
+        Returns:
+            CommandTemplate: Compiled template, None for other entry types
+        """
+        if not command.startswith(SHELL_PREFIX):
+            return None
+        return cls(command[len(SHELL_PREFIX):].lstrip('/'))
+
+    def validate(self, step_count: int):
+        """
+        Check that every step placeholder refers to a filter position.
+
+        Args:
+            step_count: Number of entries in the rule's filter
+
+        Raises:
+            TemplateError: If a placeholder is beyond the last step
+        """
+        unknown = sorted(index for index in self.streams if index > step_count)
+        if unknown:
+            raise TemplateError(f"Placeholders {', '.join(f'${index}' for index in unknown)} in "
+                                f"{self.template!r} exceed the {step_count} filter steps")
+
+    def render(self, steps: List[Union[str, List[str]]], params: Optional[Dict[str, str]] = None) -> str:
+        """
+        Substitute flow steps and parameters in one pass.
+
+        Args:
+            steps: Flow steps, file URLs are converted to local paths
+            params: Values for named placeholders, query parameters of the
+                ``process://`` steps when None
+
+        Returns:
+            str: Prepared command
+
+        Raises:
+            TemplateError: If a step is missing or is not of the array kind
+            the placeholder expects
+        """
+        if params is None:
+            params = step_params(steps) if self.params else {}
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            kind, key, item, text = part
+            if kind == PARAM:
+                out.append(params.get(key, text))
+                continue
+            if key > len(steps):
+                raise TemplateError(f"{text} refers to a missing step, the flow has {len(steps)}")
+            step = steps[key - 1]
+            if kind == STREAM:
+                if isinstance(step, list):
+                    raise TemplateError(f"{text} is an array step, use {text}[0]")
+                out.append(parse_url(step).local_path)
+            else:
+                if not isinstance(step, list) or item >= len(step):
+                    raise TemplateError(f"{text} does not exist in step {key}")
+                out.append(parse_url(step[item]).local_path)
+        return ''.join(out)
+
+
+def step_params(steps: List[Union[str, List[str]]]) -> Dict[str, str]:
+    """
+    Collect query parameters of the ``process://`` steps of a flow.
+
+    Args:
+        steps: Flow steps
+
+    Returns:
+        dict: Parameter values, the first step defining a name wins
+    """
+    params: Dict[str, str] = {}
+    for step in steps:
+        if isinstance(step, str) and step.startswith('process://'):
+            for key, value in parse_url(step).params.items():
+                params.setdefault(key, value)
+    return params
+
+
+def compile_templates(process_config: List[dict]) -> Dict[str, CommandTemplate]:
+    """
+    Compile and validate the ``run`` templates of every process rule.
+
+    Args:
+        process_config: Process rules
+
+    Returns:
+        dict: Compiled templates by ``run`` entry
+
+    Raises:
+        TemplateError: If a template refers to a step its rule's filter
+        does not have
+    """
+    templates: Dict[str, CommandTemplate] = {}
+    for process in process_config:
+        for command in process.get('run', []):
+            template = templates.get(command) or CommandTemplate.from_run(command)
+            if template is None:
+                continue
+            try:
+                template.validate(len(process['filter']))
+            except TemplateError as e:
+                raise TemplateError(f"Process config {process['filter']}: {e}") from None
+            templates[command] = template
+    return templates
@@ -0,0 +1,165 @@
+"""
+Configuration file watcher for hot reload.
+Uses inotify through libc when available and polls mtimes otherwise.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import selectors
+import struct
+import threading
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+# inotify event masks, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct('iIII')
+
+
+def _inotify_libc() -> Optional[ctypes.CDLL]:
+    """Load libc if it provides inotify."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class ConfigWatcher:
+    """
+    Calls back once a batch of changes to the watched files has settled.
+
+    Parent directories are watched rather than the files, so editors that
+    save by writing a temporary file and renaming it over the original are
+    noticed too.
+    """
+
+    def __init__(self,
+                 paths: List[str],
+                 callback: Callable[[], None],
+                 poll_interval: float = 1.0,
+                 settle_time: float = 0.2):
+        """
+        Initialize watcher.
+
+        Args:
+            paths: Files to watch
+            callback: Called from the watcher thread after a change
+            poll_interval: Seconds between mtime checks without inotify
+            settle_time: Seconds without further events before calling back
+        """
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._fd: Optional[int] = None
+        self.logger = logging.getLogger("ConfigWatcher")
+
+    def _open_inotify(self) -> Optional[int]:
+        """Set up inotify watches, None if unavailable."""
+        libc = _inotify_libc()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        for directory in {os.path.dirname(path) for path in self.paths}:
+            if libc.inotify_add_watch(fd, directory.encode(), mask) < 0:
+                os.close(fd)
+                return None
+        return fd
+
+    def _read_names(self) -> List[str]:
+        """Read pending inotify events and return the affected paths."""
+        names = []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            _, _, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            names.append(data[offset:offset + length].rstrip(b'\0').decode(errors='replace'))
+            offset += length
+        return names
+
+    def _run_inotify(self):
+        """Wait for inotify events on the watched files."""
+        basenames = {os.path.basename(path) for path in self.paths}
+        pending = False
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._fd, selectors.EVENT_READ)
+            while not self._stop_event.is_set():
+                # Short timeout while a change is pending to debounce bursts
+                timeout = self.settle_time if pending else 0.5
+                if selector.select(timeout):
+                    if basenames.intersection(self._read_names()):
+                        pending = True
+                elif pending:
+                    pending = False
+                    self._notify()
+
+    def _stat(self) -> Dict[str, Tuple[int, int]]:
+        """Get modification time and size of every watched file."""
+        stats = {}
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                stats[path] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                stats[path] = (0, 0)
+        return stats
+
+    def _run_polling(self):
+        """Compare file mtimes periodically."""
+        last = self._stat()
+        while not self._stop_event.wait(self.poll_interval):
+            current = self._stat()
+            if current != last:
+                last = current
+                self._notify()
+
+    def _notify(self):
+        """Invoke the callback, keeping the watcher alive on errors."""
+        try:
+            self.callback()
+        except Exception as e:
+            self.logger.error(f"Config reload failed: {str(e)}", exc_info=True)
+
+    def start(self):
+        """Start watching in a background thread."""
+        self._fd = self._open_inotify()
+        if self._fd is None:
+            self.logger.info("inotify unavailable, polling configuration files")
+            target = self._run_polling
+        else:
+            target = self._run_inotify
+        self._thread = threading.Thread(target=target, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2):
+        """
+        Stop watching.
+
+        Args:
+            timeout: Seconds to wait for the watcher thread
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
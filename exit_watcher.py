@@ -0,0 +1,158 @@
+"""
+Child exit notification for Stream Filter Router.
+Shares one watcher thread between all managed processes.
+"""
+
+import os
+import selectors
+import subprocess
+import threading
+import logging
+from typing import Callable, Dict, Optional
+
+ExitCallback = Callable[[int], None]
+
+_watcher: Optional['ExitWatcher'] = None
+_watcher_lock = threading.Lock()
+
+
+class ExitWatcher:
+    """
+    Delivers child process exits without per-process polling.
+
+    On Linux every watched child gets a pidfd registered in one selector,
+    so the watcher thread sleeps until a child actually exits. Where pidfd
+    is unavailable the same thread falls back to polling all watched
+    children at ``poll_interval``.
+    """
+
+    def __init__(self, poll_interval: float = 0.1):
+        """
+        Initialize exit watcher.
+
+        Args:
+            poll_interval: Seconds between checks in the polling fallback
+        """
+        self.poll_interval = poll_interval
+        self._selector = selectors.DefaultSelector()
+        self._pidfds: Dict[int, int] = {}
+        self._polled: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._use_pidfd = hasattr(os, 'pidfd_open')
+
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+        self.logger = logging.getLogger("ExitWatcher")
+
+        self._thread = threading.Thread(target=self._run, name="ExitWatcher", daemon=True)
+        self._thread.start()
+
+    def watch(self, popen: subprocess.Popen, callback: ExitCallback):
+        """
+        Call ``callback(exit_code)`` once the child exits.
+
+        Args:
+            popen: Started child process
+            callback: Called from the watcher thread with the exit code
+        """
+        if self._use_pidfd:
+            try:
+                pidfd = os.pidfd_open(popen.pid)
+            except ProcessLookupError:
+                # Already reaped, report right away
+                popen.poll()
+                callback(popen.returncode)
+                return
+            except OSError:
+                self._use_pidfd = False
+            else:
+                with self._lock:
+                    self._pidfds[popen.pid] = pidfd
+                    self._selector.register(pidfd, selectors.EVENT_READ, (popen, callback))
+                self._wakeup()
+                return
+
+        with self._lock:
+            self._polled[popen.pid] = (popen, callback)
+        self._wakeup()
+
+    def unwatch(self, popen: subprocess.Popen):
+        """
+        Stop watching a child without calling its callback.
+
+        Args:
+            popen: Previously watched child process
+        """
+        with self._lock:
+            self._polled.pop(popen.pid, None)
+            pidfd = self._pidfds.pop(popen.pid, None)
+            if pidfd is not None:
+                self._selector.unregister(pidfd)
+                os.close(pidfd)
+
+    def _wakeup(self):
+        """Interrupt a blocking select call."""
+        try:
+            os.write(self._wakeup_w, b'\0')
+        except BlockingIOError:
+            pass
+
+    def _run(self):
+        """Wait for pidfd readiness and poll fallback children."""
+        while True:
+            timeout = self.poll_interval if self._polled else None
+            try:
+                events = self._selector.select(timeout)
+            except Exception as e:
+                self.logger.error(f"Selector error: {str(e)}")
+                continue
+
+            for key, _ in events:
+                if key.data is None:
+                    try:
+                        while os.read(self._wakeup_r, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                popen, callback = key.data
+                with self._lock:
+                    if self._pidfds.pop(popen.pid, None) is None:
+                        continue
+                    self._selector.unregister(key.fd)
+                os.close(key.fd)
+                popen.wait()
+                self._notify(popen, callback)
+
+            if self._polled:
+                with self._lock:
+                    exited = [entry for entry in self._polled.values() if entry[0].poll() is not None]
+                    for popen, _ in exited:
+                        del self._polled[popen.pid]
+                for popen, callback in exited:
+                    self._notify(popen, callback)
+
+    def _notify(self, popen: subprocess.Popen, callback: ExitCallback):
+        """Run exit callback shielding the watcher thread from its errors."""
+        try:
+            callback(popen.returncode)
+        except Exception as e:
+            self.logger.error(f"Error in exit callback for PID {popen.pid}: {str(e)}")
+
+
+def get_exit_watcher() -> ExitWatcher:
+    """
+    Get the exit watcher shared by all managed processes.
+
+    Returns:
+        ExitWatcher: Process-wide watcher instance
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ExitWatcher()
+        return _watcher
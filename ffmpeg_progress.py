@@ -0,0 +1,153 @@
+"""
+Parse ffmpeg progress from child output into numeric samples.
+"""
+
+import re
+import time
+from typing import Dict, Optional
+
+_FIELD_RE = re.compile(r'(\w+)=\s*(\S+)')
+
+_SIZE_UNITS = {'b': 1, 'kb': 1024, 'kib': 1024, 'mb': 1024 ** 2, 'mib': 1024 ** 2}
+
+
+def _number(value: str) -> Optional[float]:
+    """Parse plain number, None for N/A."""
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _count(value: str) -> Optional[int]:
+    """Parse frame counter, None for N/A."""
+    return int(value) if value.isdigit() else None
+
+
+def _clock(value: str) -> Optional[float]:
+    """Parse HH:MM:SS.ms clock into seconds."""
+    try:
+        hours, minutes, seconds = value.lstrip('-').split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+def _bitrate(value: str) -> Optional[float]:
+    """Parse ``170.0kbits/s`` into kbit/s."""
+    return _number(value[:-len('kbits/s')]) if value.endswith('kbits/s') else None
+
+
+def _size(value: str) -> Optional[float]:
+    """Parse ``1024kB`` or plain byte count into bytes."""
+    digits = value.rstrip('kKmMiB')
+    number = _number(digits)
+    if number is None:
+        return None
+    return number * _SIZE_UNITS.get(value[len(digits):].lower() or 'b', 1)
+
+
+def _speed(value: str) -> Optional[float]:
+    """Parse ``1.02x`` into a float."""
+    return _number(value.rstrip('x'))
+
+
+class FfmpegProgress:
+    """
+    Latest ffmpeg progress sample of a single process.
+
+    Understands both the periodic stats line ffmpeg writes to stderr
+    (``frame=  250 fps= 25 ... speed=1.00x``) and the key=value lines
+    produced by ``-progress pipe:1``.
+    """
+
+    __slots__ = ('frame', 'fps', 'bitrate', 'size', 'out_time', 'speed',
+                 'dup_frames', 'drop_frames', 'updated', 'advanced', 'samples',
+                 '_first_clock', '_first_out_time')
+
+    # Output key -> (attribute, parser)
+    _FIELDS = {
+        'frame': ('frame', _count),
+        'fps': ('fps', _number),
+        'bitrate': ('bitrate', _bitrate),
+        'size': ('size', _size),
+        'Lsize': ('size', _size),
+        'total_size': ('size', _size),
+        'time': ('out_time', _clock),
+        'out_time': ('out_time', _clock),
+        'speed': ('speed', _speed),
+        'dup': ('dup_frames', _count),
+        'dup_frames': ('dup_frames', _count),
+        'drop': ('drop_frames', _count),
+        'drop_frames': ('drop_frames', _count),
+    }
+
+    def __init__(self):
+        for attr in self.__slots__:
+            setattr(self, attr, None)
+        self.samples = 0
+
+    def feed(self, line: str) -> bool:
+        """
+        Update progress from a single output line.
+
+        Args:
+            line: Line of ffmpeg stdout or stderr
+
+        Returns:
+            bool: True if the line carried progress fields
+        """
+        if '=' not in line:
+            return False
+
+        position = (self.frame, self.out_time, self.size)
+        matched = False
+        for key, value in _FIELD_RE.findall(line):
+            field = self._FIELDS.get(key)
+            if field is None:
+                continue
+            attr, parse = field
+            setattr(self, attr, parse(value))
+            matched = True
+
+        if matched:
+            now = time.monotonic()
+            self.updated = now
+            # Repeated samples with the same position mean ffmpeg is stuck
+            if (self.frame, self.out_time, self.size) != position:
+                self.advanced = now
+            # Both the stats line and a -progress block report speed once per sample
+            if 'speed=' in line:
+                self.samples += 1
+            if self._first_clock is None and self.out_time is not None:
+                self._first_clock = now
+                self._first_out_time = self.out_time
+        return matched
+
+    @property
+    def lag(self) -> Optional[float]:
+        """Seconds the output fell behind wall clock since the first sample."""
+        if self._first_clock is None or self.out_time is None:
+            return None
+        return (self.updated - self._first_clock) - (self.out_time - self._first_out_time)
+
+    def as_dict(self) -> Dict:
+        """
+        Get progress sample.
+
+        Returns:
+            dict: Latest numeric progress values, None where unknown
+        """
+        return {
+            "frame": self.frame,
+            "fps": self.fps,
+            "bitrate_kbps": self.bitrate,
+            "size_bytes": self.size,
+            "out_time": self.out_time,
+            "speed": self.speed,
+            "dup_frames": self.dup_frames,
+            "drop_frames": self.drop_frames,
+            "lag": self.lag,
+            "age": time.monotonic() - self.updated if self.updated is not None else None,
+            "samples": self.samples
+        }
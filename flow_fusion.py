@@ -0,0 +1,106 @@
+"""
+Flow fusion: merge ffmpeg commands reading the same input into one invocation.
+"""
+
+import re
+import shlex
+from collections import OrderedDict
+from typing import List, Optional
+
+# Shell features that do not survive re-tokenization of a command
+_SHELL_SYNTAX = re.compile(r'[|&;<>()`$]')
+
+# Options that introduce global filter graphs or extra inputs
+_UNFUSABLE_OPTIONS = {'-i', '-filter_complex', '-lavfi', '-filter_complex_script'}
+
+
+class FfmpegCommand:
+    """
+    Single-input ffmpeg command split into the part before the input
+    (global and input options) and the output part (options and targets).
+    """
+
+    def __init__(self, input_options: List[str], input_url: str, outputs: List[str]):
+        self.input_options = input_options
+        self.input_url = input_url
+        self.outputs = outputs
+
+    @classmethod
+    def parse(cls, command: str) -> Optional['FfmpegCommand']:
+        """
+        Parse a prepared shell command.
+
+        Args:
+            command: Prepared command string
+
+        Returns:
+            FfmpegCommand: Parsed command or None if it cannot be fused
+        """
+        if _SHELL_SYNTAX.search(command):
+            return None
+        try:
+            argv = shlex.split(command)
+        except ValueError:
+            return None
+
+        if not argv or argv[0].rsplit('/', 1)[-1] != 'ffmpeg' or argv.count('-i') != 1:
+            return None
+
+        index = argv.index('-i')
+        if index + 1 >= len(argv):
+            return None
+        outputs = argv[index + 2:]
+        if not outputs or _UNFUSABLE_OPTIONS.intersection(outputs):
+            return None
+        return cls(argv[1:index], argv[index + 1], outputs)
+
+
+def fuse_commands(commands: List[str], input_url: Optional[str] = None) -> Optional[str]:
+    """
+    Merge ffmpeg commands into a single command with multiple outputs.
+
+    Commands are fusable when each reads exactly one input, all read the
+    same input with identical global and input options, and none uses
+    shell syntax or a global filter graph. Each command keeps its own
+    output options, which ffmpeg applies per output.
+
+    Args:
+        commands: Prepared commands to merge
+        input_url: Input used by the fused command, defaults to the shared input
+
+    Returns:
+        str: Fused command or None when options conflict
+    """
+    parsed = [FfmpegCommand.parse(command) for command in commands]
+    if len(parsed) < 2 or any(command is None for command in parsed):
+        return None
+
+    first = parsed[0]
+    for command in parsed[1:]:
+        if command.input_url != first.input_url or command.input_options != first.input_options:
+            return None
+
+    argv = ['ffmpeg'] + first.input_options + ['-i', input_url or first.input_url]
+    for command in parsed:
+        argv.extend(command.outputs)
+    return shlex.join(argv)
+
+
+def group_fusable(commands: List[str]) -> List[List[int]]:
+    """
+    Partition commands into groups that can be fused together.
+
+    Args:
+        commands: Prepared commands
+
+    Returns:
+        list: Groups of command indices with at least two members each;
+        commands left out keep running as separate processes
+    """
+    groups = OrderedDict()
+    for index, command in enumerate(commands):
+        parsed = FfmpegCommand.parse(command)
+        if parsed is not None:
+            key = (parsed.input_url, tuple(parsed.input_options))
+            groups.setdefault(key, []).append(index)
+    return [indices for indices in groups.values() if len(indices) > 1]
@@ -0,0 +1,316 @@
+"""
+Shared-memory frame bus between flow stages.
+One ingest stage writes decoded frames, any number of local readers follow.
+"""
+
+import struct
+import signal
+import subprocess
+import sys
+import multiprocessing
+import time
+import logging
+from multiprocessing import shared_memory
+from typing import Optional
+
+from frame_reader import read_exact
+
+_MAGIC = b'SFRB'
+
+# magic, slot count, frame size, latest committed sequence number
+_HEADER = struct.Struct('<4sIIQ')
+_HEADER_SIZE = 64
+_SEQ = struct.Struct('<Q')
+_SLOT_HEADER_SIZE = 64
+
+_mp = multiprocessing.get_context('spawn')
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without letting this process own it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers with the resource tracker, which
+        # spawned workers share with the router that owns the segment
+        return shared_memory.SharedMemory(name=name)
+
+
+class FrameBus:
+    """
+    Ring of frame slots in shared memory.
+
+    Every slot starts with the sequence number of the frame it holds. The
+    writer clears it before overwriting the slot and stores the new number
+    once the frame is complete, then publishes it as the latest frame.
+    Readers check the slot number before and after copying, so a frame
+    overwritten while being read is detected and skipped.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool = False):
+        self.shm = shm
+        self.owner = owner
+        magic, self.slots, self.frame_size, _ = _HEADER.unpack_from(shm.buf, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Shared memory {shm.name} is not a frame bus")
+        self._stride = _SLOT_HEADER_SIZE + self.frame_size
+
+    @classmethod
+    def create(cls, name: str, frame_size: int, slots: int = 8) -> 'FrameBus':
+        """
+        Create a new bus.
+
+        Args:
+            name: Shared memory name
+            frame_size: Bytes per frame
+            slots: Number of frame slots
+
+        Returns:
+            FrameBus: Bus owned by the caller, which must unlink it
+        """
+        size = _HEADER_SIZE + slots * (_SLOT_HEADER_SIZE + frame_size)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, slots, frame_size, 0)
+        for slot in range(slots):
+            _SEQ.pack_into(shm.buf, _HEADER_SIZE + slot * (_SLOT_HEADER_SIZE + frame_size), 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'FrameBus':
+        """
+        Attach to a bus created by another process.
+
+        Args:
+            name: Shared memory name
+
+        Returns:
+            FrameBus: Attached bus
+        """
+        return cls(_attach(name))
+
+    @property
+    def name(self) -> str:
+        """Shared memory name."""
+        return self.shm.name
+
+    @property
+    def latest(self) -> int:
+        """Sequence number of the newest complete frame, 0 before the first."""
+        return _SEQ.unpack_from(self.shm.buf, 16)[0]
+
+    def _slot_offset(self, seq: int) -> int:
+        """Offset of the slot holding a sequence number."""
+        return _HEADER_SIZE + ((seq - 1) % self.slots) * self._stride
+
+    def slot_seq(self, seq: int) -> int:
+        """Sequence number currently stored in the slot of ``seq``."""
+        return _SEQ.unpack_from(self.shm.buf, self._slot_offset(seq))[0]
+
+    def frame_view(self, seq: int) -> memoryview:
+        """Writable view of the frame data in the slot of ``seq``."""
+        offset = self._slot_offset(seq) + _SLOT_HEADER_SIZE
+        return self.shm.buf[offset:offset + self.frame_size]
+
+    def begin_write(self) -> int:
+        """
+        Claim the slot for the next frame.
+
+        Returns:
+            int: Sequence number to fill via ``frame_view`` and ``commit``
+        """
+        seq = self.latest + 1
+        _SEQ.pack_into(self.shm.buf, self._slot_offset(seq), 0)
+        return seq
+
+    def commit(self, seq: int):
+        """
+        Publish a completely written frame.
+
+        Args:
+            seq: Sequence number from ``begin_write``
+        """
+        _SEQ.pack_into(self.shm.buf, self._slot_offset(seq), seq)
+        _SEQ.pack_into(self.shm.buf, 16, seq)
+
+    def close(self):
+        """Detach from the bus, removing it if owned."""
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class FrameBusReader:
+    """
+    Follows a frame bus, always moving to the newest frame.
+
+    A reader that falls behind skips the frames it missed instead of
+    holding up the writer; skipped frames are counted.
+    """
+
+    def __init__(self, name: str, poll_interval: float = 0.005):
+        """
+        Initialize reader.
+
+        Args:
+            name: Shared memory name of the bus
+            poll_interval: Seconds between checks while waiting for a frame
+        """
+        self.bus = FrameBus.attach(name)
+        self.poll_interval = poll_interval
+        self.last_seq = 0
+        self.frames = 0
+        self.skipped = 0
+
+    def read(self, out: memoryview, timeout: float = 1.0) -> Optional[int]:
+        """
+        Copy the newest unread frame into a buffer.
+
+        Args:
+            out: Writable buffer of the bus frame size
+            timeout: Seconds to wait for a new frame
+
+        Returns:
+            int: Sequence number of the frame or None on timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = self.bus.latest
+            if seq > self.last_seq:
+                out[:] = self.bus.frame_view(seq)
+                if self.bus.slot_seq(seq) == seq:
+                    if self.last_seq:
+                        self.skipped += seq - self.last_seq - 1
+                    self.last_seq = seq
+                    self.frames += 1
+                    return seq
+                # Overwritten while copying, retry with the newest frame
+                continue
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def close(self):
+        """Detach from the bus."""
+        self.bus.close()
+
+
+def _run_writer(name: str, command: list, stop_event):
+    """Worker process body: decode frames from ffmpeg straight into bus slots."""
+    bus = FrameBus.attach(name)
+    # Own session, so a terminal Ctrl+C reaches the router first and the bus stops in order;
+    # terminate() of the worker still stops it through the finally block below
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    ffmpeg = subprocess.Popen(command, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL, bufsize=0,
+                              start_new_session=True)
+    try:
+        while not stop_event.is_set():
+            seq = bus.begin_write()
+            if not read_exact(ffmpeg.stdout, bus.frame_view(seq)):
+                break
+            bus.commit(seq)
+    except SystemExit:
+        # Terminated mid-read; dropping the traceback releases the frame view before bus.close()
+        pass
+    finally:
+        if ffmpeg.poll() is None:
+            ffmpeg.terminate()
+            try:
+                ffmpeg.wait(2)
+            except subprocess.TimeoutExpired:
+                ffmpeg.kill()
+        bus.close()
+
+
+class FrameBusStage:
+    """
+    Ingest stage decoding a source once into a frame bus.
+
+    The router owns the shared memory; the decoding runs in a worker
+    process so frame copies never touch the router's GIL.
+    """
+
+    def __init__(self, name: str, command: list, frame_size: int, slots: int = 8):
+        """
+        Initialize stage and create its bus.
+
+        Args:
+            name: Shared memory name
+            command: ffmpeg argv writing rawvideo frames to stdout
+            frame_size: Bytes per frame
+            slots: Number of frame slots
+        """
+        self.name = name
+        self.command = command
+        self.bus = FrameBus.create(name, frame_size, slots)
+        self._stop_event = _mp.Event()
+        self._worker: Optional[multiprocessing.Process] = None
+        self.restarts = 0
+        self.started_at: Optional[float] = None
+        self.logger = logging.getLogger(f"FrameBus.{name}")
+
+    def start(self) -> bool:
+        """
+        Start the writer process.
+
+        Returns:
+            bool: True if the writer started
+        """
+        try:
+            self._worker = _mp.Process(target=_run_writer,
+                                       args=(self.name, self.command, self._stop_event),
+                                       name=f"framebus:{self.name}", daemon=True)
+            self._worker.start()
+            self.started_at = time.monotonic()
+            self.logger.info(f"Frame bus writer started with PID {self._worker.pid}")
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to start frame bus writer: {str(e)}")
+            return False
+
+    def exited(self) -> bool:
+        """Check if the writer ended without being asked to stop, e.g. its ffmpeg failed."""
+        return self._worker is not None and not self._worker.is_alive() and not self._stop_event.is_set()
+
+    def restart(self) -> bool:
+        """
+        Start a new writer on the same bus after the previous one exited.
+
+        Returns:
+            bool: True if the writer started
+        """
+        if self._stop_event.is_set():
+            return False
+        self.restarts += 1
+        return self.start()
+
+    def stop(self, timeout: float = 3):
+        """
+        Stop the writer and remove the bus.
+
+        Args:
+            timeout: Seconds to wait before terminating the writer
+        """
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            if self._worker.is_alive():
+                self._worker.terminate()
+                self._worker.join()
+        self.bus.close()
+
+    def get_state(self) -> dict:
+        """
+        Get stage state.
+
+        Returns:
+            dict: Bus name, latest frame number and writer status
+        """
+        return {
+            "name": self.name,
+            "latest": self.bus.latest,
+            "restarts": self.restarts,
+            "running": self._worker is not None and self._worker.is_alive()
+        }
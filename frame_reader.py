@@ -0,0 +1,157 @@
+"""
+Zero-copy reader for fixed-size rawvideo frames from a binary pipe.
+"""
+
+import threading
+from collections import deque
+from typing import Callable, Optional, Tuple
+
+
+def read_exact(pipe, view: memoryview) -> bool:
+    """
+    Fill a buffer completely from a binary pipe.
+
+    Args:
+        pipe: Unbuffered binary pipe
+        view: Writable buffer of the frame size
+
+    Returns:
+        bool: False on EOF before the buffer was filled
+    """
+    filled = 0
+    size = len(view)
+    while filled < size:
+        count = pipe.readinto(view[filled:])
+        if not count:
+            return False
+        filled += count
+    return True
+
+
+class Frame:
+    """Filled pool buffer handed to a consumer until released."""
+
+    __slots__ = ('index', 'data', 'seq', '_pool')
+
+    def __init__(self, pool: 'FramePool', index: int):
+        self._pool = pool
+        self.index = index
+        self.data = pool.buffers[index]
+        self.seq = 0
+
+    def release(self):
+        """Return the buffer to the pool."""
+        self._pool.release(self.index)
+
+
+class FramePool:
+    """
+    Fixed set of reusable frame buffers.
+
+    Buffers are NumPy arrays when ``shape`` is given and plain bytearrays
+    otherwise. Nothing is allocated after construction.
+    """
+
+    def __init__(self, frame_size: int, count: int = 4,
+                 shape: Optional[Tuple[int, ...]] = None, dtype: str = 'uint8'):
+        """
+        Initialize frame pool.
+
+        Args:
+            frame_size: Bytes per frame
+            count: Number of buffers
+            shape: Array shape of a frame, requires NumPy
+            dtype: Array element type used with ``shape``
+        """
+        self.frame_size = frame_size
+        if shape is not None:
+            import numpy as np
+            self.buffers = [np.empty(shape, dtype=dtype) for _ in range(count)]
+            if self.buffers[0].nbytes != frame_size:
+                raise ValueError(f"Frame shape {shape} does not match frame size {frame_size}")
+        else:
+            self.buffers = [bytearray(frame_size) for _ in range(count)]
+
+        self.views = [memoryview(buffer).cast('B') for buffer in self.buffers]
+        self.frames = [Frame(self, index) for index in range(count)]
+        self._free = deque(range(count))
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Optional[int]:
+        """
+        Take a free buffer.
+
+        Returns:
+            int: Buffer index or None if all buffers are in use
+        """
+        with self._lock:
+            return self._free.popleft() if self._free else None
+
+    def release(self, index: int):
+        """
+        Return a buffer to the pool.
+
+        Args:
+            index: Buffer index from acquire
+        """
+        with self._lock:
+            self._free.append(index)
+
+
+class FrameReader:
+    """
+    Reads fixed-size frames from a binary pipe with ``readinto`` straight
+    into pool buffers. When the consumer still holds every buffer, the
+    frame is read into a scratch buffer and counted as dropped, so a slow
+    consumer never stalls the producing process.
+    """
+
+    def __init__(self, pipe, pool: FramePool):
+        """
+        Initialize frame reader.
+
+        Args:
+            pipe: Unbuffered binary pipe, e.g. stdout of Popen with bufsize=0
+            pool: Buffers frames are read into
+        """
+        self.pipe = pipe
+        self.pool = pool
+        self.frames = 0
+        self.dropped = 0
+        self._scratch = memoryview(bytearray(pool.frame_size))
+
+    def read(self) -> Optional[Frame]:
+        """
+        Read the next frame.
+
+        Returns:
+            Frame: Filled buffer to release after use, None on EOF
+        """
+        while True:
+            index = self.pool.acquire()
+            if index is None:
+                if not read_exact(self.pipe, self._scratch):
+                    return None
+                self.dropped += 1
+                continue
+
+            if not read_exact(self.pipe, self.pool.views[index]):
+                self.pool.release(index)
+                return None
+            self.frames += 1
+            frame = self.pool.frames[index]
+            frame.seq = self.frames
+            return frame
+
+    def run(self, on_frame: Callable[[Frame], None]):
+        """
+        Deliver frames until EOF.
+
+        Args:
+            on_frame: Called with every frame; must release it when done
+        """
+        while True:
+            frame = self.read()
+            if frame is None:
+                break
+            on_frame(frame)
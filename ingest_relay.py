@@ -0,0 +1,139 @@
+"""
+Shared ingest relay for flows reading the same source URL.
+"""
+
+import re
+import shlex
+import socket
+from collections import OrderedDict
+from typing import Dict, List
+
+from parsed_url import parse_url
+
+# Network sources worth pulling once and relaying locally
+RELAY_SCHEMES = ('rtsp', 'rtsps', 'rtmp', 'rtmps', 'http', 'https', 'srt')
+
+# Command line parts holding relay ports, which change with every relay start
+CONSUMER_INPUT = re.compile(r"udp://127\.0\.0\.1:\d+\?overrun_nonfatal=1")
+RELAY_TEE = re.compile(r"(?<= -f tee )\S+$")
+
+# Stand-in for CONSUMER_INPUT in commands matched against running processes
+CONSUMER_PLACEHOLDER = "udp://127.0.0.1:*?overrun_nonfatal=1"
+
+
+def find_shared_sources(flows: List[dict]) -> Dict[str, List[str]]:
+    """
+    Group flows by their input step.
+
+    Args:
+        flows: Flow configurations with ``name`` and ``steps``
+
+    Returns:
+        dict: Source URL -> names of flows reading it, only for network
+        sources read by at least two flows
+    """
+    sources: Dict[str, List[str]] = OrderedDict()
+    for flow in flows:
+        source = flow['steps'][0] if flow['steps'] else None
+        if isinstance(source, str) and parse_url(source).scheme in RELAY_SCHEMES:
+            sources.setdefault(source, []).append(flow['name'])
+    return OrderedDict((source, names) for source, names in sources.items() if len(names) > 1)
+
+
+def _free_udp_port(host: str) -> int:
+    """Ask the kernel for an unused UDP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def relay_command(source: str, tee: str) -> str:
+    """
+    Build the ffmpeg command of a relay.
+
+    Args:
+        source: Source URL pulled once
+        tee: Tee muxer output specification
+
+    Returns:
+        str: Shell command pulling the source into the tee outputs
+    """
+    input_options = '-rtsp_transport tcp ' if source.startswith('rtsp') else ''
+    return (f"ffmpeg -hide_banner -nostdin {input_options}-i {shlex.quote(source)} "
+            f"-map 0 -c copy -f tee {shlex.quote(tee)}")
+
+
+def tee_outputs(tee: str) -> List[str]:
+    """
+    Get the consumer URLs of a relay tee specification.
+
+    Args:
+        tee: Tee muxer output specification
+
+    Returns:
+        list: UDP URLs without options, in tee order
+    """
+    return re.findall(r"\](udp://[^?|]+)", tee)
+
+
+class IngestRelay:
+    """
+    Single ffmpeg ingest for a source, fanning packets out to local consumers.
+
+    The relay copies all streams without re-encoding into MPEG-TS and sends
+    one copy per consumer over UDP on the loopback interface using the tee
+    muxer. A consumer that is down does not affect the others.
+    """
+
+    def __init__(self, source: str, consumers: List[str], host: str = '127.0.0.1'):
+        """
+        Initialize relay and allocate a local port per consumer.
+
+        Args:
+            source: Source URL pulled once
+            consumers: Names of flows reading the source
+            host: Loopback address used for fan-out
+        """
+        self.source = source
+        self.host = host
+        self.outputs: Dict[str, str] = OrderedDict(
+            (name, f"udp://{host}:{_free_udp_port(host)}") for name in consumers
+        )
+
+    def input_url(self, consumer: str) -> str:
+        """
+        Get the local URL a consumer should read instead of the source.
+
+        Args:
+            consumer: Flow name
+
+        Returns:
+            str: Local UDP input URL, free of shell metacharacters
+        """
+        return f"{self.outputs[consumer]}?overrun_nonfatal=1"
+
+    @classmethod
+    def adopt(cls, source: str, outputs: Dict[str, str]) -> 'IngestRelay':
+        """
+        Describe a relay left running by an earlier router instance.
+
+        Args:
+            source: Source URL the relay pulls
+            outputs: Consumer name -> UDP URL the relay already feeds
+
+        Returns:
+            IngestRelay: Relay keeping the existing ports
+        """
+        relay = cls(source, [])
+        relay.outputs.update(outputs)
+        return relay
+
+    def command(self) -> str:
+        """
+        Build the relay ffmpeg command.
+
+        Returns:
+            str: Shell command pulling the source and feeding every consumer
+        """
+        tee = '|'.join(f"[f=mpegts:onfail=ignore]{url}?pkt_size=1316" for url in self.outputs.values())
+        return relay_command(self.source, tee)
@@ -0,0 +1,223 @@
+"""
+Logging setup and rate-limited logging of child process output.
+Records are handed to a queue and written by a background listener thread,
+so reader threads never block on the log handler.
+"""
+
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from typing import List, Optional, Union
+
+from output_sinks import OutputSink
+
+LOG_FORMAT = '%(asctime)s [SFR] %(levelname)s: %(message)s'
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records when the queue is full instead of blocking."""
+
+    def __init__(self, log_queue: queue.Queue):
+        """
+        Initialize handler.
+
+        Args:
+            log_queue: Bounded queue read by the listener
+        """
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        """Put a record on the queue, counting it if there is no room."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: Union[int, str] = logging.INFO,
+                  queue_size: int = 10000) -> Optional[logging.handlers.QueueListener]:
+    """
+    Route root logger records through a queue to a stderr handler.
+
+    Does nothing if the root logger already has handlers, so applications
+    embedding the router keep their own configuration.
+
+    Args:
+        level: Root logger level
+        queue_size: Records buffered before new ones are dropped
+
+    Returns:
+        QueueListener: Started listener to stop at shutdown, None if
+        logging was already configured
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue = queue.Queue(queue_size)
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level if isinstance(level, int) else level.upper())
+    listener.start()
+    return listener
+
+
+class OutputLogger(OutputSink):
+    """
+    Logs stdout and stderr lines of one child process with a rate limit.
+
+    Lines are logged at DEBUG on the ``Output.<name>`` logger (dots in the
+    name replaced by underscores), so they are hidden by default. As a sink
+    it takes raw chunks and only splits them into lines while the logger
+    is enabled, otherwise a chunk costs a single level check. A token
+    bucket lets ``burst`` lines through at once and ``rate`` lines per
+    second after that; the rest are counted and reported in a summary
+    line, at most once a second, before the next line that gets through.
+    """
+
+    # Seconds between summaries of suppressed lines
+    SUMMARY_INTERVAL = 1.0
+
+    wants_lines = False
+
+    def __init__(self,
+                 name: str,
+                 level: Optional[Union[int, str]] = None,
+                 rate: float = 20.0,
+                 burst: int = 100):
+        """
+        Initialize output logger.
+
+        Args:
+            name: Process identifier
+            level: Level of this process's output logger, e.g. ``DEBUG`` to
+                show its output; inherited from the root logger if None
+            rate: Lines per second logged in the long run, 0 for no limit
+            burst: Lines logged at once before the rate applies
+        """
+        self.name = name
+        # Dots in URLs would otherwise split the logger hierarchy
+        self.logger = logging.getLogger(f"Output.{name.replace('.', '_')}")
+        self.set_level(level)
+        self.rate = rate
+        self.burst = burst
+        self.suppressed = 0
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._suppressed_since: Optional[float] = None
+        self._lock = threading.Lock()
+        # Unterminated line tail of each stream, indexed by is_stderr
+        self._partial = [b'', b'']
+
+    def set_level(self, level: Optional[Union[int, str]]):
+        """
+        Change the level of this process's output logger.
+
+        Args:
+            level: Level name or number, None to inherit from parent loggers
+        """
+        if level is None:
+            level = logging.NOTSET
+        self.logger.setLevel(level if isinstance(level, int) else level.upper())
+
+    def _allow(self, count: int = 1) -> int:
+        """Take tokens for up to ``count`` lines, returning how many may be logged."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        allowed = min(count, int(self._tokens))
+        self._tokens -= allowed
+        if allowed < count:
+            self.suppressed += count - allowed
+            if self._suppressed_since is None:
+                self._suppressed_since = now
+        return allowed
+
+    def _take_summary(self, force: bool = False) -> Optional[tuple]:
+        """Pop the count of lines suppressed since the last summary, if one is due."""
+        if self._suppressed_since is None:
+            return None
+        if not force and time.monotonic() - self._suppressed_since < self.SUMMARY_INTERVAL:
+            return None
+        count = self.suppressed
+        elapsed = time.monotonic() - self._suppressed_since
+        self.suppressed = 0
+        self._suppressed_since = None
+        return count, elapsed
+
+    def write_lines(self, lines: List[str], is_stderr: bool):
+        """
+        Log a batch of output lines with one level check and one rate limit update.
+
+        Args:
+            lines: Output lines without trailing newlines
+            is_stderr: True for stderr lines
+        """
+        if not lines or not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        if self.rate:
+            with self._lock:
+                allowed = self._allow(len(lines))
+                summary = self._take_summary() if allowed else None
+            if summary:
+                self.logger.debug("Suppressed %d output lines of %s in %.1fs", summary[0], self.name, summary[1])
+            lines = lines[:allowed]
+        stream = 'stderr' if is_stderr else 'stdout'
+        for line in lines:
+            self.logger.debug("%s [%s]: %s", stream, self.name, line)
+
+    def write_chunk(self, data: bytes, is_stderr: bool):
+        """
+        Log the complete lines of a raw chunk, if output logging is enabled.
+
+        Args:
+            data: Bytes read from the pipe
+            is_stderr: True for stderr data
+        """
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            # A line cut while disabled would be logged without its start
+            self._partial[is_stderr] = b''
+            return
+        data = self._partial[is_stderr] + data
+        end = max(data.rfind(b'\n'), data.rfind(b'\r'))
+        self._partial[is_stderr] = data[end + 1:]
+        if end >= 0:
+            text = data[:end + 1].decode('utf-8', 'replace')
+            self.write_lines([line.strip() for line in text.splitlines()], is_stderr)
+
+    def close(self):
+        """Log unterminated last lines and the final summary."""
+        for is_stderr, partial in enumerate(self._partial):
+            if partial:
+                self._partial[is_stderr] = b''
+                self.write_lines([partial.decode('utf-8', 'replace').strip()], bool(is_stderr))
+        self.flush()
+
+    def flush(self):
+        """Report lines suppressed since the last logged line, e.g. at exit."""
+        with self._lock:
+            summary = self._take_summary(force=True)
+        if summary:
+            self.logger.debug("Suppressed %d output lines of %s in %.1fs", summary[0], self.name, summary[1])
+
+
+def stop_logging(listener: logging.handlers.QueueListener):
+    """
+    Write out queued records and log synchronously from then on.
+
+    Args:
+        listener: Listener returned by ``setup_logging``
+    """
+    listener.stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, DroppingQueueHandler):
+            root.removeHandler(handler)
+    for handler in listener.handlers:
+        root.addHandler(handler)
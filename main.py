@@ -7,6 +7,8 @@ import time
 import logging
 import signal
 import sys
+from typing import Optional
+from admission import OVERFLOW_MODES
 from router import StreamFilterRouter
 
 def signal_handler(signum, frame):
@@ -22,19 +24,127 @@ def signal_handler(signum, frame):
               default="config/process.json",
               help="Path to process configuration JSON file",
               type=click.Path(exists=True))
-def main(flows_config: str, process_config: str):
+@click.option('--supervisor/--no-supervisor',
+              default=False,
+              help="Handle all process pipes and exits in a single event loop")
+@click.option('--metrics-port',
+              default=0,
+              envvar='SFR_METRICS_PORT',
+              help="Serve Prometheus metrics on this port (0 disables)",
+              type=int)
+@click.option('--shared-ingest/--no-shared-ingest',
+              default=False,
+              help="Pull sources used by several flows once and relay them locally")
+@click.option('--frame-bus/--no-frame-bus',
+              default=False,
+              help="Decode frames once per source into shared memory for all motion stages")
+@click.option('--watch-config/--no-watch-config',
+              default=False,
+              help="Reload changed flows when configuration files change")
+@click.option('--startup-concurrency',
+              default=0,
+              help="Flows connecting to their sources at once (0 for no limit)",
+              type=int)
+@click.option('--startup-rate',
+              default=0.0,
+              help="Flow launches per second (0 for no limit)",
+              type=float)
+@click.option('--startup-per-host',
+              default=0,
+              help="Flows connecting to the same source host at once (0 for no limit)",
+              type=int)
+@click.option('--shutdown-timeout',
+              default=6.0,
+              help="Seconds all flows together get to exit before being killed",
+              type=float)
+@click.option('--orphans',
+              default='ignore',
+              help="What to do with flows still running from a previous instance",
+              type=click.Choice(StreamFilterRouter.ORPHAN_MODES))
+@click.option('--log-level',
+              default='INFO',
+              envvar='SFR_LOG_LEVEL',
+              help="Log level; child process output is logged at DEBUG",
+              type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR'], case_sensitive=False))
+@click.option('--output-log-rate',
+              default=20.0,
+              help="Child output lines logged per second per process (0 for no limit)",
+              type=float)
+@click.option('--output-dir',
+              default='logs',
+              help="Directory of per-process log files of flows with file output",
+              type=click.Path(file_okay=False))
+@click.option('--cpu-budget',
+              default=0.0,
+              envvar='SFR_CPU_BUDGET',
+              help="CPU cores flows may use together, beyond it flows are queued or rejected (0 for no limit)",
+              type=float)
+@click.option('--memory-budget',
+              default='0',
+              envvar='SFR_MEMORY_BUDGET',
+              help="Memory flows may use together, e.g. 8G (0 for no limit)")
+@click.option('--overflow',
+              default='queue',
+              help="What to do with flows beyond the budgets",
+              type=click.Choice(OVERFLOW_MODES))
+@click.option('--cgroup-slice',
+              default=None,
+              envvar='SFR_CGROUP_SLICE',
+              help="Delegated cgroup v2 directory to place each flow's processes in, e.g. sfr.slice")
+@click.option('--shard-dir',
+              default=None,
+              envvar='SFR_SHARD_DIR',
+              help="Shared directory of router instances splitting the flow list between them")
+@click.option('--node-id',
+              default=None,
+              envvar='SFR_NODE_ID',
+              help="Stable name of this instance when sharding (default: host name)")
+@click.option('--shard-timeout',
+              default=10.0,
+              help="Seconds without a heartbeat before an instance's flows are taken over",
+              type=float)
+def main(flows_config: str, process_config: str, supervisor: bool, metrics_port: int,
+         shared_ingest: bool, frame_bus: bool, watch_config: bool, startup_concurrency: int,
+         startup_rate: float, startup_per_host: int, shutdown_timeout: float,
+         orphans: str, log_level: str, output_log_rate: float, output_dir: str,
+         cpu_budget: float, memory_budget: str, overflow: str, cgroup_slice: Optional[str],
+         shard_dir: Optional[str], node_id: Optional[str], shard_timeout: float):
     """Main entry point for the Stream Filter Router."""
     
     # Set up signal handlers
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
-    router = StreamFilterRouter(flows_config, process_config)
+    router = StreamFilterRouter(flows_config, process_config,
+                                supervisor_mode=supervisor,
+                                metrics_port=metrics_port,
+                                shared_ingest=shared_ingest,
+                                frame_bus=frame_bus,
+                                watch_config=watch_config,
+                                startup_concurrency=startup_concurrency,
+                                startup_rate=startup_rate,
+                                startup_per_host=startup_per_host,
+                                shutdown_timeout=shutdown_timeout,
+                                orphans=orphans,
+                                log_level=log_level,
+                                output_log_rate=output_log_rate,
+                                output_dir=output_dir,
+                                cpu_budget=cpu_budget,
+                                memory_budget=memory_budget,
+                                overflow=overflow,
+                                cgroup_slice=cgroup_slice,
+                                shard_dir=shard_dir,
+                                node_id=node_id,
+                                shard_timeout=shard_timeout)
+
+    # SIGHUP reloads configuration on demand, on a worker thread so the handler never blocks
+    signal.signal(signal.SIGHUP, lambda signum, frame: router.request_reload())
 
     try:
         router.start()
-        # Use signal.pause() instead of infinite loop
-        signal.pause()
+        # pause() returns after every handled signal, SIGINT/SIGTERM leave through SystemExit
+        while not router.shutdown_event.is_set():
+            signal.pause()
     except (KeyboardInterrupt, SystemExit):
         router.stop()
         logging.info("Stream Filter Router shutdown complete")
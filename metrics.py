@@ -0,0 +1,169 @@
+"""
+In-process Prometheus metrics for Stream Filter Router.
+Collects per-flow state, resources and output counters at scrape time.
+"""
+
+import logging
+import re
+from typing import TYPE_CHECKING
+
+from prometheus_client import CollectorRegistry, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.process_collector import ProcessCollector
+
+from process_utils import read_process_groups
+
+if TYPE_CHECKING:
+    from router import StreamFilterRouter
+
+logger = logging.getLogger("StreamFilterRouter")
+
+# Progress sample key -> (metric name, help)
+_PROGRESS_GAUGES = {
+    'fps': ('sfr_process_fps', 'Frames per second reported by ffmpeg'),
+    'speed': ('sfr_process_speed_ratio', 'Processing speed relative to real time'),
+    'bitrate_kbps': ('sfr_process_bitrate_kbps', 'Output bitrate reported by ffmpeg'),
+    'lag': ('sfr_process_lag_seconds', 'Seconds the output fell behind wall clock'),
+    'drop_frames': ('sfr_process_dropped_frames', 'Frames dropped by ffmpeg'),
+    'dup_frames': ('sfr_process_duplicated_frames', 'Frames duplicated by ffmpeg'),
+}
+
+# user:password@ in URLs, never exported
+_USERINFO = re.compile(r'(?<=://)[^/\s]*@')
+
+
+def flow_label(router: 'StreamFilterRouter', process_id: str) -> str:
+    """
+    Label value of a process: its flow or fused group name.
+
+    Processes outside units, such as shared ingests, keep their ID with
+    credentials removed from URLs.
+    """
+    return router._unit_names.get(process_id) or _USERINFO.sub('', process_id)
+
+
+class RouterCollector:
+    """
+    Prometheus collector reading router state only when scraped.
+    Hot paths just bump plain integer counters on processes and the router.
+    """
+
+    def __init__(self, router: 'StreamFilterRouter'):
+        self.router = router
+
+    def collect(self):
+        """Yield metric families for the current router state."""
+        router = self.router
+        processes = list(router.running_processes.items())
+        groups = read_process_groups()
+
+        active = GaugeMetricFamily('sfr_active_streams', 'Number of currently active streams')
+        active.add_metric([], sum(1 for _, process in processes if process.is_running()))
+        yield active
+
+        started = CounterMetricFamily('sfr_stream_processed', 'Total number of processed streams')
+        started.add_metric([], router.flows_started)
+        yield started
+
+        errors = CounterMetricFamily('sfr_stream_errors', 'Total number of stream processing errors')
+        errors.add_metric([], router.flow_errors)
+        yield errors
+
+        startup = router.scheduler.stats()
+        pending = GaugeMetricFamily('sfr_startup_pending_flows', 'Flow launches waiting for the scheduler')
+        pending.add_metric([], startup['pending'] + startup['active'])
+        yield pending
+        if startup['startup_seconds'] is not None:
+            duration = GaugeMetricFamily('sfr_startup_seconds',
+                                         'Time until all scheduled flows were launched, elapsed so far while pending')
+            duration.add_metric([], startup['startup_seconds'])
+            yield duration
+
+        if router.coordinator:
+            nodes = GaugeMetricFamily('sfr_shard_nodes', 'Router instances sharing the flow list')
+            nodes.add_metric([], len(router.coordinator.members))
+            yield nodes
+            owned = GaugeMetricFamily('sfr_shard_owned_units', 'Flows and fused groups run by this instance')
+            owned.add_metric([], len(router.units))
+            yield owned
+
+        if router.admission.enabled:
+            admission = router.admission.stats()
+            for name, key, doc in (
+                    ('sfr_admission_cpu_budget', 'cpu_budget', 'CPU cores flows may use together'),
+                    ('sfr_admission_cpu_reserved', 'cpu_reserved', 'CPU cores reserved by admitted flows'),
+                    ('sfr_admission_memory_budget_bytes', 'memory_budget', 'Memory flows may use together'),
+                    ('sfr_admission_memory_reserved_bytes', 'memory_reserved', 'Memory reserved by admitted flows')):
+                gauge = GaugeMetricFamily(name, doc)
+                gauge.add_metric([], admission[key])
+                yield gauge
+            flows = GaugeMetricFamily('sfr_admission_flows', 'Flows by admission state', labels=['state'])
+            for key in ('admitted', 'queued', 'rejected'):
+                flows.add_metric([key], admission[key])
+            yield flows
+
+        state = GaugeMetricFamily('sfr_process_state', 'Process lifecycle state', labels=['flow', 'state'])
+        restarts = CounterMetricFamily('sfr_process_restarts', 'Process restarts', labels=['flow'])
+        stalls = CounterMetricFamily('sfr_process_stalls', 'Processes killed for making no progress',
+                                     labels=['flow'])
+        cpu = CounterMetricFamily('sfr_process_cpu_seconds',
+                                  'CPU time of the process group', labels=['flow'])
+        rss = GaugeMetricFamily('sfr_process_resident_memory_bytes',
+                                'Resident memory of the process group', labels=['flow'])
+        out_bytes = CounterMetricFamily('sfr_process_output_bytes',
+                                        'Bytes read from process pipes', labels=['flow', 'stream'])
+        out_lines = CounterMetricFamily('sfr_process_output_lines',
+                                        'Lines read from process pipes', labels=['flow', 'stream'])
+        progress = {key: GaugeMetricFamily(name, doc, labels=['flow'])
+                    for key, (name, doc) in _PROGRESS_GAUGES.items()}
+
+        for process_id, process in processes:
+            flow = flow_label(router, process_id)
+            process_state = process.get_state()
+            state.add_metric([flow, process_state['state']], 1)
+            restarts.add_metric([flow], process_state.get('restarts', 0))
+            stalls.add_metric([flow], process_state.get('stalls', 0))
+
+            if process_state['pid'] in groups:
+                group_cpu, group_rss = groups[process_state['pid']]
+                cpu.add_metric([flow], group_cpu)
+                rss.add_metric([flow], group_rss)
+
+            for index, stream in enumerate(('stdout', 'stderr')):
+                out_bytes.add_metric([flow, stream], process.output_bytes[index])
+                out_lines.add_metric([flow, stream], process.output_lines[index])
+
+            sample = process_state.get('progress')
+            if sample:
+                for key, family in progress.items():
+                    if sample.get(key) is not None:
+                        family.add_metric([flow], sample[key])
+
+        yield state
+        yield restarts
+        yield stalls
+        yield cpu
+        yield rss
+        yield out_bytes
+        yield out_lines
+        yield from progress.values()
+
+
+def start_metrics_server(router: 'StreamFilterRouter', port: int, addr: str = '0.0.0.0') -> CollectorRegistry:
+    """
+    Serve router metrics over HTTP from a background thread.
+
+    Args:
+        router: Router to export
+        port: HTTP port for the /metrics endpoint
+        addr: Address to bind
+
+    Returns:
+        CollectorRegistry: Registry served by the endpoint
+    """
+    registry = CollectorRegistry()
+    ProcessCollector(registry=registry)
+    registry.register(RouterCollector(router))
+    start_http_server(port, addr=addr, registry=registry)
+    logger.info(f"Metrics available on http://{addr}:{port}/metrics")
+    return registry
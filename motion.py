@@ -0,0 +1,326 @@
+"""
+Built-in motion detection for process://motion flow steps.
+Frames are decoded by ffmpeg and analysed with NumPy in a worker process.
+"""
+
+import signal
+import subprocess
+import sys
+import multiprocessing
+import time
+import logging
+from typing import Dict, Optional
+
+from frame_reader import FramePool, FrameReader
+from frame_bus import FrameBusReader
+
+# Analysis resolution, small enough for many cameras per host
+DEFAULT_WIDTH = 320
+DEFAULT_HEIGHT = 180
+
+# Weight of the newest frame in the running background average
+BACKGROUND_ALPHA = 0.05
+
+# Consecutive one-second bus reads without a frame before the worker gives up
+BUS_READ_TIMEOUTS = 10
+
+_mp = multiprocessing.get_context('spawn')
+
+
+def frame_command(source: str, fps: float, width: int, height: int) -> list:
+    """
+    Build ffmpeg argv decoding a source into downscaled grayscale rawvideo on stdout.
+
+    Args:
+        source: Input URL
+        fps: Analysed frames per second
+        width: Frame width
+        height: Frame height
+
+    Returns:
+        list: ffmpeg argv
+    """
+    return ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-i', source,
+            '-vf', f'fps={fps},scale={width}:{height},format=gray',
+            '-f', 'rawvideo', '-pix_fmt', 'gray', 'pipe:1']
+
+
+def _run_worker(name: str, source: str, fps: float, threshold: float, min_area: float,
+                hold: float, width: int, height: int, events, stop_event, bus_name=None):
+    """
+    Worker process body: read frames and emit motion start/stop events.
+
+    Frames come from a private ffmpeg or, with ``bus_name``, from a shared
+    frame bus that the worker samples at its own rate.
+
+    A pixel counts as changed when it differs from the running background
+    by more than ``threshold`` of the full intensity range. Motion starts
+    when the changed fraction of the frame exceeds ``min_area`` and stops
+    after ``hold`` seconds without motion.
+
+    The worker exits with an error event when the frame stream ends or the
+    bus carries no new frame for ``BUS_READ_TIMEOUTS`` seconds, so the
+    router can restart it.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        events.put((name, {"type": "error", "time": time.time(), "error": "numpy is not installed"}))
+        return
+
+    ffmpeg = None
+    if bus_name:
+        bus_reader = FrameBusReader(bus_name)
+        if bus_reader.bus.frame_size != width * height:
+            events.put((name, {"type": "error", "time": time.time(),
+                               "error": f"frame bus {bus_name} does not carry {width}x{height} frames"}))
+            bus_reader.close()
+            return
+        bus_frame = FramePool(width * height, 1, (height, width))
+        interval = 1.0 / fps
+        next_read = time.monotonic()
+        timeouts = 0
+    else:
+        # Own session, so a terminal Ctrl+C reaches the router first and stages stop in order;
+        # terminate() of the worker still stops it through the finally block below
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        ffmpeg = subprocess.Popen(frame_command(source, fps, width, height),
+                                  stdout=subprocess.PIPE, stdin=subprocess.DEVNULL, bufsize=0,
+                                  start_new_session=True)
+
+        # All buffers are allocated once and reused for every frame
+        reader = FrameReader(ffmpeg.stdout, FramePool(width * height, 1, (height, width)))
+    background = np.empty((height, width), dtype=np.float32)
+    diff = np.empty((height, width), dtype=np.float32)
+    mask = np.empty((height, width), dtype=bool)
+    pixel_threshold = threshold * 255.0
+    hold_frames = max(1, int(hold * fps))
+
+    active = False
+    quiet_frames = 0
+    frames = 0
+
+    try:
+        while not stop_event.is_set():
+            if bus_name:
+                # Sample the newest frame on the bus at this detector's rate
+                delay = next_read - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_read = max(next_read + interval, time.monotonic())
+                if bus_reader.read(bus_frame.views[0], timeout=1.0) is None:
+                    timeouts += 1
+                    if timeouts >= BUS_READ_TIMEOUTS:
+                        events.put((name, {"type": "error", "time": time.time(),
+                                           "error": f"no frames on frame bus {bus_name} for {timeouts}s"}))
+                        break
+                    continue
+                timeouts = 0
+                buffer = bus_frame.frames[0]
+            else:
+                buffer = reader.read()
+                if buffer is None:
+                    raise EOFError
+            frame = buffer.data
+
+            if frames == 0:
+                np.copyto(background, frame)
+            frames += 1
+
+            np.subtract(frame, background, out=diff)
+            np.abs(diff, out=diff)
+            np.greater(diff, pixel_threshold, out=mask)
+            score = float(np.count_nonzero(mask)) / mask.size
+
+            # Running average, reusing diff as scratch space
+            np.multiply(background, 1.0 - BACKGROUND_ALPHA, out=background)
+            np.multiply(frame, BACKGROUND_ALPHA, out=diff)
+            np.add(background, diff, out=background)
+            if not bus_name:
+                buffer.release()
+
+            if score > min_area:
+                quiet_frames = 0
+                if not active:
+                    active = True
+                    events.put((name, {"type": "motion_start", "time": time.time(), "score": score}))
+            elif active:
+                quiet_frames += 1
+                if quiet_frames >= hold_frames:
+                    active = False
+                    events.put((name, {"type": "motion_stop", "time": time.time(), "score": score}))
+
+    except EOFError:
+        try:
+            exit_code = ffmpeg.wait(2)
+        except subprocess.TimeoutExpired:
+            exit_code = None
+        events.put((name, {"type": "error", "time": time.time(),
+                           "error": f"frame stream ended, ffmpeg exit code {exit_code}"}))
+    finally:
+        if ffmpeg is None:
+            bus_reader.close()
+        elif ffmpeg.poll() is None:
+            ffmpeg.terminate()
+            try:
+                ffmpeg.wait(2)
+            except subprocess.TimeoutExpired:
+                ffmpeg.kill()
+        if active:
+            events.put((name, {"type": "motion_stop", "time": time.time(), "score": 0.0}))
+
+
+class MotionDetector:
+    """
+    Motion detection stage for a single flow.
+
+    Runs ffmpeg and the NumPy analysis in a separate process so frame work
+    never holds the router's GIL. With a frame bus the worker reads frames
+    decoded once for all stages sharing the source instead. Events are sent to a queue shared by all
+    detectors as ``(name, event)`` tuples.
+    """
+
+    def __init__(self,
+                 name: str,
+                 source: str,
+                 events,
+                 fps: float = 5,
+                 threshold: float = 0.3,
+                 min_area: float = 0.01,
+                 hold: float = 2.0,
+                 width: int = DEFAULT_WIDTH,
+                 height: int = DEFAULT_HEIGHT,
+                 bus_name: Optional[str] = None):
+        """
+        Initialize motion detector.
+
+        Args:
+            name: Identifier passed with every event
+            source: Input URL to analyse
+            events: Multiprocessing queue receiving events
+            fps: Analysed frames per second
+            threshold: Per-pixel change, as a fraction of full intensity
+            min_area: Fraction of changed pixels that counts as motion
+            hold: Seconds without motion before motion stops
+            width: Analysis frame width
+            height: Analysis frame height
+            bus_name: Frame bus to read instead of decoding the source
+        """
+        self.name = name
+        self.source = source
+        self.events = events
+        self.fps = fps
+        self.threshold = threshold
+        self.min_area = min_area
+        self.hold = hold
+        self.width = width
+        self.height = height
+        self.bus_name = bus_name
+
+        self.active = False
+        self.event_count = 0
+        self.last_event: Optional[Dict] = None
+        self.restarts = 0
+        self.started_at: Optional[float] = None
+
+        self._stop_event = _mp.Event()
+        self._worker: Optional[multiprocessing.Process] = None
+        self.logger = logging.getLogger(f"Motion.{name}")
+
+    @staticmethod
+    def create_queue():
+        """
+        Create an event queue usable by detector workers.
+
+        Returns:
+            multiprocessing.Queue: Queue shared by detectors
+        """
+        return _mp.Queue()
+
+    def start(self) -> bool:
+        """
+        Start the worker process.
+
+        Returns:
+            bool: True if the worker started
+        """
+        try:
+            self._worker = _mp.Process(
+                target=_run_worker,
+                args=(self.name, self.source, self.fps, self.threshold, self.min_area,
+                      self.hold, self.width, self.height, self.events, self._stop_event,
+                      self.bus_name),
+                name=f"motion:{self.name}",
+                daemon=True
+            )
+            self._worker.start()
+            self.started_at = time.monotonic()
+            self.logger.info(f"Motion detection started with PID {self._worker.pid}")
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to start motion detection: {str(e)}")
+            return False
+
+    def exited(self) -> bool:
+        """Check if the worker ended without being asked to stop."""
+        return self._worker is not None and not self._worker.is_alive() and not self._stop_event.is_set()
+
+    def restart(self) -> bool:
+        """
+        Start a new worker after the previous one exited.
+
+        Returns:
+            bool: True if the worker started
+        """
+        if self._stop_event.is_set():
+            return False
+        self.restarts += 1
+        self.active = False
+        return self.start()
+
+    def request_stop(self):
+        """Ask the worker to stop without waiting for it."""
+        self._stop_event.set()
+
+    def stop(self, timeout: float = 3):
+        """
+        Stop the worker process.
+
+        Args:
+            timeout: Seconds to wait before terminating the worker
+        """
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            if self._worker.is_alive():
+                self._worker.terminate()
+                self._worker.join()
+
+    def record(self, event: Dict):
+        """
+        Update detector state with an event received by the router.
+
+        Args:
+            event: Event emitted by the worker
+        """
+        self.event_count += 1
+        self.last_event = event
+        if event['type'] == 'motion_start':
+            self.active = True
+        elif event['type'] in ('motion_stop', 'error'):
+            self.active = False
+
+    def get_state(self) -> Dict:
+        """
+        Get detector state.
+
+        Returns:
+            dict: Motion flag, event count and last event
+        """
+        return {
+            "active": self.active,
+            "events": self.event_count,
+            "last_event": self.last_event,
+            "restarts": self.restarts,
+            "running": self._worker is not None and self._worker.is_alive()
+        }
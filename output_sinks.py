@@ -0,0 +1,206 @@
+"""
+Output sinks receiving child process output in batches.
+A sink gets every chunk read from a pipe at once, either as raw bytes or
+as the complete lines it contains.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+from ring_buffer import RingBuffer
+from ffmpeg_progress import FfmpegProgress
+
+
+class OutputSink:
+    """
+    Base class of output sinks.
+
+    Sinks with ``wants_lines`` set receive decoded, stripped lines through
+    ``write_lines``; the others receive the raw chunks through
+    ``write_chunk``. Lines are only decoded when at least one sink of a
+    process wants them. Both methods are called from the reader thread of
+    the stream, stdout and stderr may be delivered concurrently.
+    """
+
+    wants_lines = True
+
+    def write_lines(self, lines: List[str], is_stderr: bool):
+        """
+        Receive complete lines read in one chunk.
+
+        Args:
+            lines: Output lines without line endings
+            is_stderr: True for stderr lines
+        """
+
+    def write_chunk(self, data: bytes, is_stderr: bool):
+        """
+        Receive a raw chunk as read from the pipe.
+
+        Args:
+            data: Bytes read, lines may span chunks
+            is_stderr: True for stderr data
+        """
+
+    def close(self):
+        """Flush and release resources once the process has exited."""
+
+
+class DiscardSink(OutputSink):
+    """Drops all output; the process still counts lines and bytes."""
+
+    wants_lines = False
+
+
+class RingBufferSink(OutputSink):
+    """
+    Keeps the most recent lines of each stream for ``get_output``/``get_error``.
+
+    Chunks are stored raw and only split into lines when read.
+    """
+
+    wants_lines = False
+
+    def __init__(self, stdout_buffer: RingBuffer, stderr_buffer: RingBuffer):
+        """
+        Initialize sink.
+
+        Args:
+            stdout_buffer: Buffer for stdout lines
+            stderr_buffer: Buffer for stderr lines
+        """
+        self.buffers = (stdout_buffer, stderr_buffer)
+
+    def write_chunk(self, data: bytes, is_stderr: bool):
+        """Append a chunk to the stream's buffer under one lock."""
+        self.buffers[is_stderr].put_chunk(data)
+
+    def close(self):
+        """Keep the unterminated last line of each stream."""
+        for buffer in self.buffers:
+            buffer.flush()
+
+
+class ProgressSink(OutputSink):
+    """Feeds ffmpeg progress lines into a progress parser."""
+
+    def __init__(self, progress: FfmpegProgress):
+        """
+        Initialize sink.
+
+        Args:
+            progress: Parser updated from output lines, replaced on restart
+        """
+        self.progress = progress
+
+    def write_lines(self, lines: List[str], is_stderr: bool):
+        """Parse lines that may carry progress fields."""
+        feed = self.progress.feed
+        for line in lines:
+            if '=' in line:
+                feed(line)
+
+
+class CallbackSink(OutputSink):
+    """Calls per-line ``on_output``/``on_error`` callbacks."""
+
+    def __init__(self,
+                 on_output: Optional[Callable[[str], None]] = None,
+                 on_error: Optional[Callable[[str], None]] = None):
+        """
+        Initialize sink.
+
+        Args:
+            on_output: Called for every stdout line
+            on_error: Called for every stderr line
+        """
+        self.callbacks = (on_output, on_error)
+
+    def write_lines(self, lines: List[str], is_stderr: bool):
+        """Call the stream's callback for each line."""
+        callback = self.callbacks[is_stderr]
+        if callback:
+            for line in lines:
+                callback(line)
+
+
+class RotatingFileSink(OutputSink):
+    """
+    Appends raw output of both streams to a file, rotated by size.
+
+    Writes go through a large buffer that is flushed at most every
+    ``flush_interval`` seconds, when the file rotates and on close. The
+    file is ``path``, older ones ``path.1`` to ``path.<backups>``.
+    """
+
+    wants_lines = False
+
+    def __init__(self,
+                 path: str,
+                 max_bytes: int = 10 * 1024 * 1024,
+                 backups: int = 3,
+                 buffer_size: int = 64 * 1024,
+                 flush_interval: float = 1.0):
+        """
+        Initialize sink.
+
+        Args:
+            path: Log file path, parent directories are created
+            max_bytes: File size triggering rotation, 0 never rotates
+            backups: Rotated files kept
+            buffer_size: Write buffer size
+            flush_interval: Seconds between buffer flushes
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._last_flush = time.monotonic()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _open(self):
+        """Open the log file for appending."""
+        self._file = open(self.path, 'ab', buffering=self.buffer_size)
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        """Shift rotated files and start a new one."""
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def write_chunk(self, data: bytes, is_stderr: bool):
+        """Append a chunk, rotating and flushing as needed."""
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if self.max_bytes and self._size and self._size + len(data) > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._size += len(data)
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = now
+
+    def close(self):
+        """Flush and close the file; a restarted process reopens it."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
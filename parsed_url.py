@@ -0,0 +1,98 @@
+"""
+Parsed URL model shared by filter matching and command preparation.
+Each distinct URL string is parsed once and kept in a bounded LRU cache.
+"""
+
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+# Distinct URLs kept parsed, enough for a few steps of several thousand flows
+URL_CACHE_SIZE = 32768
+
+
+class ParsedUrl:
+    """
+    Parts of a flow step or filter URL.
+
+    The split URL, matching token and local path are computed on creation,
+    query parameters and host on first access. Instances are cached and
+    shared, treat them and their ``params`` as read-only.
+    """
+
+    __slots__ = ('url', 'scheme', 'process_name', 'local_path', 'token', '_parsed', '_params', '_host')
+
+    def __init__(self, url: str):
+        """
+        Parse a URL.
+
+        Args:
+            url: Full URL or simple scheme string (``rtsp``)
+        """
+        self.url = url
+        self.local_path = url
+        self.process_name = ''
+        self._params: Optional[Dict[str, str]] = None
+        self._host: Optional[str] = None
+        if '://' not in url:
+            # Simple scheme strings used in filters
+            self.scheme = url
+            self._parsed = None
+            self.token: Tuple[str, Tuple[str, ...], Optional[int]] = (url.lower(), (), None)
+            return
+
+        parsed = self._parsed = urlparse(url)
+        self.scheme = parsed.scheme
+
+        # process:// keeps its name in the netloc or path
+        if parsed.scheme == 'process':
+            self.process_name = parsed.path.strip('/').split('?')[0] or parsed.netloc.split('?')[0]
+
+        # file:///abs/path becomes ./abs/path relative to the working directory
+        if url.startswith('file:///'):
+            path = url[7:]
+            self.local_path = '.' + path if path.startswith('/') else path
+
+        # Matching token: scheme, lowercase host and path segments, and the port kept
+        # apart so filters without one match any port
+        if parsed.scheme == 'process':
+            host = parsed.netloc
+        else:
+            host = parsed.hostname or ''
+        try:
+            port = parsed.port
+        except ValueError:
+            port = None
+        self.token = (parsed.scheme, tuple(s for s in f"{host}/{parsed.path}".split('/') if s), port)
+
+    @property
+    def params(self) -> Dict[str, str]:
+        """Query parameters, first value of each."""
+        if self._params is None:
+            query = self._parsed.query if self._parsed is not None else ''
+            self._params = {key: values[0] for key, values in parse_qs(query).items()} if query else {}
+        return self._params
+
+    @property
+    def host(self) -> Optional[str]:
+        """Host name without credentials and port, None for simple schemes."""
+        if self._host is None and self._parsed is not None:
+            self._host = self._parsed.hostname
+        return self._host
+
+    def __repr__(self) -> str:
+        return f"ParsedUrl({self.url!r})"
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def parse_url(url: str) -> ParsedUrl:
+    """
+    Get the parsed form of a URL, parsing it only on first use.
+
+    Args:
+        url: Full URL or simple scheme string
+
+    Returns:
+        ParsedUrl: Shared parsed URL
+    """
+    return ParsedUrl(url)
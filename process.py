@@ -5,14 +5,31 @@ Handles process lifecycle, data streaming, and health monitoring.
 
 import subprocess
 import threading
-import queue
 import signal
-import time
 import os
+import time
 import logging
-from typing import Optional, Dict, Callable
+from collections import deque
+from typing import Optional, Dict, Callable, List, Tuple, TYPE_CHECKING
 from enum import Enum
 
+from exit_watcher import get_exit_watcher
+from ring_buffer import RingBuffer, count_lines
+from ffmpeg_progress import FfmpegProgress
+from frame_reader import Frame, FramePool, FrameReader
+from process_utils import AdoptedPopen, split_command
+from cgroups import FlowCgroup
+from output_sinks import OutputSink, RingBufferSink, ProgressSink, CallbackSink
+
+# Bytes read from a pipe at once, delivered to sinks as one batch
+READ_SIZE = 65536
+
+# Seconds a sink that raised is skipped before it is tried again
+SINK_RETRY_INTERVAL = 30.0
+
+if TYPE_CHECKING:
+    from supervisor import ProcessSupervisor
+
 class ProcessState(Enum):
     """Process states for lifecycle management."""
     INIT = "initialized"
@@ -20,8 +37,21 @@ class ProcessState(Enum):
     RUNNING = "running"
     STOPPING = "stopping"
     STOPPED = "stopped"
+    RESTARTING = "restarting"
+    PARKED = "parked"
+    # Flows held back by admission control, never set on a ManagedProcess
+    QUEUED = "queued"
+    REJECTED = "rejected"
     ERROR = "error"
 
+class StopOutcome(Enum):
+    """How a process ended when stopped."""
+    STOPPED = "stopped"
+    KILLED = "killed"
+    NOT_RUNNING = "not_running"
+    FAILED = "failed"
+
+
 class ManagedProcess:
     """
     Managed process with control, monitoring and data streaming.
@@ -33,7 +63,18 @@ class ManagedProcess:
                  command: str,
                  on_output: Optional[Callable[[str], None]] = None,
                  on_error: Optional[Callable[[str], None]] = None,
-                 on_exit: Optional[Callable[[int], None]] = None):
+                 on_exit: Optional[Callable[[int], None]] = None,
+                 supervisor: Optional['ProcessSupervisor'] = None,
+                 buffer_lines: int = 1000,
+                 buffer_bytes: int = 256 * 1024,
+                 progress: bool = False,
+                 frame_size: int = 0,
+                 frame_buffers: int = 4,
+                 frame_shape: Optional[Tuple[int, ...]] = None,
+                 on_frame: Optional[Callable[[Frame], None]] = None,
+                 shell: bool = False,
+                 sinks: Optional[List[OutputSink]] = None,
+                 cgroup: Optional[FlowCgroup] = None):
         """
         Initialize managed process.
         
@@ -43,9 +84,28 @@ class ManagedProcess:
             on_output: Callback for stdout data
             on_error: Callback for stderr data
             on_exit: Callback for process exit
+            supervisor: Shared event loop handling pipes and exit instead of
+                per-process threads
+            buffer_lines: Lines kept per output stream for get_output/get_error,
+                0 disables buffering
+            buffer_bytes: Total line length kept per output stream
+            progress: Parse ffmpeg progress from output into numeric samples
+            frame_size: Read stdout as binary frames of this many bytes instead
+                of text lines
+            frame_buffers: Number of reusable frame buffers
+            frame_shape: NumPy array shape of a frame, plain bytearrays if None
+            on_frame: Callback for every frame, which must release it; frames
+                are kept for get_frame otherwise
+            shell: Always run the command through /bin/sh; otherwise only
+                commands using shell syntax do and the rest are executed
+                directly
+            sinks: Further sinks receiving output in batches, e.g. a
+                rotating log file; output nobody consumes is only counted
+            cgroup: cgroup v2 the process group is moved into on every start
         """
         self.name = name
         self.command = command
+        self.argv = None if shell else split_command(command)
         self.process: Optional[subprocess.Popen] = None
         self.state = ProcessState.INIT
         self.exit_code: Optional[int] = None
@@ -54,56 +114,184 @@ class ManagedProcess:
         self.on_output = on_output
         self.on_error = on_error
         self.on_exit = on_exit
+        self.supervisor = supervisor
         
-        # Data queues
-        self.stdout_queue = queue.Queue()
-        self.stderr_queue = queue.Queue()
+        # Bounded output buffers
+        self.stdout_buffer = RingBuffer(buffer_lines, buffer_bytes)
+        self.stderr_buffer = RingBuffer(buffer_lines, buffer_bytes)
+        self.progress = FfmpegProgress() if progress else None
+
+        # Output consumers, each gets every chunk read from a pipe at once
+        self.sinks: List[OutputSink] = []
+        if self.stdout_buffer.enabled:
+            self.sinks.append(RingBufferSink(self.stdout_buffer, self.stderr_buffer))
+        self._progress_sink = ProgressSink(self.progress) if progress else None
+        if self._progress_sink:
+            self.sinks.append(self._progress_sink)
+        if on_output or on_error:
+            self.sinks.append(CallbackSink(on_output, on_error))
+        self.sinks.extend(sinks or [])
+        self.cgroup = cgroup
+        self._line_sinks = [sink for sink in self.sinks if sink.wants_lines]
+        self._chunk_sinks = [sink for sink in self.sinks if not sink.wants_lines]
+        # Failed sinks and the time they are tried again
+        self._suspended_sinks: Dict[OutputSink, float] = {}
+        # Unterminated line tail of each stream, indexed by is_stderr
+        self._partial = [b'', b'']
+        self._open_pipes = 0
+        self._pipes_lock = threading.Lock()
+
+        # Binary frame channel on stdout
+        self.frame_size = frame_size
+        self.frame_pool = FramePool(frame_size, frame_buffers, frame_shape) if frame_size else None
+        self.frame_reader: Optional[FrameReader] = None
+        self.on_frame = on_frame
+        self._ready_frames = deque()
+        self._frame_cond = threading.Condition()
+
+        # Output counters indexed by is_stderr, read by metrics at scrape time
+        self.output_lines = [0, 0]
+        self.output_bytes = [0, 0]
         
+        # Restart and liveness bookkeeping
+        self.restarts = 0
+        self.stalls = 0
+        self.started_at: Optional[float] = None
+        self.last_activity: Optional[float] = None
+        self.adopted = False
+
         # Control
         self._stop_event = threading.Event()
-        self._monitor_thread: Optional[threading.Thread] = None
+        self._exited = threading.Event()
         self._stdout_thread: Optional[threading.Thread] = None
         self._stderr_thread: Optional[threading.Thread] = None
         
         # Logging
         self.logger = logging.getLogger(f"Process.{name}")
 
-    def _stream_output(self, pipe, queue_out: queue.Queue, is_stderr: bool = False):
-        """Stream output from process pipe to queue."""
+    def _handle_chunk(self, data: bytes, is_stderr: bool = False):
+        """Count a chunk read from a pipe and pass it to the sinks."""
+        self.last_activity = time.monotonic()
+        self.output_bytes[is_stderr] += len(data)
+        self.output_lines[is_stderr] += count_lines(data)
+
+        for sink in self._chunk_sinks:
+            if self._suspended_sinks and not self._sink_ready(sink):
+                continue
+            try:
+                sink.write_chunk(data, is_stderr)
+            except Exception as e:
+                self._suspend_sink(sink, e)
+        if not self._line_sinks:
+            return
+
+        data = self._partial[is_stderr] + data
+        end = max(data.rfind(b'\n'), data.rfind(b'\r'))
+        self._partial[is_stderr] = data[end + 1:]
+        if end >= 0:
+            self._deliver_lines(data[:end + 1], is_stderr)
+
+    def _deliver_lines(self, data: bytes, is_stderr: bool):
+        """Decode complete lines once and hand them to the line sinks."""
+        lines = [line.strip() for line in data.decode('utf-8', 'replace').splitlines()]
+        for sink in self._line_sinks:
+            if self._suspended_sinks and not self._sink_ready(sink):
+                continue
+            try:
+                sink.write_lines(lines, is_stderr)
+            except Exception as e:
+                self._suspend_sink(sink, e)
+
+    def _suspend_sink(self, sink: OutputSink, error: Exception):
+        """Skip a failing sink for a while, the pipe keeps being drained for the others."""
+        self._suspended_sinks[sink] = time.monotonic() + SINK_RETRY_INTERVAL
+        self.logger.error(f"Output sink {type(sink).__name__} failed, skipping it for "
+                          f"{SINK_RETRY_INTERVAL:g}s: {str(error)}")
+
+    def _sink_ready(self, sink: OutputSink) -> bool:
+        """Check if a sink is not suspended, resuming it once its interval passed."""
+        retry = self._suspended_sinks.get(sink)
+        if retry is None:
+            return True
+        if time.monotonic() < retry:
+            return False
+        self._suspended_sinks.pop(sink, None)
+        return True
+
+    def _handle_line(self, line: str, is_stderr: bool = False):
+        """Pass a single output line, as a chunk would."""
+        self._handle_chunk(line.encode() + b'\n', is_stderr)
+
+    def _close_output(self, is_stderr: bool):
+        """Deliver the last unterminated line of a stream; close sinks after the last pipe."""
+        partial, self._partial[is_stderr] = self._partial[is_stderr], b''
+        if partial and self._line_sinks:
+            self._deliver_lines(partial, is_stderr)
+        with self._pipes_lock:
+            self._open_pipes -= 1
+            last = self._open_pipes == 0
+        if last:
+            for sink in self.sinks:
+                try:
+                    sink.close()
+                except Exception as e:
+                    self.logger.error(f"Error closing output sink: {str(e)}")
+
+    def _handle_exit(self, exit_code: int):
+        """Record process exit and notify unless the exit was requested."""
+        self.exit_code = exit_code
+        if not self._stop_event.is_set():
+            self.state = ProcessState.STOPPED
+            if self.on_exit:
+                self.on_exit(self.exit_code)
+
+            self.logger.info(f"Process exited with code {self.exit_code}")
+
+        self._exited.set()
+
+    def _handle_frame(self, frame: Frame):
+        """Pass a frame to the callback or keep it for get_frame."""
+        self.last_activity = time.monotonic()
+        if self.on_frame:
+            self.on_frame(frame)
+            return
+        with self._frame_cond:
+            self._ready_frames.append(frame)
+            self._frame_cond.notify()
+
+    def _read_frames(self):
+        """Read binary frames from stdout until EOF."""
+        try:
+            self.frame_reader.run(self._handle_frame)
+        except Exception as e:
+            self.logger.error(f"Error reading frames: {str(e)}")
+        finally:
+            self.process.stdout.close()
+
+    def _line_pipes(self) -> List[Tuple[object, bool]]:
+        """Pipes carrying text lines, as (pipe, is_stderr) pairs."""
+        pipes = [(self.process.stderr, True)]
+        if not self.frame_size:
+            pipes.insert(0, (self.process.stdout, False))
+        return pipes
+
+    def _stream_output(self, pipe, is_stderr: bool = False):
+        """Read chunks from a process pipe and hand them to the sinks."""
+        fd = pipe.fileno()
         try:
             while not self._stop_event.is_set():
-                line = pipe.readline()
-                if not line:
+                data = os.read(fd, READ_SIZE)
+                if not data:
                     break
-                    
-                line = line.strip()
-                queue_out.put(line)
-                
-                if is_stderr and self.on_error:
-                    self.on_error(line)
-                elif not is_stderr and self.on_output:
-                    self.on_output(line)
-                    
+
+                self._handle_chunk(data, is_stderr)
+
         except Exception as e:
             self.logger.error(f"Error reading {'stderr' if is_stderr else 'stdout'}: {str(e)}")
-            
+
         finally:
             pipe.close()
-
-    def _monitor(self):
-        """Monitor process health and handle exit."""
-        while not self._stop_event.is_set():
-            if self.process.poll() is not None:
-                self.exit_code = self.process.returncode
-                self.state = ProcessState.STOPPED
-                
-                if self.on_exit:
-                    self.on_exit(self.exit_code)
-                    
-                self.logger.info(f"Process exited with code {self.exit_code}")
-                break
-                
-            time.sleep(0.1)
+            self._close_output(is_stderr)
 
     def start(self) -> bool:
         """
@@ -118,41 +306,36 @@ class ManagedProcess:
             
         try:
             self.state = ProcessState.STARTING
+            self.adopted = False
             self.logger.info(f"Starting process: {self.command}")
             
-            # Start process with pipes
+            # Without a shell signals reach the program itself and no extra process is spawned
             self.process = subprocess.Popen(
-                self.command,
+                self.argv if self.argv is not None else self.command,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                shell=True,
-                text=True,
+                shell=self.argv is None,
                 start_new_session=True,
-                bufsize=1,
-                universal_newlines=True
-            )
-            
-            # Start monitoring threads
-            self._monitor_thread = threading.Thread(
-                target=self._monitor,
-                daemon=True
-            )
-            self._stdout_thread = threading.Thread(
-                target=self._stream_output,
-                args=(self.process.stdout, self.stdout_queue),
-                daemon=True
+                bufsize=0
             )
-            self._stderr_thread = threading.Thread(
-                target=self._stream_output,
-                args=(self.process.stderr, self.stderr_queue, True),
-                daemon=True
-            )
-            
-            self._monitor_thread.start()
-            self._stdout_thread.start()
-            self._stderr_thread.start()
             
+            if self.cgroup:
+                self.cgroup.attach(self.process.pid)
+
+            # Mark running before readers start so an early exit is not overwritten
+            self.started_at = self.last_activity = time.monotonic()
             self.state = ProcessState.RUNNING
+            self._partial = [b'', b'']
+            self._open_pipes = len(self._line_pipes())
+            if self.frame_size:
+                self.frame_reader = FrameReader(self.process.stdout, self.frame_pool)
+                threading.Thread(target=self._read_frames, daemon=True).start()
+            if self.supervisor:
+                self.supervisor.register(self)
+            else:
+                self._start_threads()
+            get_exit_watcher().watch(self.process, self._handle_exit)
+            
             self.logger.info(f"Process started with PID {self.process.pid}")
             return True
             
@@ -161,6 +344,144 @@ class ManagedProcess:
             self.state = ProcessState.ERROR
             return False
 
+    @classmethod
+    def adopt(cls, pid: int, name: str, command: str, starttime: Optional[int] = None,
+              **kwargs) -> 'ManagedProcess':
+        """
+        Take over a process left running by an earlier router instance.
+
+        The process keeps running untouched. Its output pipes belonged to
+        the previous router, so only its exit and stop are managed; a
+        restart starts a fresh child with pipes as usual.
+
+        Args:
+            pid: Process group leader to adopt
+            name: Process identifier
+            command: Command the process was started with
+            starttime: Start time from /proc, guards against PID reuse
+            **kwargs: Further ManagedProcess arguments
+
+        Returns:
+            ManagedProcess: Running managed process
+        """
+        managed = cls(name, command, **kwargs)
+        managed.process = AdoptedPopen(pid, starttime)
+        managed.adopted = True
+        managed.started_at = managed.last_activity = time.monotonic()
+        managed.state = ProcessState.RUNNING
+        get_exit_watcher().watch(managed.process, managed._handle_exit)
+        managed.logger.info(f"Adopted running process with PID {pid}")
+        return managed
+
+    def restart(self) -> bool:
+        """
+        Start the same command again after the process exited.
+
+        Returns:
+            bool: True if the process started again
+        """
+        if self.state not in [ProcessState.STOPPED, ProcessState.ERROR, ProcessState.RESTARTING] \
+                or self._stop_event.is_set():
+            self.logger.error(f"Cannot restart process in state {self.state}")
+            return False
+
+        self.restarts += 1
+        self.exit_code = None
+        self._exited.clear()
+        if self.progress is not None:
+            self.progress = self._progress_sink.progress = FfmpegProgress()
+        self.state = ProcessState.INIT
+        return self.start()
+
+    @property
+    def uptime(self) -> float:
+        """Seconds since the process was last started."""
+        return time.monotonic() - self.started_at if self.started_at is not None else 0.0
+
+    @property
+    def idle_time(self) -> float:
+        """
+        Seconds without progress.
+
+        Uses the last advancing progress sample when progress parsing is on
+        and ffmpeg reported any, otherwise the last output line or frame.
+        """
+        if self.progress is not None and self.progress.advanced is not None:
+            last = max(self.progress.advanced, self.started_at)
+        else:
+            last = self.last_activity
+        return time.monotonic() - last if last is not None else 0.0
+
+    def _signal_group(self, sig: int) -> bool:
+        """Send a signal to the process group, False if it is already gone."""
+        try:
+            os.killpg(os.getpgid(self.process.pid), sig)
+            return True
+        except ProcessLookupError:
+            return False
+
+    def terminate(self, timeout: float = 5) -> bool:
+        """
+        Kill a hung process like a crash, so exit callbacks and restarts run.
+
+        Sends SIGTERM to the process group and SIGKILL if it does not exit
+        within ``timeout``. Unlike ``stop`` the exit is not marked as
+        requested.
+
+        Args:
+            timeout: Seconds to wait before SIGKILL
+
+        Returns:
+            bool: True if the process was running and has exited
+        """
+        if not self.is_running():
+            return False
+        self.logger.warning(f"Sending SIGTERM to hung process group {self.process.pid}")
+        self._signal_group(signal.SIGTERM)
+        if not self._exited.wait(timeout):
+            self.logger.warning("Hung process ignored SIGTERM, force killing")
+            self._signal_group(signal.SIGKILL)
+            self._exited.wait(timeout)
+        return True
+
+    def _start_threads(self):
+        """Start output reader threads for this process."""
+        for pipe, is_stderr in self._line_pipes():
+            thread = threading.Thread(
+                target=self._stream_output,
+                args=(pipe, is_stderr),
+                daemon=True
+            )
+            if is_stderr:
+                self._stderr_thread = thread
+            else:
+                self._stdout_thread = thread
+            thread.start()
+
+    def request_stop(self) -> bool:
+        """
+        Mark the stop as requested and send SIGTERM to the process group.
+
+        Returns:
+            bool: True if a running process was signalled and should be
+            waited for, False if nothing is running
+        """
+        self._stop_event.set()
+        if self.state not in [ProcessState.RUNNING, ProcessState.ERROR] \
+                or self.process is None or self._exited.is_set():
+            # Nothing is running between restarts or after an exit
+            self.state = ProcessState.STOPPED
+            return False
+
+        self.state = ProcessState.STOPPING
+        self.logger.info(f"Sending SIGTERM to process group {self.process.pid}")
+        return self._signal_group(signal.SIGTERM)
+
+    def kill(self):
+        """Send SIGKILL to the process group."""
+        self.logger.warning("Process did not stop gracefully, force killing")
+        self._signal_group(signal.SIGKILL)
+
     def stop(self, timeout: int = 6) -> bool:
         """
         Stop the managed process.
@@ -171,40 +492,11 @@ class ManagedProcess:
         Returns:
             bool: True if process stopped successfully
         """
-        if self.state not in [ProcessState.RUNNING, ProcessState.ERROR]:
+        if self.state not in [ProcessState.RUNNING, ProcessState.ERROR,
+                              ProcessState.RESTARTING, ProcessState.PARKED]:
             self.logger.error(f"Cannot stop process in state {self.state}")
             return False
-            
-        try:
-            self.state = ProcessState.STOPPING
-            self._stop_event.set()
-            
-            # Send SIGTERM to process group
-            if self.process and self.process.poll() is None:
-                self.logger.info(f"Sending SIGTERM to process group {self.process.pid}")
-                os.killpg(os.getpgid(self.process.pid), signal.SIGTERM)
-                
-            # Wait for process to exit
-            stop_time = time.time() + timeout
-            while time.time() < stop_time:
-                if self.process.poll() is not None:
-                    self.state = ProcessState.STOPPED
-                    self.logger.info("Process stopped gracefully")
-                    return True
-                time.sleep(0.1)
-                
-            # Force kill if still running
-            if self.process.poll() is None:
-                self.logger.warning("Process did not stop gracefully, force killing")
-                os.killpg(os.getpgid(self.process.pid), signal.SIGKILL)
-                self.process.wait()
-                
-            self.state = ProcessState.STOPPED
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"Error stopping process: {str(e)}")
-            return False
+        return stop_processes({self.name: self}, timeout)[self.name] != StopOutcome.FAILED
 
     def is_running(self) -> bool:
         """Check if process is running."""
@@ -214,33 +506,42 @@ class ManagedProcess:
 
     def get_output(self, timeout: float = 0.1) -> Optional[str]:
         """
-        Get next line from stdout queue.
+        Get oldest buffered line from stdout.
         
         Args:
             timeout: Seconds to wait for data
             
         Returns:
-            str: Output line or None if queue empty
+            str: Output line or None if buffer empty
         """
-        try:
-            return self.stdout_queue.get(timeout=timeout)
-        except queue.Empty:
-            return None
+        return self.stdout_buffer.get(timeout)
 
     def get_error(self, timeout: float = 0.1) -> Optional[str]:
         """
-        Get next line from stderr queue.
+        Get oldest buffered line from stderr.
         
         Args:
             timeout: Seconds to wait for data
             
         Returns:
-            str: Error line or None if queue empty
+            str: Error line or None if buffer empty
         """
-        try:
-            return self.stderr_queue.get(timeout=timeout)
-        except queue.Empty:
-            return None
+        return self.stderr_buffer.get(timeout)
+
+    def get_frame(self, timeout: float = 0.1) -> Optional[Frame]:
+        """
+        Get oldest unread frame; call ``release()`` on it when done.
+        
+        Args:
+            timeout: Seconds to wait for a frame
+            
+        Returns:
+            Frame: Frame buffer or None if no frame arrived
+        """
+        with self._frame_cond:
+            if not self._ready_frames and not self._frame_cond.wait_for(lambda: self._ready_frames, timeout):
+                return None
+            return self._ready_frames.popleft()
 
     def get_state(self) -> Dict:
         """
@@ -254,5 +555,69 @@ class ManagedProcess:
             "state": self.state.value,
             "pid": self.process.pid if self.process else None,
             "exit_code": self.exit_code,
-            "command": self.command
+            "restarts": self.restarts,
+            "stalls": self.stalls,
+            "adopted": self.adopted,
+            "command": self.command,
+            "shell": self.argv is None,
+            "cgroup": self.cgroup.path if self.cgroup else None,
+            "buffers": {
+                "stdout": self.stdout_buffer.stats(),
+                "stderr": self.stderr_buffer.stats()
+            },
+            "progress": self.progress.as_dict() if self.progress is not None else None,
+            "frames": {
+                "read": self.frame_reader.frames,
+                "dropped": self.frame_reader.dropped
+            } if self.frame_reader is not None else None
         }
+
+
+def stop_processes(processes: Dict[str, ManagedProcess], timeout: float = 6,
+                   kill_timeout: float = 2) -> Dict[str, StopOutcome]:
+    """
+    Stop many processes at once against a single deadline.
+
+    Every process group gets SIGTERM first, then all exits are awaited
+    concurrently until the deadline, and the stragglers are sent SIGKILL
+    together. Total time is bounded by ``timeout + kill_timeout`` however
+    many processes hang.
+
+    Args:
+        processes: Processes by name
+        timeout: Seconds all processes together get to exit after SIGTERM
+        kill_timeout: Seconds to wait for exits after SIGKILL
+
+    Returns:
+        dict: Outcome per process name
+    """
+    outcomes: Dict[str, StopOutcome] = {}
+    pending: Dict[str, ManagedProcess] = {}
+    for name, process in processes.items():
+        try:
+            if process.request_stop():
+                pending[name] = process
+            else:
+                outcomes[name] = StopOutcome.NOT_RUNNING
+        except Exception as e:
+            process.logger.error(f"Error stopping process: {str(e)}")
+            outcomes[name] = StopOutcome.FAILED
+
+    # Exits arrive through the shared watcher, waiting in turn costs no extra time
+    deadline = time.monotonic() + timeout
+    for name, process in list(pending.items()):
+        if process._exited.wait(max(0.0, deadline - time.monotonic())):
+            process.state = ProcessState.STOPPED
+            outcomes[name] = StopOutcome.STOPPED
+            del pending[name]
+
+    for process in pending.values():
+        process.kill()
+    deadline = time.monotonic() + kill_timeout
+    for name, process in pending.items():
+        if process._exited.wait(max(0.0, deadline - time.monotonic())):
+            process.state = ProcessState.STOPPED
+            outcomes[name] = StopOutcome.KILLED
+        else:
+            outcomes[name] = StopOutcome.FAILED
+    return outcomes
@@ -3,155 +3,438 @@ Process utilities for Stream Filter Router.
 Handles process discovery and management.
 """
 
+import hashlib
+import os
+import pwd
+import shlex
+import signal
 import subprocess
-import re
-import json
+import time
 import logging
-from typing import List, Dict, Set
+from typing import List, Dict, Optional, Pattern, Tuple
 
 logger = logging.getLogger("ProcessUtils")
 
-def extract_commands_from_config(process_config_path: str) -> Set[str]:
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Shells whose "-c" argument is the command actually configured
+_SHELLS = {'sh', 'bash', 'dash', 'zsh'}
+
+# Shell operators, as split off by shlex with punctuation_chars
+_SHELL_OPERATOR_CHARS = set('();<>|&')
+
+# Pathname expansion characters
+_GLOB_CHARS = set('*?[')
+
+# Leading words only a shell understands
+_SHELL_WORDS = {'.', ':', '!', '{', 'cd', 'source', 'export', 'set', 'unset', 'eval', 'if', 'for',
+                'while', 'until', 'case', 'ulimit', 'umask', 'trap', 'alias', 'read', 'wait'}
+
+# Readable part of names derived from process IDs
+_SLUG_LENGTH = 48
+
+_users: Dict[int, str] = {}
+
+
+def _user_name(uid: int) -> str:
+    """Resolve a user ID, cached."""
+    if uid not in _users:
+        try:
+            _users[uid] = pwd.getpwuid(uid).pw_name
+        except KeyError:
+            _users[uid] = str(uid)
+    return _users[uid]
+
+
+def _read_first_value(path: str, key: str) -> Optional[float]:
+    """Read the first number after ``key`` in a /proc text file."""
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(key):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _format_cpu_time(seconds: float) -> str:
+    """Format CPU time like ps: HH:MM:SS."""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def read_process(pid: int, boot_time: float = 0.0, uptime: float = 0.0, mem_total: float = 0.0) -> Optional[Dict]:
     """
-    Extract command names from process configuration.
-    
+    Read information about a single process from /proc.
+
     Args:
-        process_config_path: Path to process.json
-        
+        pid: Process ID
+        boot_time: System boot time, for the start column
+        uptime: System uptime in seconds, for CPU percentage
+        mem_total: Total memory in kB, for memory percentage
+
     Returns:
-        set: Set of command names (e.g., ffmpeg, python)
+        dict: Process information in the same string format ``ps`` gave,
+        plus ``argv``, ``pgrp`` and ``starttime``; None for kernel threads
+        and processes that are gone
     """
-    commands = set()
     try:
-        with open(process_config_path, 'r') as f:
-            config = json.load(f)
-            
-        for process in config:
-            if 'run' in process:
-                for cmd in process['run']:
-                    if cmd.startswith('shell://'):
-                        # Extract the main command name (e.g., ffmpeg from ffmpeg -i ...)
-                        cmd_name = cmd[7:].lstrip('/').split()[0]
-                        commands.add(cmd_name)
-                        
-        return commands
-    except Exception as e:
-        logger.error(f"Error extracting commands from config: {str(e)}")
-        return set()
-
-def find_running_processes(command_names: Set[str]) -> List[Dict]:
-    """
-    Find running processes matching given command names.
-    
-    Args:
-        command_names: Set of command names to look for
-        
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            cmdline = f.read()
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+        uid = os.stat(f'/proc/{pid}').st_uid
+    except OSError:
+        return None
+    if not cmdline:
+        return None
+
+    argv = [arg.decode(errors='replace') for arg in cmdline.rstrip(b'\0').split(b'\0')]
+    # Fields after the parenthesised command name, which may contain spaces
+    fields = stat[stat.rfind(b')') + 2:].split()
+    cpu = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    starttime = int(fields[19])
+    elapsed = uptime - starttime / _CLOCK_TICKS
+    rss_kb = int(fields[21]) * _PAGE_SIZE / 1024
+
+    return {
+        'pid': str(pid),
+        'ppid': fields[1].decode(),
+        'user': _user_name(uid),
+        'cpu': f"{100 * cpu / elapsed:.1f}" if elapsed > 0 else "0.0",
+        'mem': f"{100 * rss_kb / mem_total:.1f}" if mem_total else "0.0",
+        'state': fields[0].decode(),
+        'start': time.strftime('%H:%M', time.localtime(boot_time + starttime / _CLOCK_TICKS)),
+        'time': _format_cpu_time(cpu),
+        'command': ' '.join(argv),
+        'argv': argv,
+        'pgrp': int(fields[2]),
+        'starttime': starttime
+    }
+
+
+def scan_processes() -> List[Dict]:
+    """
+    List all user space processes by reading /proc directly.
+
     Returns:
-        list: List of process information dictionaries
+        list: Process information dictionaries, empty without /proc
     """
-    processes = []
-    
     try:
-        # Get all running processes
-        ps = subprocess.run(
-            ['ps', '-eo', 'pid,ppid,user,%cpu,%mem,stat,start,time,command'],
-            capture_output=True,
-            text=True
-        )
-        
-        if ps.returncode != 0:
-            logger.error("Failed to get process list")
-            return processes
-            
-        # Parse ps output
-        lines = ps.stdout.split('\n')[1:]  # Skip header
-        for line in lines:
-            if not line.strip():
-                continue
-                
-            parts = line.split(None, 8)  # Split into 9 parts (last part is command)
-            if len(parts) < 9:
-                continue
-                
-            cmd = parts[8]
-            cmd_name = cmd.split()[0]
-            
-            # Check if this command matches any we're looking for
-            for name in command_names:
-                if cmd_name.endswith(name):
-                    processes.append({
-                        'pid': parts[0],
-                        'ppid': parts[1],
-                        'user': parts[2],
-                        'cpu': parts[3],
-                        'mem': parts[4],
-                        'state': parts[5],
-                        'start': parts[6],
-                        'time': parts[7],
-                        'command': cmd
-                    })
-                    break
-                    
-        return processes
-    except Exception as e:
-        logger.error(f"Error finding processes: {str(e)}")
+        pids = [int(entry) for entry in os.listdir('/proc') if entry.isdigit()]
+    except OSError:
+        logger.error("Failed to read /proc")
         return []
 
-def format_process_info(processes: List[Dict]) -> str:
+    boot_time = _read_first_value('/proc/stat', 'btime') or 0.0
+    try:
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except OSError:
+        uptime = 0.0
+    mem_total = _read_first_value('/proc/meminfo', 'MemTotal:') or 0.0
+
+    processes = []
+    for pid in pids:
+        info = read_process(pid, boot_time, uptime, mem_total)
+        if info is not None:
+            processes.append(info)
+    return processes
+
+
+def read_process_groups() -> Dict[int, Tuple[float, int]]:
+    """
+    Sum CPU time and resident memory of all processes per process group.
+
+    Returns:
+        dict: Process group ID -> (CPU seconds, RSS bytes), empty without /proc
     """
-    Format process information for display.
-    
+    groups: Dict[int, Tuple[float, int]] = {}
+    try:
+        pids = [entry for entry in os.listdir('/proc') if entry.isdigit()]
+    except OSError:
+        return groups
+
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Fields after the parenthesised command name, which may contain spaces
+        fields = stat[stat.rfind(b')') + 2:].split()
+        pgrp = int(fields[2])
+        cpu = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+        rss = int(fields[21]) * _PAGE_SIZE
+        total_cpu, total_rss = groups.get(pgrp, (0.0, 0))
+        groups[pgrp] = (total_cpu + cpu, total_rss + rss)
+    return groups
+
+
+def process_slug(process_id: str) -> str:
+    """
+    Short, stable file name for a process ID.
+
+    Process IDs hold whole step URL chains, too long for a file name and
+    with credentials. The name keeps a sanitized prefix up to the first
+    URL scheme for readability and adds a hash of the full ID, so distinct
+    IDs never share a name.
+
     Args:
-        processes: List of process information dictionaries
-        
+        process_id: Process identifier
+
     Returns:
-        str: Formatted process information
-    """
-    if not processes:
-        return "No matching processes found."
-        
-    # Calculate column widths
-    widths = {
-        'pid': max(len(p['pid']) for p in processes),
-        'user': max(len(p['user']) for p in processes),
-        'cpu': max(len(p['cpu']) for p in processes),
-        'mem': max(len(p['mem']) for p in processes),
-        'start': max(len(p['start']) for p in processes),
-        'time': max(len(p['time']) for p in processes)
-    }
-    
-    # Create format string
-    fmt = ("PID: {:<" + str(widths['pid']) + "} | "
-           "USER: {:<" + str(widths['user']) + "} | "
-           "CPU: {:>" + str(widths['cpu']) + "}% | "
-           "MEM: {:>" + str(widths['mem']) + "}% | "
-           "START: {:<" + str(widths['start']) + "} | "
-           "TIME: {:<" + str(widths['time']) + "} | "
-           "CMD: {}")
-    
-    # Format each process
-    lines = []
-    for p in processes:
-        lines.append(fmt.format(
-            p['pid'], p['user'], p['cpu'], p['mem'],
-            p['start'], p['time'], p['command']
-        ))
-    
-    return "\n".join(lines)
-
-def check_existing_processes(config_path: str) -> str:
-    """
-    Check for existing processes based on configuration.
-    
+        str: Name of at most 61 characters of ``[A-Za-z0-9_.-]``
+    """
+    prefix = ''.join(c if c.isalnum() or c in '-_.' else '_'
+                     for c in process_id.split('://', 1)[0][:_SLUG_LENGTH]).lstrip('.')
+    digest = hashlib.sha1(process_id.encode()).hexdigest()[:12]
+    return f"{prefix}-{digest}" if prefix else digest
+
+
+def _has_unquoted_glob(command: str) -> bool:
+    """
+    Check if the shell would expand a word of a command as a file pattern.
+
+    Words containing ``://`` are URLs, whose query strings could only match
+    files below a directory named like a URL scheme, and are left out.
+    """
+    quote = None
+    escaped = False
+    word, glob = '', False
+    for char in command + ' ':
+        if escaped:
+            escaped = False
+        elif quote:
+            if char == quote:
+                quote = None
+            elif char == '\\' and quote == '"':
+                escaped = True
+        elif char == '\\':
+            escaped = True
+        elif char in '\'"':
+            quote = char
+        elif char.isspace():
+            if glob and '://' not in word:
+                return True
+            word, glob = '', False
+            continue
+        elif char in _GLOB_CHARS:
+            glob = True
+        word += char
+    return False
+
+
+def split_command(command: str) -> Optional[List[str]]:
+    """
+    Split a command into an argv list if it can run without a shell.
+
+    Commands using pipes, redirection, command lists, subshells, variable
+    or command substitution, unquoted file patterns, ``~`` or leading
+    assignments and shell builtins need ``/bin/sh``. A leading ``exec`` is dropped, since running
+    the program directly has the same effect.
+
+    Args:
+        command: Prepared command string
+
+    Returns:
+        list: Program and arguments, None if the command needs a shell
+    """
+    if '$' in command or '`' in command or '\n' in command or _has_unquoted_glob(command):
+        return None
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    try:
+        argv = list(lexer)
+    except ValueError:
+        return None
+    if argv and argv[0] == 'exec':
+        argv = argv[1:]
+    if not argv or argv[0] in _SHELL_WORDS or '=' in argv[0].split('/')[0]:
+        return None
+    if any(set(arg) <= _SHELL_OPERATOR_CHARS or arg.startswith('~') for arg in argv):
+        return None
+    return argv
+
+
+def command_key(command: str) -> Optional[str]:
+    """
+    Normalize a shell command for comparison with process command lines.
+
+    Args:
+        command: Prepared command string
+
+    Returns:
+        str: Arguments joined by single spaces, None if it cannot be tokenized
+    """
+    argv = split_command(command)
+    if argv is not None:
+        return ' '.join(argv)
+    try:
+        return ' '.join(shlex.split(command))
+    except ValueError:
+        return None
+
+
+def _process_keys(argv: List[str]) -> List[str]:
+    """Command keys a process can match: its argv and the command of ``sh -c``."""
+    keys = [' '.join(argv)]
+    if len(argv) >= 3 and os.path.basename(argv[0]) in _SHELLS and argv[1] == '-c':
+        key = command_key(argv[2])
+        if key:
+            keys.append(key)
+    return keys
+
+
+def _program_names(argv: List[str]) -> List[str]:
+    """Executable names of a process, including the program run by ``sh -c``."""
+    names = [os.path.basename(argv[0])]
+    if len(argv) >= 3 and os.path.basename(argv[0]) in _SHELLS and argv[1] == '-c' and argv[2].split():
+        names.append(os.path.basename(argv[2].split()[0]))
+    return names
+
+
+def find_processes_by_command(commands: Dict[str, str], wildcard: Optional[Pattern[str]] = None,
+                              placeholder: str = '*') -> Dict[str, Dict]:
+    """
+    Find running processes whose full command line equals a prepared command.
+
+    Commands started by the router run as ``sh -c <command>``, or as the
+    program itself when the shell execs it, so both forms match. When a
+    shell and its child both match, the process group leader wins, which
+    is the process the router originally started.
+
+    With ``wildcard``, its matches in a process command line are replaced
+    by ``placeholder`` before comparing, so a prepared command holding the
+    placeholder matches any value there. The replaced values are kept in
+    the ``matched`` list of the process information.
+
+    Args:
+        commands: Key (e.g. process ID) -> prepared command
+        wildcard: Pattern of command line parts that may differ
+        placeholder: Text standing for the wildcard in prepared commands
+
+    Returns:
+        dict: Key -> information of the matching process
+    """
+    keys: Dict[str, str] = {}
+    for name, command in commands.items():
+        key = command_key(command)
+        if key:
+            keys[key] = name
+
+    found: Dict[str, Dict] = {}
+    own_pid = os.getpid()
+    for info in scan_processes():
+        pid = int(info['pid'])
+        if pid == own_pid:
+            continue
+        for key in _process_keys(info['argv']):
+            matched = []
+            if wildcard is not None:
+                matched = wildcard.findall(key)
+                key = wildcard.sub(lambda match: placeholder, key)
+            name = keys.get(key)
+            if name is None:
+                continue
+            current = found.get(name)
+            if current is None or (pid == info['pgrp'] and int(current['pid']) != current['pgrp']):
+                found[name] = dict(info, matched=matched) if wildcard is not None else info
+            break
+    return found
+
+
+def _alive(pid: int, starttime: Optional[int] = None) -> bool:
+    """Check that a process exists and is the same one (not a reused PID)."""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return False
+    fields = stat[stat.rfind(b')') + 2:].split()
+    if fields[0] == b'Z':
+        return False
+    return starttime is None or int(fields[19]) == starttime
+
+
+class AdoptedPopen:
+    """
+    Popen-like handle for a process started by an earlier router instance.
+
+    The process is not our child, so its exit status cannot be collected;
+    once it is gone ``returncode`` is set to ``UNKNOWN_EXIT``, which restart
+    policies treat as a failure. It has no pipes.
+    """
+
+    UNKNOWN_EXIT = -1
+
+    def __init__(self, pid: int, starttime: Optional[int] = None):
+        """
+        Initialize handle.
+
+        Args:
+            pid: Process ID
+            starttime: Start time from /proc, guards against PID reuse
+        """
+        self.pid = pid
+        self.starttime = starttime
+        self.returncode: Optional[int] = None
+        self.stdout = None
+        self.stderr = None
+
+    def poll(self) -> Optional[int]:
+        """Check if the process is gone."""
+        if self.returncode is None and not _alive(self.pid, self.starttime):
+            self.returncode = self.UNKNOWN_EXIT
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """
+        Wait for the process to go away.
+
+        Args:
+            timeout: Seconds to wait, None waits indefinitely
+
+        Returns:
+            int: ``UNKNOWN_EXIT``
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+            time.sleep(0.1)
+        return self.returncode
+
+
+def kill_process_groups(pgids: List[int], timeout: float = 6) -> int:
+    """
+    Terminate process groups, SIGKILL those still alive after ``timeout``.
+
     Args:
-        config_path: Path to process.json
-        
+        pgids: Process group IDs
+        timeout: Seconds all groups together get to exit after SIGTERM
+
     Returns:
-        str: Formatted information about found processes
-    """
-    commands = extract_commands_from_config(config_path)
-    if not commands:
-        return "No commands found in configuration."
-        
-    processes = find_running_processes(commands)
-    return format_process_info(processes)
+        int: Number of groups that had to be killed
+    """
+    alive = set()
+    for pgid in pgids:
+        try:
+            os.killpg(pgid, signal.SIGTERM)
+            alive.add(pgid)
+        except ProcessLookupError:
+            pass
+
+    deadline = time.monotonic() + timeout
+    while alive and time.monotonic() < deadline:
+        time.sleep(0.1)
+        alive = {pgid for pgid in alive if _alive(pgid)}
+
+    for pgid in alive:
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    return len(alive)
@@ -0,0 +1,114 @@
+"""
+Restart policy for managed processes: exponential backoff with jitter and
+crash-loop detection.
+"""
+
+import random
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Keys accepted in process.json rules and flows.json flows
+RESTART_KEYS = ('restart', 'restart_delay', 'restart_max_delay', 'restart_limit', 'restart_window')
+
+
+class RestartPolicy:
+    """
+    Decides whether and when an exited process is started again.
+
+    The delay doubles with every consecutive restart up to ``max_delay``
+    and is randomized by ``jitter`` so flows sharing a failed source do
+    not reconnect in lockstep. A process that ran for at least
+    ``max_delay`` counts as recovered and starts over at ``delay``. After
+    ``limit`` restarts within ``window`` seconds the process is parked.
+    """
+
+    POLICIES = ('always', 'on-failure', 'never')
+
+    def __init__(self,
+                 policy: str = 'never',
+                 delay: float = 1.0,
+                 max_delay: float = 60.0,
+                 limit: int = 5,
+                 window: float = 300.0,
+                 jitter: float = 0.2):
+        """
+        Initialize restart policy.
+
+        Args:
+            policy: ``always``, ``on-failure`` (non-zero exit code) or ``never``
+            delay: Seconds before the first restart
+            max_delay: Upper bound of the backoff delay
+            limit: Restarts within ``window`` before parking, 0 never parks
+            window: Seconds over which restarts are counted
+            jitter: Random fraction added to or removed from each delay
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown restart policy {policy!r}, expected one of {self.POLICIES}")
+        self.policy = policy
+        self.delay = delay
+        self.max_delay = max_delay
+        self.limit = limit
+        self.window = window
+        self.jitter = jitter
+
+        self.attempt = 0
+        self._restarts = deque()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'RestartPolicy':
+        """
+        Create a policy from ``restart*`` keys of a configuration entry.
+
+        Args:
+            config: Process rule, possibly merged with flow overrides
+
+        Returns:
+            RestartPolicy: Configured policy, ``never`` by default
+        """
+        return cls(
+            policy=config.get('restart', 'never'),
+            delay=float(config.get('restart_delay', 1.0)),
+            max_delay=float(config.get('restart_max_delay', 60.0)),
+            limit=int(config.get('restart_limit', 5)),
+            window=float(config.get('restart_window', 300.0))
+        )
+
+    def should_restart(self, exit_code: Optional[int]) -> bool:
+        """
+        Check if an exit calls for a restart.
+
+        Args:
+            exit_code: Exit code of the process
+
+        Returns:
+            bool: True if the policy restarts after this exit
+        """
+        if self.policy == 'always':
+            return True
+        return self.policy == 'on-failure' and exit_code != 0
+
+    def next_delay(self, uptime: float) -> Optional[float]:
+        """
+        Record a restart and compute its delay.
+
+        Args:
+            uptime: Seconds the process ran before exiting
+
+        Returns:
+            float: Seconds to wait before restarting, None if the process
+            is crash looping and should be parked
+        """
+        now = time.monotonic()
+        if uptime >= self.max_delay:
+            self.attempt = 0
+
+        while self._restarts and now - self._restarts[0] > self.window:
+            self._restarts.popleft()
+        if self.limit and len(self._restarts) >= self.limit:
+            return None
+        self._restarts.append(now)
+
+        delay = min(self.max_delay, self.delay * (2 ** self.attempt))
+        self.attempt += 1
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
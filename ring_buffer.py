@@ -0,0 +1,182 @@
+"""
+Bounded line buffer for process output.
+"""
+
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+
+def count_lines(data: bytes) -> int:
+    """Count line endings in raw output; ffmpeg ends progress lines with \\r only."""
+    if b'\r' not in data:
+        return data.count(b'\n')
+    return data.count(b'\n') + data.count(b'\r') - data.count(b'\r\n')
+
+
+class RingBuffer:
+    """
+    Keeps the most recent output lines within line and size limits.
+    Oldest lines are dropped and counted when a limit is exceeded.
+    A buffer with a zero limit is disabled and stores nothing.
+
+    Output is stored as the raw chunks read from the pipe and only decoded
+    and split into lines when they are read, so a buffer nobody reads
+    costs little more than counting line endings. The line limit is exact,
+    the size limit drops whole chunks but always keeps the newest one.
+    """
+
+    def __init__(self, max_lines: int = 1000, max_bytes: int = 256 * 1024):
+        """
+        Initialize ring buffer.
+
+        Args:
+            max_lines: Maximum number of buffered lines, 0 disables buffering
+            max_bytes: Maximum total size of buffered output, 0 disables buffering
+        """
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.enabled = max_lines > 0 and max_bytes > 0
+        self.dropped = 0
+        # Chunks of complete lines with their line counts, oldest first
+        self._chunks = deque()
+        # Leading lines of the oldest chunk already dropped
+        self._skip = 0
+        # Unterminated last line, completed by the next chunk
+        self._tail = b''
+        # Lines decoded by get() and not read yet, older than any chunk
+        self._lines = deque()
+        self._line_count = 0
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def put_chunk(self, data: bytes):
+        """
+        Append raw output, dropping the oldest lines beyond the limits.
+
+        Args:
+            data: Bytes read from the pipe, lines may span chunks
+        """
+        if not self.enabled:
+            self.dropped += count_lines(data)
+            return
+
+        with self._cond:
+            data = self._tail + data
+            end = max(data.rfind(b'\n'), data.rfind(b'\r'))
+            self._tail = data[end + 1:]
+            if end >= 0:
+                self._append(data[:end + 1])
+
+    def flush(self):
+        """Store an unterminated last line, e.g. once the process has exited."""
+        with self._cond:
+            if self._tail:
+                tail, self._tail = self._tail, b''
+                self._append(tail + b'\n')
+
+    def put(self, line: str):
+        """
+        Append a line, dropping the oldest ones beyond the limits.
+
+        Args:
+            line: Output line
+        """
+        self.put_many([line])
+
+    def put_many(self, lines: List[str]):
+        """
+        Append several lines under one lock, dropping the oldest beyond the limits.
+
+        Args:
+            lines: Output lines
+        """
+        if not self.enabled:
+            self.dropped += len(lines)
+            return
+        if lines:
+            with self._cond:
+                self._append(('\n'.join(lines) + '\n').encode('utf-8', 'replace'))
+
+    def _append(self, data: bytes):
+        """Store a chunk of complete lines and enforce the limits, lock held."""
+        lines = count_lines(data)
+        self._chunks.append((data, lines))
+        self._line_count += lines
+        self._size += len(data)
+
+        while self._lines and (self._line_count > self.max_lines or self._size > self.max_bytes):
+            line = self._lines.popleft()
+            self._line_count -= 1
+            self._size -= len(line)
+            self.dropped += 1
+        while self._size > self.max_bytes and len(self._chunks) > 1:
+            old, count = self._chunks.popleft()
+            self._line_count -= count - self._skip
+            self._size -= len(old)
+            self.dropped += count - self._skip
+            self._skip = 0
+        excess = self._line_count - self.max_lines
+        while excess > 0:
+            old, count = self._chunks[0]
+            if count - self._skip > excess or len(self._chunks) == 1:
+                self._skip += excess
+                self._line_count -= excess
+                self.dropped += excess
+                break
+            self._chunks.popleft()
+            self._line_count -= count - self._skip
+            self._size -= len(old)
+            self.dropped += count - self._skip
+            excess -= count - self._skip
+            self._skip = 0
+        self._cond.notify()
+
+    def _decode(self):
+        """Split stored chunks into lines, lock held."""
+        data = b''.join(chunk for chunk, _ in self._chunks)
+        lines = [line.strip() for line in data.decode('utf-8', 'replace').splitlines()]
+        self._size -= len(data)
+        self._line_count -= sum(count for _, count in self._chunks) - self._skip
+        self._chunks.clear()
+        lines = lines[self._skip:]
+        self._skip = 0
+        self._lines.extend(lines)
+        self._line_count += len(lines)
+        self._size += sum(map(len, lines))
+
+    def get(self, timeout: float = 0.1) -> Optional[str]:
+        """
+        Remove and return the oldest buffered line.
+
+        Args:
+            timeout: Seconds to wait for data
+
+        Returns:
+            str: Output line or None if buffer empty
+        """
+        with self._cond:
+            if not self._lines and not self._chunks \
+                    and not self._cond.wait_for(lambda: self._lines or self._chunks, timeout):
+                return None
+            if not self._lines:
+                self._decode()
+                if not self._lines:
+                    return None
+            line = self._lines.popleft()
+            self._line_count -= 1
+            self._size -= len(line)
+            return line
+
+    def stats(self) -> Dict:
+        """
+        Get buffer usage counters.
+
+        Returns:
+            dict: Buffered lines, buffered size and dropped lines
+        """
+        return {
+            "lines": self._line_count,
+            "bytes": self._size,
+            "dropped": self.dropped
+        }
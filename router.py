@@ -9,17 +9,42 @@ import os
 import signal
 import time
 import sys
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Optional, Tuple
 import logging
 import threading
-from queue import Queue
+import queue
 
-from get_url_parts import get_url_parts
-from match_filter import match_filter
-from extract_query_params import extract_query_params
-from convert_file_path import convert_file_path
-from process import ManagedProcess, ProcessState
-from process_utils import check_existing_processes
+from filter_index import FilterIndex
+from log_pipeline import OutputLogger, setup_logging, stop_logging
+from admission import AdmissionController, declared_cost, parse_size
+from cgroups import CgroupSlice, FlowCgroup
+from sharding import FileCoordinator, HashRing
+from output_sinks import RotatingFileSink
+from command_template import CommandTemplate, TemplateError, compile_templates
+from parsed_url import parse_url
+from process import ManagedProcess, ProcessState, StopOutcome, stop_processes
+from process_utils import find_processes_by_command, kill_process_groups, process_slug, read_process_groups
+from supervisor import ProcessSupervisor
+from ingest_relay import (CONSUMER_INPUT, CONSUMER_PLACEHOLDER, RELAY_SCHEMES, RELAY_TEE, IngestRelay,
+                          find_shared_sources, relay_command, tee_outputs)
+from flow_fusion import fuse_commands, group_fusable
+from config_watcher import ConfigWatcher
+from scheduler import StartupScheduler, source_host
+from restart_policy import RestartPolicy, RESTART_KEYS
+from stall_watchdog import StallWatchdog
+from motion import MotionDetector, frame_command, DEFAULT_WIDTH, DEFAULT_HEIGHT
+from frame_bus import FrameBusStage
+
+# Process rule keys a flow in flows.json may override
+FLOW_OPTION_KEYS = RESTART_KEYS + ('stall_timeout', 'stall_kill_timeout', 'output', 'cpu', 'memory',
+                                    'cpu_weight', 'cpu_limit', 'memory_limit')
+# Destinations of child output selectable with the ``output`` key
+OUTPUT_SINKS = ('ring', 'log', 'file', 'discard')
+DEFAULT_OUTPUT = ('ring', 'log')
+# Keys applied to running flows on reload instead of restarting them
+LIVE_OPTION_KEYS = ('log_level',)
+# Seconds between liveness checks of motion workers and frame bus writers
+STAGE_CHECK_INTERVAL = 1.0
 
 
 class StreamFilterRouter:
@@ -28,177 +53,1140 @@ class StreamFilterRouter:
     Supports multiple input/output protocols and processing filters.
     """
 
-    def __init__(self, flows_config: str, process_config: str):
-        # Initialize logging first
-        logging.basicConfig(
-            level=logging.DEBUG,  # Changed to DEBUG for more detailed logs
-            format='%(asctime)s [SFR] %(levelname)s: %(message)s'
-        )
+    ORPHAN_MODES = ('ignore', 'adopt', 'kill')
+
+    def __init__(self, flows_config: str, process_config: str, supervisor_mode: bool = False,
+                 metrics_port: int = 0, shared_ingest: bool = False, frame_bus: bool = False,
+                 watch_config: bool = False, startup_concurrency: int = 0, startup_rate: float = 0.0,
+                 startup_per_host: int = 0, shutdown_timeout: float = 6, orphans: str = 'ignore',
+                 log_level: str = 'INFO', output_log_rate: float = 20.0, output_dir: str = 'logs',
+                 cpu_budget: float = 0.0, memory_budget: Union[int, str] = 0, overflow: str = 'queue',
+                 cgroup_slice: Optional[str] = None, shard_dir: Optional[str] = None,
+                 node_id: Optional[str] = None, shard_timeout: float = 10.0):
+        # Initialize logging first; records are written by a background thread
+        self.log_listener = setup_logging(log_level)
         self.logger = logging.getLogger("StreamFilterRouter")
+
+        # Rate-limited loggers of child output by process ID
+        self.output_log_rate = output_log_rate
+        self.output_loggers: Dict[str, OutputLogger] = {}
+        # Directory of per-process log files of flows with ``file`` output
+        self.output_dir = output_dir
         
         # Then load configurations
+        self.flows_config_path = flows_config
         self.flows_config = self._load_json(flows_config)
         self.process_config_path = process_config
         self.process_config = self._load_json(process_config)
+        self.filter_index = FilterIndex(self.process_config)
+        self.templates = compile_templates(self.process_config)
         self.running_processes: Dict[str, ManagedProcess] = {}
         self.shutdown_event = threading.Event()
         self._shutdown_lock = threading.Lock()
         self._is_shutting_down = False
 
+        # One deadline for all processes stopped together, outcomes of the last shutdown
+        self.shutdown_timeout = shutdown_timeout
+        self.stop_outcomes: Dict[str, StopOutcome] = {}
+
+        # Optional single event loop for all child pipes and exits
+        self.supervisor = ProcessSupervisor() if supervisor_mode else None
+
+        # Counters exported by the metrics endpoint
+        self.metrics_port = metrics_port
+        self.flows_started = 0
+        self.flow_errors = 0
+
+        # Shared ingest relays by source URL
+        self.shared_ingest = shared_ingest
+        self.ingest_relays: Dict[str, IngestRelay] = {}
+
+        # Built-in motion detectors by process ID, events from all workers share one queue
+        self.motion_detectors: Dict[str, MotionDetector] = {}
+        self.motion_events = None
+        self.on_motion = None
+        self._motion_lock = threading.Lock()
+
+        # Shared-memory frame buses by source URL, read by the motion stages of several flows
+        self.frame_bus = frame_bus
+        self.frame_buses: Dict[str, FrameBusStage] = {}
+
+        # Restart policies and pending restarts of processes by process ID
+        self.restart_policies: Dict[str, RestartPolicy] = {}
+        self._restart_timers: Dict[str, threading.Timer] = {}
+        # Same for motion workers and frame bus writers, by stage key
+        self._stage_policies: Dict[str, RestartPolicy] = {}
+        self._stage_timers: Dict[str, threading.Timer] = {}
+
+        # Processes alive but without progress are killed and restarted
+        self.watchdog = StallWatchdog()
+        self._stalled = set()
+
+        # Launches are queued by priority and spread out to avoid connecting to every source at once
+        self.scheduler = StartupScheduler(startup_concurrency, startup_rate, startup_per_host)
+
+        # Processes of a previous router instance still running a flow: 'ignore', 'adopt' or 'kill'
+        if orphans not in self.ORPHAN_MODES:
+            raise ValueError(f"Unknown orphan handling {orphans!r}, expected one of {self.ORPHAN_MODES}")
+        self.orphans = orphans
+
+        # Flows beyond the CPU and memory budgets are queued or rejected
+        self.admission = AdmissionController(cpu_budget, parse_size(memory_budget) or 0, overflow)
+
+        # Optional cgroup v2 slice with a cgroup per process, set up on start
+        self.cgroup_slice = CgroupSlice(cgroup_slice) if cgroup_slice else None
+        self.flow_cgroups: Dict[str, FlowCgroup] = {}
+
+        # Router instances sharing shard_dir split the flows by consistent hashing on flow names
+        self.coordinator = FileCoordinator(shard_dir, node_id, timeout=shard_timeout) if shard_dir else None
+        self.ring: Optional[HashRing] = None
+
+        # Launched units (single flows and fused groups) by name, used to diff on reload
+        self.units: Dict[str, Dict] = {}
+        self._unit_names: Dict[str, str] = {}
+        self._reload_lock = threading.Lock()
+        # Reloads requested from signal handlers, run by a worker thread
+        self._reload_requested = threading.Event()
+        self.config_watcher = ConfigWatcher([flows_config, process_config], self.reload) \
+            if watch_config else None
+
     def _load_json(self, file_path: str) -> dict:
         """Load and parse JSON configuration file."""
         with open(file_path, 'r') as file:
             config = json.load(file)
-            self.logger.debug(f"Loaded configuration from {file_path}: {config}")
+            self.logger.debug("Loaded configuration from %s: %s", file_path, config)
             return config
 
     def _find_matching_process(self, steps: List[Union[str, List[str]]]) -> dict:
-        """Find matching process configuration for given flow steps."""
-        self.logger.debug(f"Finding matching process for steps: {steps}")
-        
-        # Convert steps to a normalized format for matching
-        normalized_chain = []
-        for item in steps:
-            if isinstance(item, list):
-                # For array items, take the scheme of the first item
-                scheme, _ = get_url_parts(item[0])
-                normalized_chain.append(scheme)
-                self.logger.debug(f"Normalized array item {item} to scheme: {scheme}")
-            else:
-                scheme, path = get_url_parts(item)
-                if scheme == 'process':
-                    # For process URLs, include the base path
-                    normalized_chain.append(f"{scheme}://{path}")
-                    self.logger.debug(f"Normalized process URL {item} to: {scheme}://{path}")
-                else:
-                    # For other URLs, just the scheme
-                    normalized_chain.append(scheme)
-                    self.logger.debug(f"Normalized URL {item} to scheme: {scheme}")
-
-        self.logger.info(f"Normalized chain for matching: {normalized_chain}")
-
-        # Try to find a matching process
-        for idx, process in enumerate(self.process_config):
-            self.logger.debug(f"Checking process config #{idx}: {process}")
-            if match_filter(process['filter'], normalized_chain):
-                self.logger.info(f"Found matching process: {process}")
-                return process
-            else:
-                self.logger.debug(f"Process #{idx} filter chain does not match")
-        
-        self.logger.error(f"No matching process found for normalized chain: {normalized_chain}")
-        return None
+        """Find the most specific process configuration for given flow steps."""
+        process = self.filter_index.lookup(steps)
+        if process is None:
+            self.logger.error(f"No matching process found for steps: {steps}")
+            return None
+
+        self.logger.info(f"Found matching process: {process.get('description', process['filter'])}")
+        return process
 
     def _prepare_command(self, command: str, steps: List[Union[str, List[str]]]) -> str:
-        """Prepare shell command with flow steps URLs substitution."""
-        if command.startswith('shell://'):
-            cmd = command[7:]  # Remove shell:// prefix
-            self.logger.debug(f"Preparing command: {cmd}")
-            
-            # First, replace steps URLs
-            stream_idx = 1
-            for url in steps:
-                if isinstance(url, list):
-                    for i, sub_url in enumerate(url):
-                        sub_url = convert_file_path(sub_url)
-                        cmd = cmd.replace(f'${stream_idx}[{i}]', sub_url)
-                        self.logger.debug(f"Replaced ${stream_idx}[{i}] with {sub_url}")
-                else:
-                    url = convert_file_path(url)
-                    cmd = cmd.replace(f'${stream_idx}', url)
-                    self.logger.debug(f"Replaced ${stream_idx} with {url}")
-                    
-                    # If this is a process:// URL, also replace its parameters
-                    if url.startswith('process://'):
-                        params = extract_query_params(url)
-                        for key, value in params.items():
-                            cmd = cmd.replace(f'${key}', value)
-                            self.logger.debug(f"Replaced ${key} with {value}")
-                    
-                    stream_idx += 1
-            
-            # Remove any leading slash from the command
-            cmd = cmd.lstrip('/')
-            
-            self.logger.debug(f"Final prepared command: {cmd}")
-            return cmd
-        return ''
+        """Render a compiled ``run`` template with flow steps URLs."""
+        template = self.templates.get(command) or CommandTemplate.from_run(command)
+        if template is None:
+            return ''
+        try:
+            cmd = template.render(steps)
+        except TemplateError as e:
+            self.logger.error(f"Cannot prepare command {command}: {str(e)}")
+            return ''
+        self.logger.debug("Final prepared command: %s", cmd)
+        return cmd
 
-    def _handle_process_output(self, process_id: str, line: str):
-        """Handle process stdout data."""
-        self.logger.debug(f"stdout [{process_id}]: {line}")
+    def _output_logger(self, process_id: str) -> OutputLogger:
+        """Get the output logger of a process, creating it on first use."""
+        output_logger = self.output_loggers.get(process_id)
+        if output_logger is None:
+            output_logger = self.output_loggers.setdefault(
+                process_id, OutputLogger(process_id, rate=self.output_log_rate))
+        return output_logger
 
-    def _handle_process_error(self, process_id: str, line: str):
-        """Handle process stderr data."""
-        self.logger.debug(f"stderr [{process_id}]: {line}")
+    def _apply_log_levels(self, units: Dict[str, Dict]):
+        """Set the output log level of every unit's processes, without restarting them."""
+        for unit in units.values():
+            for process_id in unit['process_ids']:
+                self._output_logger(process_id).set_level(unit['log_level'])
+
+    def _output_path(self, process_id: str) -> str:
+        """Log file of a process with ``file`` output."""
+        return os.path.join(self.output_dir, f"{process_slug(process_id)}.log")
+
+    def _output_options(self, process_id: str, outputs) -> Dict:
+        """
+        Sinks and buffer size of a process for the ``output`` key of its rule or flow.
+
+        Args:
+            process_id: Process identifier
+            outputs: Output names, ``discard`` alone drops everything
+
+        Returns:
+            dict: ``sinks`` and, without ``ring``, ``buffer_lines`` options
+        """
+        unknown = [name for name in outputs if name not in OUTPUT_SINKS]
+        if unknown:
+            self.logger.warning(f"Unknown output {', '.join(unknown)} of {process_id}, "
+                                f"expected {', '.join(OUTPUT_SINKS)}")
+        sinks = []
+        if 'log' in outputs:
+            sinks.append(self._output_logger(process_id))
+        if 'file' in outputs:
+            sinks.append(RotatingFileSink(self._output_path(process_id)))
+        options = {'sinks': sinks}
+        if 'ring' not in outputs:
+            options['buffer_lines'] = 0
+        return options
 
     def _handle_process_exit(self, process_id: str, exit_code: int):
-        """Handle process exit."""
+        """Handle process exit, restarting it if its policy says so."""
         self.logger.info(f"Process {process_id} exited with code {exit_code}")
-        if process_id in self.running_processes:
+        if exit_code != 0:
+            self.flow_errors += 1
+        process = self.running_processes.get(process_id)
+        if process is None:
+            return
+        # Stalled processes are relaunched whatever the policy
+        stalled = process_id in self._stalled
+        self._stalled.discard(process_id)
+        policy = self.restart_policies.get(process_id)
+        if policy and (stalled or policy.should_restart(exit_code)) \
+                and self._schedule_restart(process_id, process, policy):
+            return
+        if process.state != ProcessState.PARKED:
             del self.running_processes[process_id]
+            self.restart_policies.pop(process_id, None)
+            self.watchdog.unwatch(process_id)
+            self._remove_cgroups([process_id])
+        self._release_process(process_id)
 
-    def _process_flow(self, name: str, steps: List[Union[str, List[str]]]):
-        """Process single flow according to matching configuration."""
-        self.logger.info(f"Processing flow '{name}': {steps}")
-        
+    def _handle_stall(self, process_id: str, process: ManagedProcess, kill_timeout: float):
+        """Kill a process that stopped making progress so it gets restarted."""
+        if self.shutdown_event.is_set() or self.running_processes.get(process_id) is not process:
+            return
+        self.logger.warning(f"Process {process_id} stalled, restarting it")
+        process.stalls += 1
+        self._stalled.add(process_id)
+        if not process.terminate(kill_timeout):
+            self._stalled.discard(process_id)
+
+    def _schedule_restart(self, process_id: str, process: ManagedProcess, policy: RestartPolicy) -> bool:
+        """
+        Queue a restart of an exited process after its backoff delay.
+
+        Returns:
+            bool: True if a restart was scheduled; a crash looping process is
+            parked instead and stays listed
+        """
+        if self.shutdown_event.is_set():
+            return False
+        delay = policy.next_delay(process.uptime)
+        if delay is None:
+            process.state = ProcessState.PARKED
+            self.logger.error(f"Process {process_id} restarted {policy.limit} times within "
+                              f"{policy.window:.0f}s, parking it until reload")
+            return False
+
+        process.state = ProcessState.RESTARTING
+        self.logger.info(f"Restarting process {process_id} in {delay:.1f}s")
+        timer = threading.Timer(delay, self._restart_process, args=(process_id, process))
+        timer.daemon = True
+        self._restart_timers[process_id] = timer
+        timer.start()
+        return True
+
+    def _restart_process(self, process_id: str, process: ManagedProcess):
+        """Start an exited process again with its prepared command."""
+        self._restart_timers.pop(process_id, None)
+        # The process may have been stopped or replaced by a reload meanwhile
+        if self.shutdown_event.is_set() or self.running_processes.get(process_id) is not process:
+            return
+        if process.restart():
+            self.flows_started += 1
+            return
+        self.flow_errors += 1
+        policy = self.restart_policies.get(process_id)
+        if not (policy and self._schedule_restart(process_id, process, policy)):
+            if process.state != ProcessState.PARKED:
+                self.running_processes.pop(process_id, None)
+                self._remove_cgroups([process_id])
+            self._release_process(process_id)
+
+    def _release_process(self, process_id: str):
+        """Free the budget of a unit once none of its processes runs or restarts."""
+        name = self._unit_names.get(process_id)
+        unit = self.units.get(name)
+        if unit is None or not self.admission.enabled:
+            return
+        for unit_process_id in unit['process_ids']:
+            process = self.running_processes.get(unit_process_id)
+            if process and process.state != ProcessState.PARKED:
+                return
+        self.admission.release(name)
+
+    def _handle_motion_event(self, process_id: str, event: Dict):
+        """Handle motion start/stop event of a flow."""
+        if event['type'] == 'error':
+            self.logger.error(f"Motion detection [{process_id}]: {event['error']}")
+        else:
+            self.logger.info(f"Motion detection [{process_id}]: {event['type']} (score {event['score']:.3f})")
+        if self.on_motion:
+            self.on_motion(process_id, event)
+
+    def _dispatch_motion_events(self):
+        """Deliver events from all motion workers to their detectors and restart exited stages."""
+        last_check = time.monotonic()
+        while not self.shutdown_event.is_set():
+            if time.monotonic() - last_check >= STAGE_CHECK_INTERVAL:
+                last_check = time.monotonic()
+                try:
+                    self._check_stages()
+                except Exception as e:
+                    self.logger.error(f"Stage check failed: {str(e)}", exc_info=True)
+            try:
+                process_id, event = self.motion_events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            detector = self.motion_detectors.get(process_id)
+            if detector:
+                detector.record(event)
+            self._handle_motion_event(process_id, event)
+
+    def _check_stages(self):
+        """Schedule restarts of motion workers and frame bus writers that exited on their own."""
+        stages = [(f"framebus:{stage.name}", stage) for stage in list(self.frame_buses.values())]
+        stages += [(f"motion:{process_id}", detector) for process_id, detector in list(self.motion_detectors.items())]
+        for key, stage in stages:
+            if key in self._stage_timers or not stage.exited():
+                continue
+            # Stages always come back, with the backoff of managed processes
+            policy = self._stage_policies.setdefault(key, RestartPolicy('always', limit=0))
+            delay = policy.next_delay(time.monotonic() - stage.started_at)
+            self.logger.warning(f"Stage {key} exited, restarting it in {delay:.1f}s")
+            timer = threading.Timer(delay, self._restart_stage, args=(key, stage))
+            timer.daemon = True
+            self._stage_timers[key] = timer
+            timer.start()
+
+    def _restart_stage(self, key: str, stage: Union[MotionDetector, FrameBusStage]):
+        """Start a new worker for an exited stage; a failed start is retried on the next check."""
+        if self.shutdown_event.is_set():
+            return
+        if stage.restart():
+            self.logger.info(f"Restarted stage {key}")
+        self._stage_timers.pop(key, None)
+
+    def _forget_stage(self, key: str):
+        """Cancel a pending restart of a stage that is being stopped."""
+        timer = self._stage_timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        self._stage_policies.pop(key, None)
+
+    @staticmethod
+    def _motion_params(steps: List[Union[str, List[str]]]) -> Optional[Dict]:
+        """Query parameters of the process://motion step, None without one."""
+        return next((dict(parse_url(step).params) for step in steps
+                     if isinstance(step, str) and step.startswith('process://motion')), None)
+
+    def _start_motion(self, process_id: str, steps: List[Union[str, List[str]]]):
+        """Start built-in motion detection for a flow with a process://motion step."""
+        params = self._motion_params(steps)
+        if params is None or not isinstance(steps[0], str):
+            self.logger.warning(f"Flow {process_id} has no process://motion step to configure")
+            return
+
+        with self._motion_lock:
+            if self.motion_events is None:
+                self.motion_events = MotionDetector.create_queue()
+                threading.Thread(target=self._dispatch_motion_events, daemon=True).start()
+
+        bus = self.frame_buses.get(steps[0])
+        detector = MotionDetector(
+            process_id,
+            self._ingest_url(process_id, steps[0]) or steps[0],
+            self.motion_events,
+            bus_name=bus.name if bus else None,
+            **{key: float(params[key]) for key in ('fps', 'threshold', 'min_area', 'hold') if key in params}
+        )
+        if detector.start():
+            self.motion_detectors[process_id] = detector
+
+    def _start_ingest_relays(self, flows: List[Dict]):
+        """Start one relay per network source read by several flows."""
+        for source, names in find_shared_sources(flows).items():
+            if source in self.ingest_relays:
+                continue
+            relay = IngestRelay(source, names)
+            process_id = f"ingest:{source}"
+            self.logger.info(f"Starting shared ingest for {len(names)} flows: {source}")
+
+            process = ManagedProcess(name=process_id, command=relay.command(), **self._relay_options(process_id))
+            if process.start():
+                self.running_processes[process_id] = process
+                self.restart_policies[process_id] = RestartPolicy('always', limit=0)
+                self.ingest_relays[source] = relay
+            else:
+                self.logger.error(f"Failed to start shared ingest, flows will read {source} directly")
+
+    def _relay_options(self, process_id: str) -> Dict:
+        """Callbacks and output sinks of a shared ingest's managed process."""
+        return dict(
+            on_exit=lambda code: self._handle_process_exit(process_id, code),
+            supervisor=self.supervisor,
+            **self._output_options(process_id, ('log',))
+        )
+
+    def _adopt_relay(self, source: str, info: Dict, outputs: Dict[str, str]):
+        """Manage a shared ingest left running by a previous instance, keeping its consumer ports."""
+        relay = IngestRelay.adopt(source, outputs)
+        process_id = f"ingest:{source}"
+        process = ManagedProcess.adopt(int(info['pid']), process_id, relay.command(), info['starttime'],
+                                       **self._relay_options(process_id))
+        self.running_processes[process_id] = process
+        self.restart_policies[process_id] = RestartPolicy('always', limit=0)
+        self.ingest_relays[source] = relay
+
+    def _ingest_url(self, name: str, source) -> Optional[str]:
+        """Local relay URL a flow or fused group reads instead of its source, if any."""
+        relay = self.ingest_relays.get(source) if isinstance(source, str) else None
+        return relay.input_url(name) if relay and name in relay.outputs else None
+
+    def _motion_stages(self, unit: Dict) -> List[Tuple[str, List[Union[str, List[str]]]]]:
+        """Motion stage IDs and steps of a unit whose rule enables built-in motion detection."""
+        if 'group' in unit:
+            process_config, steps_list = unit['group']['process'], unit['group']['steps']
+        else:
+            process_config, steps_list = self.filter_index.lookup(unit['steps']) or {}, [unit['steps']]
+        if not process_config.get('motion'):
+            return []
+        return [(motion_id, steps) for motion_id, steps in zip(unit['motion_ids'], steps_list)
+                if isinstance(steps[0], str) and self._motion_params(steps) is not None]
+
+    def _frame_bus_sources(self, units: Dict[str, Dict]) -> Dict[str, List[float]]:
+        """Analysed frame rates of each source read by several motion stages."""
+        sources: Dict[str, List[float]] = {}
+        for unit in units.values():
+            for _, steps in self._motion_stages(unit):
+                sources.setdefault(steps[0], []).append(float(self._motion_params(steps).get('fps', 5)))
+        return {source: rates for source, rates in sources.items() if len(rates) > 1}
+
+    def _relay_readers(self, units: Dict[str, Dict]) -> List[Dict]:
+        """Units with a matching rule, their motion stages and frame buses, as shared ingest consumers."""
+        # Frame buses serve every current unit, including those launched later
+        bus_sources = self._frame_bus_sources(self.units) if self.frame_bus else {}
+        readers = []
+        for name, unit in units.items():
+            if 'group' not in unit and not self.filter_index.lookup(unit['steps']):
+                continue
+            readers.append({'name': name, 'steps': [unit['source']]})
+            readers.extend({'name': motion_id, 'steps': [steps[0]]} for motion_id, steps in self._motion_stages(unit)
+                           if steps[0] not in bus_sources)
+        sources = {reader['steps'][0] for reader in readers}
+        readers.extend({'name': f"framebus:{source}", 'steps': [source]} for source in bus_sources if source in sources)
+        return readers
+
+    def _start_frame_buses(self, units: Dict[str, Dict]):
+        """Decode each source analysed by several motion stages once into a shared frame bus."""
+        for index, (source, rates) in enumerate(self._frame_bus_sources(units).items()):
+            # Decode at the highest rate requested, slower readers skip frames
+            stage = FrameBusStage(
+                f"sfr-{os.getpid()}-{index}",
+                frame_command(self._ingest_url(f"framebus:{source}", source) or source,
+                              max(rates), DEFAULT_WIDTH, DEFAULT_HEIGHT),
+                DEFAULT_WIDTH * DEFAULT_HEIGHT
+            )
+            self.logger.info(f"Starting frame bus {stage.name} for {len(rates)} motion stages: {source}")
+            if stage.start():
+                self.frame_buses[source] = stage
+            else:
+                stage.stop()
+
+    def _plan_fusion(self, flows: List[Dict]) -> List[Dict]:
+        """
+        Group flows that can run as one multi-output ffmpeg command.
+
+        Only flows whose matched process config sets ``fusion`` and has a
+        single ``run`` command take part. Flows overriding process options
+        (``restart*``, ``stall_*``, ``output``, ``cpu``/``memory`` and
+        cgroup limits) and flows with conflicting ffmpeg options stay
+        separate, since a fused process has a single set of options.
+
+        Returns:
+            list: Fused groups with ``name``, ``flows``, ``source``,
+            ``commands`` and ``process`` keys
+        """
+        candidates = []
+        for flow in flows:
+            steps = flow['steps']
+            process_config = self.filter_index.lookup(steps)
+            if (not process_config or not process_config.get('fusion')
+                    or len(process_config['run']) != 1 or not isinstance(steps[0], str)):
+                continue
+            if any(key in flow for key in FLOW_OPTION_KEYS):
+                self.logger.debug("Flow %s overrides process options, not fusing it", flow['name'])
+                continue
+            cmd = self._prepare_command(process_config['run'][0], steps)
+            if cmd:
+                candidates.append((flow['name'], steps[0], cmd, process_config))
+
+        groups = []
+        for indices in group_fusable([cmd for _, _, cmd, _ in candidates]):
+            members = [candidates[index] for index in indices]
+            names = [name for name, _, _, _ in members]
+            groups.append({
+                "name": f"fused:{','.join(names)}",
+                "flows": names,
+                "source": members[0][1],
+                "commands": [cmd for _, _, cmd, _ in members],
+                "steps": [flow['steps'] for flow in flows if flow['name'] in names],
+                "process": members[0][3]
+            })
+            self.logger.info(f"Fusing {len(names)} flows into one process: {names}")
+        return groups
+
+    def _launch_fused(self, group: Dict):
+        """Start a fused group as a single multi-output process."""
+        cmd = fuse_commands(group['commands'], self._ingest_url(group['name'], group['source']))
+        if self._launch_process(group['name'], cmd, group['process']) and group['process'].get('motion'):
+            for steps in group['steps']:
+                self._start_motion(self._flow_process_id(group['name'], steps), steps)
+
+    def _prepare_flow(self, name: str, steps: List[Union[str, List[str]]],
+                      input_url: Optional[str] = None) -> Tuple[Optional[Dict], List[str]]:
+        """Match flow steps and prepare its commands, reading ``input_url`` instead of the source if given."""
         process_config = self._find_matching_process(steps)
         if not process_config:
             self.logger.error(f"No matching process found for flow '{name}': {steps}")
-            return
+            return None, []
+
+        # Flows with a shared ingest read the local relay instead of the source
+        command_steps = steps
+        ingest_url = input_url or self._ingest_url(name, steps[0])
+        if ingest_url:
+            command_steps = [ingest_url] + list(steps[1:])
 
+        commands = []
         for command in process_config['run']:
+            cmd = self._prepare_command(command, command_steps)
+            if not cmd:
+                self.logger.warning(f"Empty command after preparation: {command}")
+                continue
+            commands.append(cmd)
+        return process_config, commands
+
+    def _process_options(self, process_id: str, process_config: Dict) -> Dict:
+        """Callbacks, output sinks and buffer options of a flow's managed process."""
+        options = dict(
+            on_exit=lambda code: self._handle_process_exit(process_id, code),
+            supervisor=self.supervisor,
+            **{key: process_config[key] for key in ('buffer_lines', 'buffer_bytes', 'progress', 'shell')
+               if key in process_config}
+        )
+        options.update(self._output_options(process_id, process_config.get('output', DEFAULT_OUTPUT)))
+        if self.cgroup_slice:
+            options['cgroup'] = self._flow_cgroup(process_id, process_config)
+        return options
+
+    def _flow_cgroup(self, process_id: str, process_config: Dict) -> Optional[FlowCgroup]:
+        """Create or update the cgroup of a process with the limits of its rule or flow."""
+        try:
+            cgroup = self.cgroup_slice.create(process_id,
+                                              cpu_weight=process_config.get('cpu_weight'),
+                                              cpu_limit=process_config.get('cpu_limit'),
+                                              memory_limit=parse_size(process_config.get('memory_limit')))
+        except ValueError as e:
+            self.logger.error(f"Invalid cgroup limits of {process_id}: {str(e)}")
+            return None
+        if cgroup:
+            self.flow_cgroups[process_id] = cgroup
+        return cgroup
+
+    def _remove_cgroups(self, process_ids: List[str]):
+        """Delete the cgroups of processes that are gone."""
+        for process_id in process_ids:
+            cgroup = self.flow_cgroups.pop(process_id, None)
+            if cgroup:
+                cgroup.remove()
+
+    def _launch_process(self, process_id: str, cmd: str, process_config: Dict) -> bool:
+        """Create and start a managed process for a prepared command."""
+        try:
+            self.logger.info(f"Starting process {process_id}")
+            self.logger.debug("Command: %s", cmd)
+
+            # Create managed process
+            process = ManagedProcess(name=process_id, command=cmd,
+                                     **self._process_options(process_id, process_config))
+
+            self.restart_policies[process_id] = RestartPolicy.from_config(process_config)
+            if process.start():
+                self.running_processes[process_id] = process
+                self._watch_stall(process_id, process, process_config)
+                self.flows_started += 1
+                self.logger.info(f"Started process {process_id}")
+                return True
+
+            self.flow_errors += 1
+            self.logger.error(f"Failed to start process {process_id}")
+            # Without a shell a missing program fails here instead of exiting with code 127
+            policy = self.restart_policies[process_id]
+            if policy.should_restart(None):
+                self.running_processes[process_id] = process
+                if not self._schedule_restart(process_id, process, policy) \
+                        and process.state != ProcessState.PARKED:
+                    del self.running_processes[process_id]
+
+        except Exception as e:
+            self.flow_errors += 1
+            self.logger.error(f"Error running command {cmd}: {str(e)}", exc_info=True)
+        return False
+
+    def _watch_stall(self, process_id: str, process: ManagedProcess, process_config: Dict):
+        """Register a process with the stall watchdog if its rule sets ``stall_timeout``."""
+        if process_config.get('stall_timeout'):
+            kill_timeout = float(process_config.get('stall_kill_timeout', 5))
+            self.watchdog.watch(process_id, process, float(process_config['stall_timeout']),
+                                lambda key, stalled: self._handle_stall(key, stalled, kill_timeout))
+
+    def _process_flow(self, name: str, steps: List[Union[str, List[str]]], options: Optional[Dict] = None):
+        """Process single flow according to matching configuration and flow-level overrides."""
+        self.logger.info(f"Processing flow '{name}': {steps}")
+
+        process_config, commands = self._prepare_flow(name, steps)
+        if process_config and options:
+            process_config = {**process_config, **options}
+        process_id = self._flow_process_id(name, steps)
+        for cmd in commands:
             if self.shutdown_event.is_set():
                 self.logger.info(f"Shutdown requested, skipping new process for flow '{name}'")
                 return
+            self._launch_process(process_id, cmd, process_config)
 
-            cmd = self._prepare_command(command, steps)
-            if not cmd:
-                self.logger.warning(f"Empty command after preparation: {command}")
+        if process_config and process_config.get('motion'):
+            self._start_motion(process_id, steps)
+
+    @staticmethod
+    def _flow_process_id(name: str, steps: List[Union[str, List[str]]]) -> str:
+        """Process ID of a flow, or of a fused group member's motion stage."""
+        return f"{name}:{','.join(str(url) for url in steps)}"
+
+    def _plan_units(self, flows: List[Dict]) -> Dict[str, Dict]:
+        """
+        Split flows into independently launched units.
+
+        Fused groups replace their member flows. Each unit has a signature
+        covering its steps and matched process config, so a reload can tell
+        exactly which units changed. ``log_level`` is left out of it and
+        applied to running processes on reload.
+
+        Returns:
+            dict: Units by name with ``name``, ``source``, ``priority``,
+            ``log_level``, ``cost``, ``signature``, ``process_ids`` and ``motion_ids`` keys, plus
+            ``group`` for fused groups and ``steps`` for single flows
+        """
+        fused = self._plan_fusion(flows)
+        fused_names = {name for group in fused for name in group['flows']}
+        priorities = {flow['name']: flow.get('priority', 0) for flow in flows}
+        options = {flow['name']: {key: flow[key] for key in FLOW_OPTION_KEYS if key in flow} for flow in flows}
+        rules = {flow['name']: self.filter_index.lookup(flow['steps']) or {} for flow in flows}
+        log_levels = {flow['name']: flow.get('log_level', rules[flow['name']].get('log_level')) for flow in flows}
+        costs = {flow['name']: self._declared_cost(flow['name'], {**rules[flow['name']], **options[flow['name']]})
+                 for flow in flows}
+        signatures = {flow['name']: json.dumps([flow['steps'],
+                                                {key: value for key, value in rules[flow['name']].items()
+                                                 if key not in LIVE_OPTION_KEYS},
+                                                options[flow['name']]], sort_keys=True)
+                      for flow in flows}
+
+        units = {}
+        for group in fused:
+            units[group['name']] = {
+                "name": group['name'],
+                "source": group['source'],
+                "priority": max(priorities[name] for name in group['flows']),
+                "log_level": next((log_levels[name] for name in group['flows'] if log_levels[name]), None),
+                "cost": self._group_cost([costs[name] for name in group['flows']]),
+                "group": group,
+                "signature": json.dumps([signatures[name] for name in group['flows']]),
+                "process_ids": [group['name']],
+                "motion_ids": [self._flow_process_id(group['name'], steps) for steps in group['steps']]
+            }
+        for flow in flows:
+            if flow['name'] in fused_names:
+                continue
+            process_id = self._flow_process_id(flow['name'], flow['steps'])
+            units[flow['name']] = {
+                "name": flow['name'],
+                "source": flow['steps'][0] if flow['steps'] else None,
+                "steps": flow['steps'],
+                "priority": priorities[flow['name']],
+                "log_level": log_levels[flow['name']],
+                "cost": costs[flow['name']],
+                "options": options[flow['name']],
+                "signature": signatures[flow['name']],
+                "process_ids": [process_id],
+                "motion_ids": [process_id]
+            }
+        return units
+
+    def _declared_cost(self, name: str, config: Dict) -> Tuple[Optional[float], Optional[int]]:
+        """Declared CPU and memory cost of a flow, unknown if invalid."""
+        try:
+            return declared_cost(config)
+        except ValueError as e:
+            self.logger.error(f"Invalid cost of flow {name}: {str(e)}")
+            return None, None
+
+    @staticmethod
+    def _group_cost(costs: List[Tuple[Optional[float], Optional[int]]]) -> Tuple[Optional[float], Optional[int]]:
+        """Declared cost of a fused group, the sum of what its flows declare."""
+        cpu = [cost[0] for cost in costs if cost[0] is not None]
+        memory = [cost[1] for cost in costs if cost[1] is not None]
+        return (sum(cpu) if cpu else None), (sum(memory) if memory else None)
+
+    def _unit_command(self, unit: Dict, input_url: Optional[str] = None) -> Tuple[Optional[str], Optional[Dict]]:
+        """
+        Command a unit runs, reading its shared ingest if it has one.
+
+        Args:
+            unit: Planned unit
+            input_url: URL read instead of the source, overriding any shared ingest
+
+        Returns:
+            tuple: Prepared command and process config with flow overrides,
+            (None, None) for flows with no or several commands
+        """
+        if 'group' in unit:
+            input_url = input_url or self._ingest_url(unit['name'], unit['source'])
+            return fuse_commands(unit['group']['commands'], input_url), unit['group']['process']
+        process_config, commands = self._prepare_flow(unit['name'], unit['steps'], input_url)
+        if len(commands) != 1:
+            return None, None
+        return commands[0], {**process_config, **unit['options']}
+
+    def _adopt_unit(self, unit: Dict, cmd: str, process_config: Dict, info: Dict):
+        """Manage a unit's process left running by a previous instance instead of launching it."""
+        process_id = unit['process_ids'][0]
+        process = ManagedProcess.adopt(int(info['pid']), process_id, cmd, info['starttime'],
+                                       **self._process_options(process_id, process_config))
+        if process.cgroup:
+            process.cgroup.attach(process.process.pid)
+        self.restart_policies[process_id] = RestartPolicy.from_config(process_config)
+        self.running_processes[process_id] = process
+        self._watch_stall(process_id, process, process_config)
+        if self.admission.enabled:
+            self.admission.reserve(unit['name'], unit['cost'])
+        if process_config.get('motion'):
+            steps_list = unit['group']['steps'] if 'group' in unit else [unit['steps']]
+            for motion_id, steps in zip(unit['motion_ids'], steps_list):
+                self._start_motion(motion_id, steps)
+
+    def _find_relayed_orphans(self, units: Dict[str, Dict], skip) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        """
+        Find shared ingests and their consumers left running by a previous instance.
+
+        Their command lines hold local ports picked at launch, so relays are
+        matched by source and consumers by command with any relay input.
+
+        Args:
+            units: Planned units
+            skip: Names of units already found running
+
+        Returns:
+            tuple: Relay process information by source, with the tee outputs
+            in ``matched``, and consumer process information by unit name,
+            with the relay input URL in ``matched``
+        """
+        sources = {unit['source'] for unit in units.values()
+                   if isinstance(unit['source'], str) and parse_url(unit['source']).scheme in RELAY_SCHEMES}
+        if not sources:
+            return {}, {}
+        relays = find_processes_by_command({source: relay_command(source, '*') for source in sources}, RELAY_TEE)
+
+        consumers = {}
+        for name, unit in units.items():
+            if name not in skip and unit['source'] in sources:
+                cmd, _ = self._unit_command(unit, CONSUMER_PLACEHOLDER)
+                if cmd:
+                    consumers[name] = cmd
+        relayed = find_processes_by_command(consumers, CONSUMER_INPUT, CONSUMER_PLACEHOLDER) if consumers else {}
+        return relays, relayed
+
+    def _adopt_relayed(self, units: Dict[str, Dict], relays: Dict[str, Dict], relayed: Dict[str, Dict]) -> List[str]:
+        """
+        Adopt shared ingests together with the consumers they feed.
+
+        Consumers whose relay is gone and relays without a consumer left are
+        stopped, neither would get anything done.
+
+        Returns:
+            list: Names of adopted consumer units
+        """
+        feeds = {url: source for source, info in relays.items() for url in tee_outputs(info['matched'][0])}
+        outputs: Dict[str, Dict[str, str]] = {}
+        stale = []
+        for name, info in relayed.items():
+            url = info['matched'][0].split('?')[0]
+            if feeds.get(url) == units[name]['source']:
+                outputs.setdefault(feeds[url], {})[name] = url
+            else:
+                stale.append(info['pgrp'])
+        for source, info in relays.items():
+            if source in outputs:
+                self._adopt_relay(source, info, outputs[source])
+            else:
+                stale.append(info['pgrp'])
+        if stale:
+            killed = kill_process_groups(stale, self.shutdown_timeout)
+            self.logger.info(f"Stopped {len(stale)} shared ingest processes of a previous instance "
+                             f"missing their peer, {killed} killed")
+
+        adopted = []
+        for consumers in outputs.values():
+            for name in consumers:
+                # Rendered against the adopted relay, so a restart reads the same port
+                cmd, process_config = self._unit_command(units[name])
+                self._adopt_unit(units[name], cmd, process_config, relayed[name])
+                adopted.append(name)
+        return adopted
+
+    def _handle_orphans(self, units: Dict[str, Dict]) -> List[str]:
+        """
+        Find flows still running from a previous router instance.
+
+        Processes are matched by their full command line; with shared
+        ingest, relays and their consumers match whatever local ports they
+        use. Depending on the ``orphans`` mode they are only reported,
+        adopted or killed before launching fresh ones.
+
+        Returns:
+            list: Names of adopted units, which must not be launched again
+        """
+        commands = {}
+        for name, unit in units.items():
+            cmd, process_config = self._unit_command(unit)
+            if cmd:
+                commands[name] = (cmd, process_config)
+        found = find_processes_by_command({name: cmd for name, (cmd, _) in commands.items()})
+        relays, relayed = self._find_relayed_orphans(units, found) if self.shared_ingest else ({}, {})
+        if not (found or relays or relayed):
+            return []
+
+        for name, info in list(found.items()) + list(relayed.items()):
+            self.logger.warning(f"Flow {name} is already running as PID {info['pid']}: {info['command']}")
+        for source, info in relays.items():
+            self.logger.warning(f"Shared ingest of {source} is already running as PID {info['pid']}")
+
+        if self.orphans == 'kill':
+            groups = [info['pgrp'] for info in list(found.values()) + list(relayed.values()) + list(relays.values())]
+            killed = kill_process_groups(groups, self.shutdown_timeout)
+            self.logger.info(f"Stopped {len(groups)} processes of a previous instance, {killed} killed")
+        elif self.orphans == 'adopt':
+            for name, info in found.items():
+                cmd, process_config = commands[name]
+                self._adopt_unit(units[name], cmd, process_config, info)
+            adopted = list(found) + self._adopt_relayed(units, relays, relayed)
+            self.logger.info(f"Adopted {len(adopted)} running flows")
+            return adopted
+        else:
+            self.logger.warning(f"Starting duplicates of {len(found) + len(relayed)} running flows, "
+                                f"use adopt or kill orphan handling to avoid them")
+        return []
+
+    def _launch_unit(self, unit: Dict):
+        """Start a single flow or fused group, unless a reload replaced or removed it meanwhile."""
+        current = self.units.get(unit['name'])
+        if current is None or current['signature'] != unit['signature']:
+            self.logger.debug("Skipping launch of %s, superseded by a reload", unit['name'])
+            return
+        if 'group' in unit:
+            self._launch_fused(unit['group'])
+        else:
+            self._process_flow(unit['name'], unit['steps'], unit['options'])
+        # Nothing started, e.g. no matching rule or a failed spawn without restarts
+        self._release_process(unit['process_ids'][0])
+
+    def _schedule_unit(self, unit: Dict) -> str:
+        """
+        Admit a unit against the budgets, then queue its launch with the startup scheduler.
+
+        Returns:
+            str: ``admitted``, ``queued`` or ``rejected``
+        """
+        def submit():
+            self.scheduler.submit(unit['name'], lambda: self._launch_unit(unit),
+                                  priority=unit['priority'], host=source_host(unit['source']))
+
+        if self.admission.enabled:
+            return self.admission.request(unit['name'], unit['cost'], submit, unit['priority'])
+        submit()
+        return 'admitted'
+
+    def _sample_usage(self) -> Dict[str, Tuple[float, int]]:
+        """CPU seconds and memory of each running unit, from its cgroups or process groups."""
+        groups = None
+        usage = {}
+        for name, unit in list(self.units.items()):
+            cpu, memory, found = 0.0, 0, False
+            for process_id in unit['process_ids']:
+                process = self.running_processes.get(process_id)
+                if process is None or not process.is_running():
+                    continue
+                sample = process.cgroup.usage() if process.cgroup else None
+                if sample is None:
+                    if groups is None:
+                        groups = read_process_groups()
+                    sample = groups.get(process.process.pid)
+                if sample:
+                    cpu, memory, found = cpu + sample[0], memory + sample[1], True
+            if found:
+                usage[name] = (cpu, memory)
+        return usage
+
+    def _log_stop_outcomes(self, outcomes: Dict[str, StopOutcome]):
+        """Log how each stopped process ended and a summary."""
+        for process_id, outcome in outcomes.items():
+            if outcome == StopOutcome.KILLED:
+                self.logger.warning(f"Process {process_id} killed after the stop deadline")
+            elif outcome == StopOutcome.FAILED:
+                self.logger.error(f"Failed to stop process {process_id}")
+            else:
+                self.logger.debug("Process %s: %s", process_id, outcome.value)
+        counts = {outcome: 0 for outcome in StopOutcome}
+        for outcome in outcomes.values():
+            counts[outcome] += 1
+        self.logger.info(f"Stopped {len(outcomes)} processes: "
+                         + ", ".join(f"{count} {outcome.value}" for outcome, count in counts.items()))
+
+    def _stop_units(self, units: List[Dict]) -> Dict[str, StopOutcome]:
+        """Stop the processes and motion stages of several units against one deadline."""
+        for unit in units:
+            self.scheduler.cancel(unit['name'])
+        detectors = [self.motion_detectors.pop(process_id) for unit in units
+                     for process_id in unit['motion_ids'] if process_id in self.motion_detectors]
+        for detector in detectors:
+            self._forget_stage(f"motion:{detector.name}")
+        processes = {}
+        for unit in units:
+            for process_id in unit['process_ids']:
+                timer = self._restart_timers.pop(process_id, None)
+                if timer:
+                    timer.cancel()
+                self.restart_policies.pop(process_id, None)
+                self.watchdog.unwatch(process_id)
+                self.output_loggers.pop(process_id, None)
+                process = self.running_processes.pop(process_id, None)
+                if process:
+                    processes[process_id] = process
+
+        for detector in detectors:
+            detector.request_stop()
+        outcomes = stop_processes(processes, self.shutdown_timeout)
+        self._remove_cgroups(list(processes))
+        # Budget is freed once the old processes are gone, queued flows may start now
+        for unit in units:
+            self.admission.release(unit['name'])
+        for detector in detectors:
+            detector.stop()
+        self._log_stop_outcomes(outcomes)
+        return outcomes
+
+    def _stop_unused_relays(self):
+        """Stop shared ingests none of whose consumers is still a unit reading their source."""
+        relays = {}
+        for source, relay in list(self.ingest_relays.items()):
+            if any(name in self.units and self.units[name]['source'] == source for name in relay.outputs):
+                continue
+            del self.ingest_relays[source]
+            process_id = f"ingest:{source}"
+            timer = self._restart_timers.pop(process_id, None)
+            if timer:
+                timer.cancel()
+            self.restart_policies.pop(process_id, None)
+            self.output_loggers.pop(process_id, None)
+            process = self.running_processes.pop(process_id, None)
+            if process:
+                relays[process_id] = process
+        if relays:
+            self.logger.info(f"Stopping {len(relays)} shared ingests without consumers")
+            self._log_stop_outcomes(stop_processes(relays, self.shutdown_timeout))
+
+    def _apply_reload(self, stopping: List[Dict], starting: List[Dict]):
+        """Stop old versions of units together, then queue the new ones."""
+        if stopping:
+            self.logger.info(f"Stopping {len(stopping)} flows for reload")
+            self._stop_units(stopping)
+            self._stop_unused_relays()
+        for unit in sorted(starting, key=lambda unit: -unit['priority']):
+            if self.shutdown_event.is_set():
+                return
+            self._schedule_unit(unit)
+
+    def _local_flows(self, flows: List[Dict]) -> List[Dict]:
+        """Flows this instance runs, all of them without sharding."""
+        if self.ring is None:
+            return flows
+        node_id = self.coordinator.node_id
+        local = [flow for flow in flows if self.ring.owner(flow['name']) == node_id]
+        self.logger.info(f"Node {node_id} owns {len(local)} of {len(flows)} flows")
+        return local
+
+    def _handle_membership(self, members: List[str]):
+        """Rebalance after a router instance joined or left; only moved flows restart."""
+        self.ring = HashRing(members)
+        if members:
+            self.reload()
+            return
+        # Fenced: stop everything without rereading configuration, which may sit on the stalled share
+        with self._reload_lock:
+            stopping = list(self.units.values())
+            self._set_units({})
+        if stopping:
+            self.logger.warning(f"Stopping {len(stopping)} flows while this node is fenced")
+            self._stop_units(stopping)
+            self._stop_unused_relays()
+
+    def _is_parked(self, unit: Dict) -> bool:
+        """Check if a process of a unit was parked after crash looping."""
+        for process_id in unit['process_ids']:
+            process = self.running_processes.get(process_id)
+            if process and process.state == ProcessState.PARKED:
+                return True
+        return False
+
+    def _set_units(self, units: Dict[str, Dict]):
+        """Make planned units current."""
+        self.units = units
+        self._unit_names = {process_id: name for name, unit in units.items() for process_id in unit['process_ids']}
+
+    def request_reload(self):
+        """
+        Ask for a reload without running it, safe to call from a signal handler.
+
+        Requests arriving during a reload are merged into one more reload.
+        """
+        self._reload_requested.set()
+
+    def _run_reloads(self):
+        """Run requested reloads until shutdown."""
+        while not self.shutdown_event.is_set():
+            if not self._reload_requested.wait(0.5):
                 continue
+            self._reload_requested.clear()
+            try:
+                self.reload()
+            except Exception as e:
+                self.logger.error(f"Reload failed: {str(e)}", exc_info=True)
+
+    def reload(self) -> Dict[str, List[str]]:
+        """
+        Apply changed configuration files without touching unchanged flows.
+
+        Flows whose steps and matched process config are unchanged keep
+        running. Changed and removed units are stopped together in the
+        background, then changed and added ones are queued for launch.
+        Parked and rejected flows are launched again even when unchanged.
+        Flows added for a source with a shared ingest read the source
+        directly until the next restart; a shared ingest whose flows were
+        all removed is stopped.
 
+        Returns:
+            dict: Unit names under ``added``, ``changed``, ``removed`` and
+            ``unchanged``
+        """
+        with self._reload_lock:
+            if self.shutdown_event.is_set():
+                return {}
             try:
-                process_id = f"{name}:{','.join(str(url) for url in steps)}"
-                self.logger.info(f"Starting process {process_id}")
-                self.logger.debug(f"Command: {cmd}")
-
-                # Create managed process
-                process = ManagedProcess(
-                    name=process_id,
-                    command=cmd,
-                    on_output=lambda line: self._handle_process_output(process_id, line),
-                    on_error=lambda line: self._handle_process_error(process_id, line),
-                    on_exit=lambda code: self._handle_process_exit(process_id, code)
-                )
-
-                if process.start():
-                    self.running_processes[process_id] = process
-                    self.logger.info(f"Started process {process_id}")
+                flows_config = self._load_json(self.flows_config_path)
+                process_config = self._load_json(self.process_config_path)
+                filter_index = FilterIndex(process_config)
+                templates = compile_templates(process_config)
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Keeping current configuration, reload failed: {str(e)}")
+                return {}
+
+            self.flows_config = flows_config
+            self.process_config = process_config
+            self.filter_index = filter_index
+            self.templates = templates
+            units = self._plan_units(self._local_flows(flows_config['flows']))
+
+            result = {"added": [], "changed": [], "removed": [], "unchanged": []}
+            for name, unit in units.items():
+                old = self.units.get(name)
+                if old is None:
+                    result["added"].append(name)
+                elif old['signature'] != unit['signature']:
+                    result["changed"].append(name)
                 else:
-                    self.logger.error(f"Failed to start process {process_id}")
+                    result["unchanged"].append(name)
+            result["removed"] = [name for name in self.units if name not in units]
+            # Rejected flows get another chance against the current budget
+            retried = [name for name in result["unchanged"] if self.admission.is_rejected(name)]
+            # Crash looping flows are cleared and launched afresh
+            parked = [name for name in result["unchanged"] if self._is_parked(self.units[name])]
 
-            except Exception as e:
-                self.logger.error(f"Error running command {cmd}: {str(e)}", exc_info=True)
+            stopping = [self.units[name] for name in result["removed"] + result["changed"] + parked]
+            # Launches still queued for old versions must not start after the new ones
+            for unit in stopping:
+                self.scheduler.cancel(unit['name'])
+            self._set_units(units)
+            threading.Thread(
+                target=self._apply_reload,
+                args=(stopping, [units[name] for name in result["changed"] + result["added"] + retried + parked]),
+                daemon=True
+            ).start()
+
+            self._apply_log_levels(units)
+            self.logger.info(f"Configuration reloaded: {len(result['added'])} added, "
+                             f"{len(result['changed'])} changed, {len(result['removed'])} removed, "
+                             f"{len(result['unchanged'])} unchanged")
+            return result
 
     def start(self):
         """Start processing all configured flows."""
         self.logger.info("Starting Stream Filter Router...")
         
-        # Check for existing processes
-        self.logger.info("Checking for existing processes...")
-        existing_processes = check_existing_processes(self.process_config_path)
-        self.logger.info("\nExisting processes:\n" + existing_processes + "\n")
-        
         self.logger.debug(f"Loaded {len(self.flows_config['flows'])} flows")
         self.logger.debug(f"Loaded {len(self.process_config)} process configurations")
+
+        if self.supervisor:
+            self.supervisor.start()
+
+        if self.metrics_port:
+            from metrics import start_metrics_server
+            start_metrics_server(self, self.metrics_port)
+
+        if self.coordinator:
+            self.ring = HashRing(self.coordinator.join())
+        flows = self._local_flows(self.flows_config['flows'])
+        units = self._plan_units(flows)
+        self._set_units(units)
+
+        if self.cgroup_slice and not self.cgroup_slice.setup():
+            self.cgroup_slice = None
+
+        # Flows still running from a previous instance, checked before relays change commands
+        self.logger.info("Checking for existing processes...")
+        adopted = set(self._handle_orphans(units))
+
+        # Highest priority first, so admission control holds back the least important flows.
+        # Launches wait in the scheduler until it starts, after the shared ingests they read.
+        admitted = {}
+        for unit in sorted(units.values(), key=lambda unit: -unit['priority']):
+            if unit['name'] in adopted:
+                continue
+            self.logger.debug("Scheduling %s with priority %s", unit['name'], unit['priority'])
+            if self._schedule_unit(unit) == 'admitted':
+                admitted[unit['name']] = unit
+
+        # Queued and rejected flows read their source directly once they run
+        if self.shared_ingest:
+            self._start_ingest_relays(self._relay_readers(admitted))
+
+        if self.frame_bus:
+            self._start_frame_buses(units)
+
+        self.scheduler.start()
+        self.watchdog.start()
+        self._apply_log_levels(units)
+        if self.admission.enabled:
+            self.admission.start(self._sample_usage)
+        if self.coordinator:
+            self.coordinator.start(self._handle_membership)
+
+        if self.config_watcher:
+            self.config_watcher.start()
+        threading.Thread(target=self._run_reloads, name="Reload", daemon=True).start()
         
-        for flow_config in self.flows_config['flows']:
-            name = flow_config['name']
-            steps = flow_config['steps']
-            self.logger.debug(f"Starting thread for flow '{name}': {steps}")
-            threading.Thread(target=self._process_flow, args=(name, steps), daemon=True).start()
-        
-        self.logger.info("All flows started")
+        self.logger.info("All flows scheduled")
 
     def stop(self):
         """Stop all running processes and clean up."""
@@ -210,25 +1198,63 @@ class StreamFilterRouter:
             self.logger.info("Stopping Stream Filter Router...")
             self.shutdown_event.set()
 
-            # Stop all managed processes
-            for process_id, process in list(self.running_processes.items()):
-                try:
-                    self.logger.debug(f"Stopping process {process_id}")
-                    if process.stop():
-                        self.logger.info(f"Process {process_id} stopped gracefully")
-                    else:
-                        self.logger.error(f"Failed to stop process {process_id}")
-                except Exception as e:
-                    self.logger.error(f"Error stopping process {process_id}: {str(e)}")
+            if self.config_watcher:
+                self.config_watcher.stop()
+            if self.coordinator:
+                self.coordinator.stop()
+            self.scheduler.stop()
+            self.admission.stop()
+            self.watchdog.stop()
+            for timer in list(self._restart_timers.values()) + list(self._stage_timers.values()):
+                timer.cancel()
+
+            # Signal everything at once, then wait against a single deadline
+            for detector in self.motion_detectors.values():
+                detector.request_stop()
+            self.stop_outcomes = stop_processes(dict(self.running_processes), self.shutdown_timeout)
+            self._log_stop_outcomes(self.stop_outcomes)
+            self._remove_cgroups(list(self.flow_cgroups))
+
+            for process_id, detector in list(self.motion_detectors.items()):
+                self.logger.debug(f"Stopping motion detection {process_id}")
+                detector.stop()
+
+            for source, stage in list(self.frame_buses.items()):
+                self.logger.debug(f"Stopping frame bus {stage.name}")
+                stage.stop()
+
+            if self.supervisor:
+                self.supervisor.stop()
 
             self.logger.info("Stream Filter Router stopped")
+            if self.log_listener:
+                stop_logging(self.log_listener)
             sys.exit(0)  # Ensure complete termination
 
     def get_process_states(self) -> List[Dict]:
         """
         Get state information for all running processes.
+
+        Flows held back by admission control are listed with state
+        ``queued`` or ``rejected`` and an ``admission`` entry with the
+        reason and the cost they were checked with.
         
         Returns:
             list: List of process state dictionaries
         """
-        return [process.get_state() for process in self.running_processes.values()]
+        states = []
+        for process_id, process in list(self.running_processes.items()):
+            state = process.get_state()
+            if process_id in self.motion_detectors:
+                state["motion"] = self.motion_detectors[process_id].get_state()
+            states.append(state)
+        # Flows held back by admission control have no process yet
+        for name in self.admission.pending():
+            unit = self.units.get(name)
+            admission = self.admission.status(name)
+            if unit is None or admission is None:
+                continue
+            for process_id in unit['process_ids']:
+                states.append({"name": process_id, "state": admission['state'], "pid": None,
+                               "admission": admission})
+        return states
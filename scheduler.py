@@ -0,0 +1,231 @@
+"""
+Startup scheduler spreading flow launches over time.
+Limits concurrent launches globally and per source host and starts
+higher priority flows first.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from parsed_url import parse_url
+
+
+def source_host(source) -> Optional[str]:
+    """
+    Get the host a flow connects to.
+
+    Args:
+        source: First step of a flow
+
+    Returns:
+        str: Host name or None for local sources
+    """
+    if not isinstance(source, str):
+        return None
+    try:
+        return parse_url(source).host
+    except ValueError:
+        return None
+
+
+class StartupScheduler:
+    """
+    Priority queue of launch jobs with concurrency, rate and per-host limits.
+
+    A launched job keeps its slot for ``settle_time`` seconds after it
+    returns, roughly the time a child needs to connect to its source, so
+    limits apply to connection attempts rather than to the near-instant
+    process spawn. A limit of 0 disables it.
+    """
+
+    def __init__(self,
+                 concurrency: int = 0,
+                 rate: float = 0.0,
+                 per_host: int = 0,
+                 settle_time: float = 1.0):
+        """
+        Initialize scheduler.
+
+        Args:
+            concurrency: Launches in progress at once
+            rate: Launches started per second
+            per_host: Launches in progress at once per source host
+            settle_time: Seconds a launch holds its slot after returning
+        """
+        self.concurrency = concurrency
+        self.rate = rate
+        self.per_host = per_host
+        self.settle_time = settle_time
+
+        self._queue: List[Tuple[int, int, str, Optional[str], Callable[[], None]]] = []
+        self._order = itertools.count()
+        self._active = 0
+        self._active_hosts: Dict[str, int] = {}
+        self._next_start = 0.0
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.submitted = 0
+        self.completed = 0
+        self._batch_started: Optional[float] = None
+        self._batch_finished: Optional[float] = None
+        self._last_launch = 0.0
+        self.logger = logging.getLogger("StartupScheduler")
+
+    def submit(self, name: str, job: Callable[[], None], priority: int = 0, host: Optional[str] = None):
+        """
+        Queue a launch.
+
+        Args:
+            name: Job name for logs
+            job: Callable performing the launch
+            priority: Higher values start first
+            host: Source host the job connects to
+        """
+        with self._cond:
+            if self._batch_started is None or self._batch_finished is not None:
+                self._batch_started = time.monotonic()
+                self._batch_finished = None
+            heapq.heappush(self._queue, (-priority, next(self._order), name, host, job))
+            self.submitted += 1
+            self._cond.notify()
+
+    def cancel(self, name: str) -> int:
+        """
+        Drop queued launches of a job name; a launch already started is not affected.
+
+        Args:
+            name: Job name given to submit
+
+        Returns:
+            int: Number of launches dropped
+        """
+        with self._cond:
+            kept = [item for item in self._queue if item[2] != name]
+            dropped = len(self._queue) - len(kept)
+            if dropped:
+                self._queue[:] = kept
+                heapq.heapify(self._queue)
+                self.submitted -= dropped
+                self._cond.notify_all()
+            return dropped
+
+    def _host_full(self, host: Optional[str]) -> bool:
+        """Check if a host has reached its limit."""
+        return bool(self.per_host and host and self._active_hosts.get(host, 0) >= self.per_host)
+
+    def _pop_allowed(self):
+        """Remove the best queued job whose host has capacity, None if all are blocked."""
+        if not self._host_full(self._queue[0][3]):
+            return heapq.heappop(self._queue)
+        # Skip jobs of saturated hosts without losing their place
+        for item in sorted(self._queue):
+            if not self._host_full(item[3]):
+                self._queue.remove(item)
+                heapq.heapify(self._queue)
+                return item
+        return None
+
+    def _take(self) -> Optional[Tuple[str, Optional[str], Callable[[], None]]]:
+        """Pop the highest priority job allowed to start now, waiting for a slot."""
+        with self._cond:
+            while not self._stop_event.is_set():
+                wait = None
+                if self._queue and (not self.concurrency or self._active < self.concurrency):
+                    now = time.monotonic()
+                    if now < self._next_start:
+                        wait = self._next_start - now
+                    else:
+                        item = self._pop_allowed()
+                        if item is not None:
+                            _, _, name, host, job = item
+                            self._active += 1
+                            if host:
+                                self._active_hosts[host] = self._active_hosts.get(host, 0) + 1
+                            if self.rate:
+                                self._next_start = now + 1.0 / self.rate
+                            return name, host, job
+                self._cond.wait(wait)
+        return None
+
+    def _run_job(self, name: str, host: Optional[str], job: Callable[[], None]):
+        """Run a launch and keep its slot while the child connects."""
+        try:
+            job()
+        except Exception as e:
+            self.logger.error(f"Launch of {name} failed: {str(e)}", exc_info=True)
+        with self._cond:
+            self._last_launch = time.monotonic()
+        self._stop_event.wait(self.settle_time)
+
+        with self._cond:
+            self._active -= 1
+            if host:
+                self._active_hosts[host] -= 1
+                if not self._active_hosts[host]:
+                    del self._active_hosts[host]
+            self.completed += 1
+            if not self._queue and not self._active:
+                self._batch_finished = self._last_launch
+                self.logger.info(f"All {self.submitted} launches done in "
+                                 f"{self._batch_finished - self._batch_started:.2f}s")
+            self._cond.notify_all()
+
+    def _dispatch(self):
+        """Start queued jobs as limits allow."""
+        while True:
+            item = self._take()
+            if item is None:
+                break
+            threading.Thread(target=self._run_job, args=item, name=f"launch:{item[0]}", daemon=True).start()
+
+    def start(self):
+        """Start the dispatcher thread."""
+        self._thread = threading.Thread(target=self._dispatch, name="startup-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop dispatching and drop queued jobs."""
+        with self._cond:
+            self._stop_event.set()
+            self._queue.clear()
+            self._cond.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every submitted job has run.
+
+        Args:
+            timeout: Seconds to wait, None waits indefinitely
+
+        Returns:
+            bool: True if the scheduler is idle
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._active, timeout)
+
+    def stats(self) -> Dict:
+        """
+        Get scheduler statistics.
+
+        Returns:
+            dict: Pending and active launches and the duration of the last
+            batch, elapsed time so far while it is still running
+        """
+        with self._cond:
+            if self._batch_started is None:
+                duration = None
+            else:
+                duration = (self._batch_finished or time.monotonic()) - self._batch_started
+            return {
+                "pending": len(self._queue),
+                "active": self._active,
+                "completed": self.completed,
+                "startup_seconds": duration,
+                "done": self._batch_finished is not None
+            }
@@ -0,0 +1,239 @@
+"""
+Flow sharding across several router instances.
+Instances sharing a directory announce themselves with heartbeat files and
+split the flow list with a consistent hash ring on flow names.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Points per node on the ring, more spread flows more evenly
+RING_REPLICAS = 128
+
+NODE_SUFFIX = '.node'
+
+
+def _hash(key: str) -> int:
+    """Position of a key on the ring."""
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping flow names to nodes.
+
+    Adding or removing a node only moves the flows between its points and
+    the preceding ones, about 1/N of all flows.
+    """
+
+    def __init__(self, nodes: List[str], replicas: int = RING_REPLICAS):
+        """
+        Build the ring.
+
+        Args:
+            nodes: Node identifiers
+            replicas: Points per node
+        """
+        self.nodes = sorted(set(nodes))
+        points = sorted((_hash(f"{node}#{index}"), node) for node in self.nodes for index in range(replicas))
+        self._keys = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """
+        Node responsible for a key.
+
+        Args:
+            key: Flow name
+
+        Returns:
+            str: Node identifier, None for an empty ring
+        """
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[index]
+
+
+class FileCoordinator:
+    """
+    Membership of router instances through heartbeat files in a shared directory.
+
+    Every node rewrites ``<directory>/<node>.node`` with an increasing
+    sequence number each ``interval`` seconds. A node is considered gone
+    once its sequence number has not changed for ``timeout`` seconds, as
+    measured by the local clock, so clocks of the hosts need not agree.
+    The heartbeat file stays after a stop: an instance restarted within
+    ``timeout`` keeps its flows, one that does not come back has them
+    taken over. Works on any filesystem all instances can write, such as
+    NFS, without locks.
+
+    Every instance writes a token of its host, PID and start time, so a
+    second live instance with the same node ID is detected on join and
+    refused. An instance that cannot write its heartbeat fences itself:
+    shortly before peers would take its flows over, it reports an empty
+    membership so its own flows stop, and rejoins once writes succeed.
+    """
+
+    def __init__(self, directory: str, node_id: Optional[str] = None,
+                 interval: float = 2.0, timeout: float = 10.0):
+        """
+        Initialize coordinator.
+
+        Args:
+            directory: Shared directory, created if missing
+            node_id: Stable name of this instance, the host name by default
+            interval: Seconds between heartbeats
+            timeout: Seconds without a heartbeat after which a node is gone
+        """
+        self.directory = directory
+        self.node_id = node_id or socket.gethostname()
+        if not self.node_id or '/' in self.node_id or self.node_id.startswith('.'):
+            raise ValueError(f"Invalid node ID {self.node_id!r}")
+        self.interval = interval
+        self.timeout = timeout
+        self.members: List[str] = []
+
+        self._seq = 0
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{time.time():.6f}"
+        self.path = os.path.join(directory, self.node_id + NODE_SUFFIX)
+        self._last_beat = time.monotonic()
+        # Last sequence number of each node and when it changed
+        self._seen: Dict[str, Tuple[int, float]] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger("FileCoordinator")
+
+    def _owner(self) -> Optional[str]:
+        """Token of the instance that last wrote this node's heartbeat file, None if unreadable."""
+        try:
+            with open(self.path) as f:
+                return json.load(f).get('token')
+        except (OSError, ValueError):
+            return None
+
+    def _beat(self):
+        """Write this node's heartbeat file atomically."""
+        owner = self._owner()
+        if self._seq and owner not in (None, self.token):
+            self.logger.error(f"Heartbeat file {self.path} was written by another instance ({owner}), "
+                              f"node ID {self.node_id} is used twice")
+        self._seq += 1
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"node": self.node_id, "host": socket.gethostname(), "pid": os.getpid(),
+                       "token": self.token, "seq": self._seq, "time": time.time()}, f)
+        os.replace(tmp, self.path)
+        self._last_beat = time.monotonic()
+
+    def _scan(self) -> List[str]:
+        """Read heartbeat files and return the live nodes."""
+        now = time.monotonic()
+        live = {self.node_id}
+        for entry in os.listdir(self.directory):
+            if not entry.endswith(NODE_SUFFIX):
+                continue
+            node = entry[:-len(NODE_SUFFIX)]
+            try:
+                with open(os.path.join(self.directory, entry)) as f:
+                    beat = json.load(f)
+            except (OSError, ValueError):
+                # Half-written by another writer, judged on the next scan
+                if node in self._seen and now - self._seen[node][1] < self.timeout:
+                    live.add(node)
+                continue
+            seen = self._seen.get(node)
+            if seen is None:
+                # First sight: trust the writer's clock only to skip long dead nodes
+                changed = now if time.time() - beat.get('time', 0) < self.timeout else now - self.timeout
+                self._seen[node] = (beat.get('seq', 0), changed)
+            elif seen[0] != beat.get('seq'):
+                self._seen[node] = (beat.get('seq'), now)
+            if now - self._seen[node][1] < self.timeout:
+                live.add(node)
+        return sorted(live)
+
+    def join(self) -> List[str]:
+        """
+        Announce this node and wait for peers to be seen.
+
+        Waits one and a half intervals, so another live instance with the
+        same node ID rewrites the heartbeat file meanwhile.
+
+        Returns:
+            list: Live nodes including this one
+
+        Raises:
+            RuntimeError: If another live instance uses this node ID
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._beat()
+        self._scan()
+        time.sleep(self.interval * 1.5)
+        owner = self._owner()
+        if owner not in (None, self.token):
+            raise RuntimeError(f"Node ID {self.node_id} is used by another live instance ({owner}), "
+                               f"set a distinct node ID")
+        self._beat()
+        self.members = self._scan()
+        self.logger.info(f"Node {self.node_id} joined with {len(self.members)} nodes: {', '.join(self.members)}")
+        return self.members
+
+    def start(self, on_change: Callable[[List[str]], None]):
+        """
+        Keep sending heartbeats and report membership changes.
+
+        Args:
+            on_change: Called with the live nodes after a node joined or left,
+                with an empty list when this node fenced itself
+        """
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(on_change,), name="FileCoordinator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sending heartbeats, peers take over after ``timeout``."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self, on_change: Callable[[List[str]], None]):
+        """Heartbeat loop."""
+        while not self._stop_event.wait(self.interval):
+            try:
+                self._beat()
+                members = self._scan()
+            except OSError as e:
+                self.logger.error(f"Heartbeat in {self.directory} failed: {str(e)}")
+                # Peers take our flows over after timeout, stop them one check earlier
+                if self.members and time.monotonic() - self._last_beat >= self.timeout - self.interval:
+                    self.logger.error(f"No heartbeat written for {time.monotonic() - self._last_beat:.0f}s, "
+                                      f"stopping local flows until it is written again")
+                    self.members = []
+                    self._notify(on_change, [])
+                continue
+            if members == self.members:
+                continue
+            joined = sorted(set(members) - set(self.members))
+            left = sorted(set(self.members) - set(members))
+            self.members = members
+            self.logger.warning(f"Membership changed, joined: {', '.join(joined) or '-'}, "
+                                f"left: {', '.join(left) or '-'}")
+            self._notify(on_change, members)
+
+    def _notify(self, on_change: Callable[[List[str]], None], members: List[str]):
+        """Report live nodes, an empty list while this node is fenced."""
+        try:
+            on_change(members)
+        except Exception as e:
+            self.logger.error(f"Rebalancing failed: {str(e)}", exc_info=True)
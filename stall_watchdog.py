@@ -0,0 +1,97 @@
+"""
+Stall watchdog for processes that stay alive without making progress.
+"""
+
+import threading
+import logging
+from typing import Callable, Dict, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from process import ManagedProcess
+
+StallCallback = Callable[[str, 'ManagedProcess'], None]
+
+
+class StallWatchdog:
+    """
+    Checks the idle time of watched processes from a single thread.
+
+    A process counts as stalled when its ``idle_time`` exceeds its stall
+    timeout. The callback runs in its own thread, so a slow escalation
+    does not delay checks of other processes, and fires once per run of
+    the process: a restarted process is watched again automatically.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        """
+        Initialize watchdog.
+
+        Args:
+            interval: Seconds between checks
+        """
+        self.interval = interval
+        self._watched: Dict[str, Tuple['ManagedProcess', float, StallCallback]] = {}
+        self._fired: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger("StallWatchdog")
+
+    def watch(self, key: str, process: 'ManagedProcess', timeout: float, on_stall: StallCallback):
+        """
+        Start watching a process.
+
+        Args:
+            key: Identifier passed to the callback, usually the process ID
+            process: Process to watch
+            timeout: Seconds without progress before the process is stalled
+            on_stall: Called with ``(key, process)`` when it stalls
+        """
+        with self._lock:
+            self._watched[key] = (process, timeout, on_stall)
+            self._fired.pop(key, None)
+
+    def unwatch(self, key: str):
+        """
+        Stop watching a process.
+
+        Args:
+            key: Identifier given to watch
+        """
+        with self._lock:
+            self._watched.pop(key, None)
+            self._fired.pop(key, None)
+
+    def _check(self):
+        """Fire callbacks for stalled processes."""
+        with self._lock:
+            watched = list(self._watched.items())
+
+        for key, (process, timeout, on_stall) in watched:
+            if not process.is_running() or process.idle_time < timeout:
+                continue
+            # Only once per run; a restart sets a new started_at
+            if self._fired.get(key) == process.started_at:
+                continue
+            self._fired[key] = process.started_at
+            self.logger.warning(f"{key} made no progress for {process.idle_time:.0f}s")
+            threading.Thread(target=on_stall, args=(key, process), daemon=True).start()
+
+    def _run(self):
+        """Check periodically until stopped."""
+        while not self._stop_event.wait(self.interval):
+            try:
+                self._check()
+            except Exception as e:
+                self.logger.error(f"Watchdog check failed: {str(e)}", exc_info=True)
+
+    def start(self):
+        """Start the watchdog thread."""
+        self._thread = threading.Thread(target=self._run, name="StallWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the watchdog thread."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(self.interval * 2)
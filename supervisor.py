@@ -0,0 +1,154 @@
+"""
+Process supervisor for Stream Filter Router.
+Multiplexes pipes of all managed processes in one event loop.
+"""
+
+import os
+import selectors
+import threading
+import logging
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from process import ManagedProcess
+
+READ_SIZE = 65536
+
+
+class _PipeState:
+    """Read state of a single child pipe."""
+
+    __slots__ = ('process', 'pipe', 'is_stderr')
+
+    def __init__(self, process: 'ManagedProcess', pipe, is_stderr: bool):
+        self.process = process
+        self.pipe = pipe
+        self.is_stderr = is_stderr
+
+
+class ProcessSupervisor:
+    """
+    Single event loop replacing the reader threads of every ManagedProcess.
+    Each chunk read is handed to the process's output sinks as in threaded
+    mode, but all of them run on the supervisor thread. Exits are
+    reported by the shared exit watcher as in threaded mode.
+    """
+
+    def __init__(self):
+        """Initialize supervisor."""
+        self._selector = selectors.DefaultSelector()
+        self._pending: List['ManagedProcess'] = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+        # Self-pipe used to wake the loop for new registrations
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+        self.logger = logging.getLogger("ProcessSupervisor")
+
+    def start(self):
+        """Start the event loop thread."""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="ProcessSupervisor", daemon=True)
+        self._thread.start()
+        self.logger.info("Process supervisor started")
+
+    def stop(self, timeout: float = 2):
+        """
+        Stop the event loop thread.
+
+        Args:
+            timeout: Seconds to wait for the loop to finish
+        """
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup()
+        if self._thread:
+            self._thread.join(timeout)
+        self.logger.info("Process supervisor stopped")
+
+    def register(self, process: 'ManagedProcess'):
+        """
+        Hand a started process over to the event loop.
+
+        Args:
+            process: Managed process with a running Popen and piped output
+        """
+        with self._lock:
+            self._pending.append(process)
+        self._wakeup()
+
+    def _wakeup(self):
+        """Interrupt a blocking select call."""
+        try:
+            os.write(self._wakeup_w, b'\0')
+        except BlockingIOError:
+            pass
+
+    def _drain_pending(self):
+        """Apply registrations queued by other threads."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        for process in pending:
+            for pipe, is_stderr in process._line_pipes():
+                os.set_blocking(pipe.fileno(), False)
+                self._selector.register(pipe, selectors.EVENT_READ,
+                                        _PipeState(process, pipe, is_stderr))
+
+    def _run(self):
+        """Event loop: read ready pipes and deliver lines."""
+        while self._running:
+            self._drain_pending()
+            try:
+                events = self._selector.select()
+            except Exception as e:
+                self.logger.error(f"Selector error: {str(e)}")
+                continue
+
+            for key, _ in events:
+                if key.data is None:
+                    try:
+                        while os.read(self._wakeup_r, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._read_pipe(key.data)
+
+    def _read_pipe(self, state: _PipeState):
+        """Read available data from a pipe and pass it to the process's sinks."""
+        try:
+            data = os.read(state.pipe.fileno(), READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            state.process.logger.error(
+                f"Error reading {'stderr' if state.is_stderr else 'stdout'}: {str(e)}")
+            data = b''
+
+        if not data:
+            self._close_pipe(state)
+            return
+
+        try:
+            state.process._handle_chunk(data, state.is_stderr)
+        except Exception as e:
+            state.process.logger.error(f"Error handling output: {str(e)}")
+
+    def _close_pipe(self, state: _PipeState):
+        """Unregister a pipe that reached EOF and let the process flush its sinks."""
+        self._selector.unregister(state.pipe)
+        state.pipe.close()
+        try:
+            state.process._close_output(state.is_stderr)
+        except Exception as e:
+            state.process.logger.error(f"Error handling output: {str(e)}")
+
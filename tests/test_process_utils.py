@@ -0,0 +1,54 @@
+"""
+Tests of shell detection and command splitting.
+"""
+
+import pytest
+
+from process_utils import _has_unquoted_glob, command_key, split_command
+
+
+@pytest.mark.parametrize('command, argv', [
+    ("ffmpeg -i rtsp://cam/x -c copy out.mp4", ['ffmpeg', '-i', 'rtsp://cam/x', '-c', 'copy', 'out.mp4']),
+    ("ffmpeg -i 'a b.mp4' out.mp4", ['ffmpeg', '-i', 'a b.mp4', 'out.mp4']),
+    ("exec ffmpeg -i in.mp4 out.mp4", ['ffmpeg', '-i', 'in.mp4', 'out.mp4']),
+    ("ffmpeg -i 'http://cam/x?a=1&b=2' out.mp4", ['ffmpeg', '-i', 'http://cam/x?a=1&b=2', 'out.mp4']),
+    ("ffmpeg -i udp://127.0.0.1:5000?overrun_nonfatal=1 out.mp4",
+     ['ffmpeg', '-i', 'udp://127.0.0.1:5000?overrun_nonfatal=1', 'out.mp4']),
+    ("ffmpeg -i in.mp4 '*.png'", ['ffmpeg', '-i', 'in.mp4', '*.png']),
+])
+def test_split_command_runs_plain_commands_directly(command, argv):
+    assert split_command(command) == argv
+
+
+@pytest.mark.parametrize('command', [
+    "ffmpeg -i in.mp4 -f mpegts - | tee out.ts",
+    "ffmpeg -i in.mp4 out.mp4 > log.txt",
+    "ffmpeg -i $SOURCE out.mp4",
+    "ffmpeg -i in.mp4 out.mp4 && echo done",
+    "ffmpeg -i ~/in.mp4 out.mp4",
+    "FOO=1 ffmpeg -i in.mp4 out.mp4",
+    "cd /tmp",
+    "ffmpeg -i 'unterminated",
+    "ffmpeg -i frames/*.png out.mp4",
+])
+def test_split_command_leaves_shell_syntax_to_the_shell(command):
+    assert split_command(command) is None
+
+
+@pytest.mark.parametrize('command, expected', [
+    ("ls *.mp4", True),
+    ("ls frame?.png", True),
+    ("ls [ab].mp4", True),
+    ("ls '*.mp4'", False),
+    ('ls "*.mp4"', False),
+    ("ls \\*.mp4", False),
+    ("ffmpeg -i rtsp://cam/x?channel=1", False),
+    ("ls plain.mp4", False),
+])
+def test_has_unquoted_glob(command, expected):
+    assert _has_unquoted_glob(command) is expected
+
+
+def test_command_key_matches_shell_and_direct_forms():
+    assert command_key("ffmpeg  -i 'a b'   out.mp4") == "ffmpeg -i a b out.mp4"
+    assert command_key("ffmpeg -i in.mp4 | tee x") == "ffmpeg -i in.mp4 | tee x"
@@ -0,0 +1,56 @@
+"""
+Tests of restart backoff and crash-loop parking.
+"""
+
+import pytest
+
+from restart_policy import RestartPolicy
+
+
+def test_policies_decide_on_exit_code():
+    assert RestartPolicy('always').should_restart(0)
+    assert RestartPolicy('on-failure').should_restart(1)
+    assert not RestartPolicy('on-failure').should_restart(0)
+    assert not RestartPolicy('never').should_restart(1)
+    with pytest.raises(ValueError):
+        RestartPolicy('sometimes')
+
+
+def test_delay_doubles_up_to_max():
+    policy = RestartPolicy('always', delay=1.0, max_delay=4.0, limit=0, jitter=0.0)
+    assert [policy.next_delay(0.0) for _ in range(4)] == [1.0, 2.0, 4.0, 4.0]
+
+
+def test_long_run_resets_backoff():
+    policy = RestartPolicy('always', delay=1.0, max_delay=4.0, limit=0, jitter=0.0)
+    policy.next_delay(0.0)
+    policy.next_delay(0.0)
+    assert policy.next_delay(10.0) == 1.0
+
+
+def test_parks_after_limit_within_window():
+    policy = RestartPolicy('always', limit=3, window=300.0, jitter=0.0)
+    assert all(policy.next_delay(0.0) is not None for _ in range(3))
+    assert policy.next_delay(0.0) is None
+
+
+def test_restarts_outside_window_are_forgotten(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('restart_policy.time.monotonic', lambda: now[0])
+    policy = RestartPolicy('always', limit=2, window=10.0, jitter=0.0)
+    policy.next_delay(0.0)
+    policy.next_delay(0.0)
+    assert policy.next_delay(0.0) is None
+    now[0] += 11.0
+    assert policy.next_delay(0.0) is not None
+
+
+def test_zero_limit_never_parks():
+    policy = RestartPolicy('always', limit=0, jitter=0.0)
+    assert all(policy.next_delay(0.0) is not None for _ in range(50))
+
+
+def test_from_config_reads_restart_keys():
+    policy = RestartPolicy.from_config({'restart': 'on-failure', 'restart_delay': '2', 'restart_limit': 1})
+    assert (policy.policy, policy.delay, policy.limit) == ('on-failure', 2.0, 1)
+    assert RestartPolicy.from_config({}).policy == 'never'
@@ -0,0 +1,102 @@
+"""
+Tests of configuration reload against a router running stub children.
+"""
+
+import json
+import sys
+import time
+
+import pytest
+
+from router import StreamFilterRouter
+
+SLEEP = f"shell://exec {sys.executable} -c 'import time; time.sleep(60)' $1 $2"
+
+
+def _write(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def _flows(**targets):
+    """Flows reading one camera into the given file names."""
+    return {"flows": [{"name": name, "steps": ["rtsp://cam/1", f"file:///{target}"]}
+                      for name, target in targets.items()]}
+
+
+@pytest.fixture
+def configs(tmp_path):
+    flows, processes = tmp_path / 'flows.json', tmp_path / 'process.json'
+    _write(processes, [{"filter": ["rtsp", "file"], "run": [SLEEP]}])
+    return flows, processes
+
+
+@pytest.fixture
+def make_router(configs, tmp_path):
+    routers = []
+
+    def make(**kwargs):
+        router = StreamFilterRouter(str(configs[0]), str(configs[1]), log_level='WARNING',
+                                    output_dir=str(tmp_path / 'logs'), **kwargs)
+        routers.append(router)
+        return router
+
+    yield make
+    for router in routers:
+        # stop() ends the program once everything is down
+        with pytest.raises(SystemExit):
+            router.stop()
+
+
+def _wait(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _targets(router):
+    """Output file of every running flow process."""
+    return sorted(process_id.rsplit('/', 1)[-1] for process_id, process in router.running_processes.items()
+                  if process.is_running())
+
+
+def test_reload_reports_added_changed_removed_and_unchanged(configs, make_router):
+    _write(configs[0], _flows(a='a.mp4', b='b.mp4', c='c.mp4'))
+    router = make_router()
+    router.start()
+    assert _wait(lambda: _targets(router) == ['a.mp4', 'b.mp4', 'c.mp4'])
+    pid = router.running_processes['a:rtsp://cam/1,file:///a.mp4'].process.pid
+
+    _write(configs[0], _flows(a='a.mp4', b='b2.mp4', d='d.mp4'))
+    result = router.reload()
+
+    assert result == {"added": ['d'], "changed": ['b'], "removed": ['c'], "unchanged": ['a']}
+    assert _wait(lambda: _targets(router) == ['a.mp4', 'b2.mp4', 'd.mp4'])
+    assert router.running_processes['a:rtsp://cam/1,file:///a.mp4'].process.pid == pid
+
+
+def test_reload_keeps_configuration_on_invalid_json(configs, make_router):
+    _write(configs[0], _flows(a='a.mp4'))
+    router = make_router()
+    router.start()
+    configs[0].write_text('{"flows": [')
+    assert router.reload() == {}
+    assert list(router.units) == ['a']
+
+
+def test_reload_cancels_queued_launch_of_changed_flow(configs, make_router):
+    _write(configs[0], _flows(a='a.mp4', b='b.mp4', c='c.mp4'))
+    # One launch every 0.5 s, so b and c are still queued during the reload
+    router = make_router(startup_rate=2.0)
+    router.start()
+    _write(configs[0], _flows(a='a.mp4', b='b.mp4', c='c2.mp4'))
+    result = router.reload()
+
+    assert result["changed"] == ['c'] and result["unchanged"] == ['a', 'b']
+    assert router.scheduler.wait(10)
+    assert _wait(lambda: _targets(router) == ['a.mp4', 'b.mp4', 'c2.mp4'])
+    time.sleep(0.5)
+    assert _targets(router) == ['a.mp4', 'b.mp4', 'c2.mp4']